@@ -0,0 +1,90 @@
+"""Shared per-process resources for request handlers (FastAPI dependencies).
+
+Redis clients and the RQ queue are created once per app on first use and
+cached on ``app.state``; their connection pools are closed by the lifespan
+handler in :mod:`app.main`. Creation is lazy so deployments that never
+touch Redis (e.g. the in-process executor) never connect.
+"""
+
+from __future__ import annotations
+
+from fastapi import Depends, FastAPI, Request
+from redis import BlockingConnectionPool, Redis
+from redis.asyncio import Redis as AsyncRedis
+from rq import Queue
+
+from app.config import settings
+from app.core.dedup import DedupStore, MemoryDedupStore, RedisDedupStore
+from app.worker.async_exec import InProcessExecutor
+
+_POOL_TIMEOUT_SEC = 5  # wait this long for a free pooled connection
+
+
+async def get_redis(request: Request) -> Redis:
+    """Pooled synchronous client; blocking calls must run off the event loop."""
+    redis: Redis | None = getattr(request.app.state, "redis", None)
+    if redis is None:
+        pool = BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            timeout=_POOL_TIMEOUT_SEC,
+            socket_timeout=settings.redis_socket_timeout_sec,
+            health_check_interval=30,
+        )
+        redis = request.app.state.redis = Redis(connection_pool=pool)
+    return redis
+
+
+async def get_async_redis(request: Request) -> AsyncRedis:
+    """Pooled asyncio client for calls made directly from handlers."""
+    redis: AsyncRedis | None = getattr(request.app.state, "async_redis", None)
+    if redis is None:
+        redis = request.app.state.async_redis = AsyncRedis.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            socket_timeout=settings.redis_socket_timeout_sec,
+            health_check_interval=30,
+        )
+    return redis
+
+
+async def get_queue(request: Request, redis: Redis = Depends(get_redis)) -> Queue:
+    """The RQ queue jobs are enqueued to, built once per app."""
+    queue: Queue | None = getattr(request.app.state, "queue", None)
+    if queue is None:
+        queue = request.app.state.queue = Queue(settings.queue_name, connection=redis)
+    return queue
+
+
+async def get_dedup(request: Request) -> DedupStore:
+    """The update de-duplication store selected by ``dedup_backend``."""
+    store: DedupStore | None = getattr(request.app.state, "dedup", None)
+    if store is None:
+        if settings.dedup_backend == "redis":
+            store = RedisDedupStore(
+                await get_async_redis(request),
+                ttl=settings.dedup_ttl_sec,
+                local_size=settings.dedup_local_cache_size,
+            )
+        else:
+            store = MemoryDedupStore(settings.dedup_local_cache_size)
+        request.app.state.dedup = store
+    return store
+
+
+async def get_executor(request: Request) -> InProcessExecutor | None:
+    """The in-process executor when ``webhook_executor="inprocess"``, else None (use RQ)."""
+    executor: InProcessExecutor | None = getattr(request.app.state, "executor", None)
+    return executor
+
+
+async def close_redis(app: FastAPI) -> None:
+    async_redis: AsyncRedis | None = getattr(app.state, "async_redis", None)
+    if async_redis is not None:
+        await async_redis.aclose()
+        app.state.async_redis = None
+    redis: Redis | None = getattr(app.state, "redis", None)
+    if redis is not None:
+        redis.connection_pool.disconnect()
+        app.state.redis = None
+    app.state.queue = None
@@ -2,7 +2,16 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter
+import asyncio
+from typing import Any
+
+from fastapi import APIRouter, Depends
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_async_redis, get_redis
+from app.core.nodes import NodeRegistry
 
 router = APIRouter()
 
@@ -13,12 +22,24 @@ async def healthz() -> dict[str, str]:
 
 
 @router.get("/readyz")
-async def readyz() -> dict[str, str]:
+async def readyz(redis: AsyncRedis = Depends(get_async_redis)) -> dict[str, str]:
     try:
-        from redis import Redis
-        from app.config import settings
-        r = Redis.from_url(settings.redis_url, socket_timeout=2)
-        r.ping()
+        await asyncio.wait_for(redis.ping(), timeout=2)
         return {"status": "ok", "redis": "connected"}
     except Exception:
         return {"status": "degraded", "redis": "unreachable"}
+
+
+@router.get("/nodes")
+async def nodes(redis: Redis = Depends(get_redis)) -> dict[str, Any]:
+    """Live worker nodes with their Claude slots and busy workers."""
+    try:
+        live = await run_in_threadpool(NodeRegistry(redis).nodes)
+    except Exception:
+        return {"status": "degraded", "redis": "unreachable", "nodes": []}
+    return {
+        "status": "ok",
+        "slots": sum(node["slots"] for node in live),
+        "busy": sum(node["busy"] for node in live),
+        "nodes": live,
+    }
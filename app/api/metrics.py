@@ -0,0 +1,58 @@
+"""Prometheus scrape endpoint."""
+
+from __future__ import annotations
+
+import logging
+
+from fastapi import APIRouter, Depends, Request, Response
+from rq import Queue
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_executor, get_queue, get_redis
+from app.core import lanes, metrics
+from app.core.nodes import NodeRegistry
+from app.worker.async_exec import InProcessExecutor
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+async def _queue_depth(request: Request, executor: InProcessExecutor | None) -> int | None:
+    if executor is not None:
+        return executor.queue_depth()
+    try:
+        queue = await get_queue(request, await get_redis(request))
+        names = [lanes.queue_name(lane) for lane in lanes.LANES]
+        return await run_in_threadpool(
+            lambda: sum(Queue(name, connection=queue.connection).count for name in names)
+        )
+    except Exception:
+        logger.warning("metrics_queue_depth_unavailable")
+        return None
+
+
+async def _record_nodes(request: Request) -> None:
+    try:
+        live = await run_in_threadpool(NodeRegistry(await get_redis(request)).nodes)
+    except Exception:
+        logger.warning("metrics_nodes_unavailable")
+        return
+    metrics.WORKER_SLOTS.clear()
+    metrics.WORKER_BUSY.clear()
+    for node in live:
+        metrics.WORKER_SLOTS.labels(node["node"]).set(node["slots"])
+        metrics.WORKER_BUSY.labels(node["node"]).set(node["busy"])
+
+
+@router.get("/metrics")
+async def prometheus_metrics(
+    request: Request,
+    executor: InProcessExecutor | None = Depends(get_executor),
+) -> Response:
+    depth = await _queue_depth(request, executor)
+    if depth is not None:
+        metrics.QUEUE_DEPTH.set(depth)
+    if executor is None:
+        await _record_nodes(request)
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
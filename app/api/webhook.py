@@ -3,47 +3,177 @@
 from __future__ import annotations
 
 import logging
-from collections import OrderedDict
 from typing import Any
 
-from fastapi import APIRouter, Header, Request, Response
+from fastapi import APIRouter, Depends, Header, Request, Response
+from redis import Redis
+from rq import Queue
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
+from app.api.deps import get_dedup, get_executor, get_queue, get_redis
+from app.bot.telegram_client import deliver_sync, send_message
 from app.config import settings
+from app.core import admission, cancel, lanes, metrics, tracing
 from app.core.acl import is_allowed
-from app.bot.telegram_client import send_message
+from app.core.cancel import RedisCancelStore
+from app.core.dedup import DedupStore
+from app.core.nodes import NodeRegistry
+from app.core.results import RedisResultStore
+from app.core.sessions import RedisSessionStore
+from app.worker.async_exec import InProcessExecutor
+from app.worker.jobs import retry_policy
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-_seen: OrderedDict[int, None] = OrderedDict()
-_SEEN_MAX = 10_000
 
+async def _enqueue(
+    executor: InProcessExecutor | None,
+    queue: Queue,
+    redis: Redis,
+    chat_id: int,
+    user_id: int,
+    prompt: str,
+    use_cache: bool,
+    lane: str,
+) -> tuple[int, float] | None:
+    """Queue a Claude job; return its position and expected wait, or None if the executor is full.
+
+    Raises :class:`~app.core.admission.OverloadError` if the expected wait is
+    over the lane's budget.
+    """
+    with tracing.span("enqueue", lane=lane):
+        if executor is not None:
+            position = executor.submit(chat_id, user_id, prompt, use_cache, lane=lane)
+            if position is None:
+                return None
+            return position, executor.wait_estimate(position, lane)
+        # RQ talks to Redis synchronously; keep it off the event loop
+        meta = {"traceparent": tracing.traceparent(), "lane": lane}
+        return await run_in_threadpool(
+            _enqueue_rq, queue, redis, chat_id, user_id, prompt, use_cache, meta
+        )
+
+
+def _enqueue_rq(
+    queue: Queue,
+    redis: Redis,
+    chat_id: int,
+    user_id: int,
+    prompt: str,
+    use_cache: bool,
+    meta: dict[str, Any],
+) -> tuple[int, float]:
+    lane = meta["lane"]
+    if lane != lanes.FAST:
+        queue = Queue(lanes.queue_name(lane), connection=queue.connection)
+    slots = _rq_slots(redis, lane)
+    service_sec = admission.RedisServiceTimes(redis).mean(lane)
+    admission.admit(lane, queue.count, slots, service_sec)
+    meta["ticket"] = cancel.issue_ticket(chat_id, RedisCancelStore(redis))
+    meta["deadline"] = admission.deadline(lane)
+    queue.enqueue(
+        "app.worker.jobs.execute_claude_task", chat_id, user_id, prompt, use_cache,
+        meta=meta, job_timeout=lanes.timeout_sec(lane) + 60, retry=retry_policy(),
+    )
+    position = queue.count
+    return position, admission.estimate(position, slots, service_sec)
+
+
+def _rq_slots(redis: Redis, lane: str) -> int:
+    """Workers serving *lane*, from the node heartbeats (the configured budget if none)."""
+    try:
+        nodes = NodeRegistry(redis).nodes()
+    except Exception:
+        logger.exception("node_registry_error")
+        nodes = []
+    workers = sum(
+        int(node.get("slots", 0)) for node in nodes
+        if lane in (name.strip() for name in str(node.get("lanes", lane)).split(","))
+    )
+    if lane == lanes.FAST:
+        return workers or lanes.concurrency(lane)
+    return min(workers, lanes.concurrency(lane)) if workers else lanes.concurrency(lane)
 
-def _dedup(update_id: int) -> bool:
-    if update_id in _seen:
-        return True
-    _seen[update_id] = None
-    if len(_seen) > _SEEN_MAX:
-        _seen.popitem(last=False)
-    return False
+
+def _accepted_text(accepted: tuple[int, float] | None, lane: str) -> str:
+    if accepted is None:
+        return "Busy right now, please try again in a few minutes."
+    position, wait_sec = accepted
+    where = " in the background lane" if lane == lanes.BULK else ""
+    if position > 1:
+        eta = admission.eta_text(wait_sec)
+        return f"Accepted{where}, queue position {position}, starting in {eta}."
+    return f"Accepted{where}, processing..."
+
+
+async def _admit(
+    executor: InProcessExecutor | None,
+    queue: Queue,
+    redis: Redis,
+    chat_id: int,
+    user_id: int,
+    prompt: str,
+    use_cache: bool,
+    lane: str,
+) -> None:
+    """Queue the prompt and tell the user where it stands, or to try later."""
+    try:
+        accepted = await _enqueue(
+            executor, queue, redis, chat_id, user_id, prompt, use_cache, lane
+        )
+    except admission.OverloadError as exc:
+        await send_message(chat_id, admission.busy_text(exc.wait_sec))
+        return
+    await send_message(chat_id, _accepted_text(accepted, lane))
 
 
 @router.post("/webhook")
 async def telegram_webhook(
     request: Request,
     x_telegram_bot_api_secret_token: str | None = Header(None),
+    executor: InProcessExecutor | None = Depends(get_executor),
+    queue: Queue = Depends(get_queue),
+    redis: Redis = Depends(get_redis),
+    dedup: DedupStore = Depends(get_dedup),
 ) -> Response:
     # Verify secret
     if settings.telegram_webhook_secret:
         if x_telegram_bot_api_secret_token != settings.telegram_webhook_secret:
             return Response(status_code=403)
 
-    data: dict[str, Any] = await request.json()
+    with metrics.WEBHOOK_SECONDS.time(), tracing.attach(), tracing.span("webhook"):
+        data: dict[str, Any] = await request.json()
+        return await _handle_update(data, executor, queue, redis, dedup)
+
+
+async def _handle_update(
+    data: dict[str, Any],
+    executor: InProcessExecutor | None,
+    queue: Queue,
+    redis: Redis,
+    dedup: DedupStore,
+) -> Response:
     update_id = data.get("update_id", 0)
 
-    if _dedup(update_id):
+    if await dedup.is_duplicate(update_id):
+        metrics.DEDUP_HITS.inc()
         return Response(status_code=200)
+    try:
+        return await _handle_message(data, executor, queue, redis)
+    except Exception:
+        # The claim is cluster-wide: without this every node would drop the redelivery
+        await dedup.release(update_id)
+        raise
+
 
+async def _handle_message(
+    data: dict[str, Any],
+    executor: InProcessExecutor | None,
+    queue: Queue,
+    redis: Redis,
+) -> Response:
     message = data.get("message")
     if not message:
         return Response(status_code=200)
@@ -75,43 +205,79 @@ async def telegram_webhook(
 
     if cmd == "/help":
         lines = [
-            "*TeleClaudeCode Help*\n",
+            "**TeleClaudeCode Help**\n",
             "- `/ask <question>` -- Ask Claude Code",
+            "- `/bg <task>` -- Run a long task in the background lane",
+            "- `/new` -- Start a new conversation",
+            "- `/cancel` -- Stop your running and queued questions",
+            "- `/last` -- Send the last answer again",
             "- `/start` -- Welcome message",
             "- `/help` -- This help\n",
         ]
+        if settings.response_cache:
+            lines.insert(2, "- `/ask! <question>` -- Ask, bypassing cached answers")
         if settings.direct_chat:
             lines.insert(1, "You can also just type your question directly!\n")
         await send_message(chat_id, "\n".join(lines))
         return Response(status_code=200)
 
-    if cmd == "/ask":
+    # These act on the chat's conversation, jobs and answers, which in a group
+    # are not only the sender's
+    if cmd in ("/new", "/cancel", "/last") and not is_allowed(user_id):
+        metrics.ACL_DENIALS.inc()
+        await send_message(chat_id, "Access denied.")
+        return Response(status_code=200)
+
+    if cmd == "/new":
+        if executor is not None:
+            executor.sessions.reset(chat_id)
+        else:
+            await run_in_threadpool(RedisSessionStore(redis).reset, chat_id)
+        await send_message(chat_id, "Started a new conversation.")
+        return Response(status_code=200)
+
+    if cmd == "/cancel":
+        if executor is not None:
+            executor.cancel(chat_id)
+        else:
+            await run_in_threadpool(cancel.cancel_chat, chat_id, RedisCancelStore(redis))
+        await send_message(chat_id, "Cancelled.")
+        return Response(status_code=200)
+
+    if cmd == "/last":
+        if executor is not None:
+            last = executor.results.last(chat_id)
+        else:
+            last = await run_in_threadpool(RedisResultStore(redis).last, chat_id)
+        if last is None:
+            await send_message(chat_id, "No saved answer for this chat.")
+            return Response(status_code=200)
+        # Delivery retries with backoff; answer Telegram first so it does not redeliver
+        delivery = BackgroundTask(deliver_sync, chat_id, last.text)
+        return Response(status_code=200, background=delivery)
+
+    if cmd in ("/ask", "/ask!", "/bg"):
         if not is_allowed(user_id):
+            metrics.ACL_DENIALS.inc()
             await send_message(chat_id, "Access denied.")
             return Response(status_code=200)
         if not arg.strip():
             await send_message(chat_id, "Please provide a question.")
             return Response(status_code=200)
-        # Enqueue to Redis
-        from redis import Redis
-        from rq import Queue
-        conn = Redis.from_url(settings.redis_url)
-        q = Queue(settings.queue_name, connection=conn)
-        q.enqueue("app.worker.jobs.execute_claude_task", chat_id, user_id, arg.strip())
-        await send_message(chat_id, "Accepted, processing...")
+        # "/ask!" bypasses the response cache; "/bg" forces the bulk lane
+        prompt = arg.strip()
+        lane = lanes.BULK if cmd == "/bg" else lanes.classify(prompt)
+        await _admit(executor, queue, redis, chat_id, user_id, prompt, cmd != "/ask!", lane)
         return Response(status_code=200)
 
     # Direct chat
     if not cmd and settings.direct_chat:
         if not is_allowed(user_id):
+            metrics.ACL_DENIALS.inc()
             await send_message(chat_id, "Access denied.")
             return Response(status_code=200)
-        from redis import Redis
-        from rq import Queue
-        conn = Redis.from_url(settings.redis_url)
-        q = Queue(settings.queue_name, connection=conn)
-        q.enqueue("app.worker.jobs.execute_claude_task", chat_id, user_id, text.strip())
-        await send_message(chat_id, "Accepted, processing...")
+        lane = lanes.classify(text.strip())
+        await _admit(executor, queue, redis, chat_id, user_id, text.strip(), True, lane)
         return Response(status_code=200)
 
     return Response(status_code=200)
@@ -0,0 +1,77 @@
+"""Delivery policy: short answers inline, long ones as a summary plus a file.
+
+Sending a long answer as ``[i/N]`` messages costs one rate-limited call
+per chunk and is hard to read on a phone. Above
+``telegram_inline_max_chunks`` chunks the answer is instead sent as a
+short summary message followed by a ``sendDocument`` upload of the full
+text. The upload is streamed from a spooled temporary file, so large
+answers are not copied into one more in-memory request body.
+"""
+
+from __future__ import annotations
+
+import logging
+import tempfile
+from typing import IO
+
+from app.bot import tg_api
+from app.config import settings
+from app.core.chunker import chunk_text
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_NAME = "answer.md"
+_WRITE_CHARS = 64 * 1024
+
+
+def as_document(text: str) -> bool:
+    """True if *text* should be sent as a document rather than inline."""
+    max_chunks = settings.telegram_inline_max_chunks
+    return max_chunks > 0 and len(chunk_text(text)) > max_chunks
+
+
+def truncate(text: str) -> str:
+    """Cap *text* at ``claude_max_output_chars`` when documents are disabled."""
+    max_chars = settings.claude_max_output_chars
+    if settings.telegram_inline_max_chunks > 0 or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "\n\n... (output truncated)"
+
+
+def summary(text: str) -> str:
+    """The opening of *text*, cut at a line or word boundary, plus a pointer to the file."""
+    limit = settings.telegram_document_summary_chars
+    head = chunk_text(text[: limit * 2], limit)[0].rstrip()
+    return f"{head}\n\n… full answer ({len(text):,} chars) attached as {DOCUMENT_NAME}"
+
+
+def _spool(text: str) -> IO[bytes]:
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.telegram_document_spool_bytes)
+    for start in range(0, len(text), _WRITE_CHARS):
+        spool.write(text[start : start + _WRITE_CHARS].encode("utf-8"))
+    spool.seek(0)
+    return spool
+
+
+def send_document_sync(chat_id: int, text: str, filename: str = DOCUMENT_NAME) -> bool:
+    """Upload *text* as a file; return False if Telegram did not accept it."""
+    with _spool(text) as spool:
+        try:
+            resp = tg_api.call(
+                "sendDocument",
+                {"chat_id": chat_id},
+                files={"document": (filename, spool, "text/markdown")},
+            )
+        except Exception:
+            logger.exception("document_error chat_id=%s", chat_id)
+            return False
+    if resp.status_code != 200:
+        logger.warning(
+            "document_rejected chat_id=%s status=%d body=%.200s",
+            chat_id,
+            resp.status_code,
+            resp.text,
+        )
+        return False
+    logger.info("document_sent chat_id=%s chars=%d", chat_id, len(text))
+    return True
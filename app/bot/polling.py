@@ -2,29 +2,60 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+import uuid
+from functools import partial
 from typing import Any
 
-import httpx
-
+from app.bot import tg_api
+from app.bot.telegram_client import (
+    StreamingMessage,
+    deliver_saved,
+    deliver_sync,
+    send_message_sync,
+)
 from app.config import settings
+from app.core import admission, cancel, lanes, metrics, tracing, workspaces
+from app.core import cache as response_cache
 from app.core.acl import is_allowed
-from app.core.chunker import chunk_text
-from app.worker.claude_exec import run_claude
+from app.core.cancel import MemoryCancelStore
+from app.core.limiter import get_limiter
+from app.core.offsets import OffsetStore, get_offset_store
+from app.core.results import MemoryResultStore
+from app.core.scheduler import FairScheduler
+from app.core.sessions import MemorySessionStore
+from app.worker.claude_exec import run_claude, stream_claude
+from app.worker.claude_pool import close_pool, get_pool
 
 logger = logging.getLogger(__name__)
 
-_API_BASE = "https://api.telegram.org/bot{token}"
+# Fair per-user scheduler in front of a thread pool for claude requests, one per lane
+_schedulers = {
+    lane: FairScheduler(
+        max_workers=lanes.concurrency(lane),
+        per_user=settings.claude_concurrency_per_user,
+        limiter=get_limiter(),
+    )
+    for lane in lanes.LANES
+}
+
+# chat_id -> Claude session id, for conversation continuity across messages
+_sessions = MemorySessionStore()
+
+# Per-chat tickets, so /cancel can drop queued prompts and kill running ones
+_cancels = MemoryCancelStore()
 
-# Thread pool for concurrent claude requests
-_executor = ThreadPoolExecutor(max_workers=settings.claude_global_concurrency)
+# Answers saved before delivery, so /last can re-send them
+_results = MemoryResultStore()
 
+# Recent job durations per lane, for queue-wait estimates
+_service = admission.MemoryServiceTimes()
 
-def _url(method: str) -> str:
-    return f"{_API_BASE.format(token=settings.telegram_bot_token)}/{method}"
+# Handlers only understand messages; ask Telegram not to send anything else
+_ALLOWED_UPDATES = ["message"]
 
 
 def _extract_command(text: str) -> tuple[str, str]:
@@ -41,39 +72,21 @@ def _send_typing(chat_id: int, stop_event: threading.Event) -> None:
     """Send 'typing...' indicator every 4s until stop_event is set."""
     while not stop_event.is_set():
         try:
-            with httpx.Client(timeout=10) as client:
-                client.post(
-                    _url("sendChatAction"),
-                    json={"chat_id": chat_id, "action": "typing"},
-                )
+            tg_api.send_chat_action(chat_id)
         except Exception:
-            pass
+            # The indicator is cosmetic; a failed one must not stop the run
+            logger.debug("typing_error chat_id=%s", chat_id, exc_info=True)
         stop_event.wait(4)
 
 
 def _send_sync(chat_id: int, text: str, parse_mode: str | None = "Markdown") -> None:
-    chunks = chunk_text(text)
-    total = len(chunks)
-    with httpx.Client(timeout=30) as client:
-        for i, chunk in enumerate(chunks, 1):
-            body = chunk
-            if total > 1:
-                body = f"[{i}/{total}]\n{chunk}"
-            payload: dict[str, Any] = {"chat_id": chat_id, "text": body}
-            if parse_mode:
-                payload["parse_mode"] = parse_mode
-            try:
-                resp = client.post(_url("sendMessage"), json=payload)
-                if resp.status_code == 400 and parse_mode:
-                    payload.pop("parse_mode", None)
-                    client.post(_url("sendMessage"), json=payload)
-            except Exception:
-                logger.exception("send_error chat_id=%s chunk=%d/%d", chat_id, i, total)
+    send_message_sync(chat_id, text, parse_mode)
 
 
-def _do_ask(chat_id: int, user_id: int, prompt: str) -> None:
+def _do_ask(chat_id: int, user_id: int, prompt: str, use_cache: bool = True) -> None:
     """Execute Claude Code and send the result, with typing indicator."""
     if not is_allowed(user_id):
+        metrics.ACL_DENIALS.inc()
         _send_sync(chat_id, "Access denied. Contact the admin.")
         return
 
@@ -81,6 +94,18 @@ def _do_ask(chat_id: int, user_id: int, prompt: str) -> None:
         _send_sync(chat_id, "Please provide a question, e.g.: `/ask how to sort a list?`")
         return
 
+    resume, on_session = None, None
+    if settings.claude_sessions:
+        resume, on_session = _sessions.get(chat_id), partial(_sessions.set, chat_id)
+
+    cache_key = None
+    if use_cache and resume is None:
+        cache_key, cached = response_cache.lookup(prompt.strip(), user_id)
+        if cached is not None:
+            logger.info("cache_hit user_id=%s output_len=%d", user_id, len(cached))
+            deliver_sync(chat_id, cached)
+            return
+
     # Immediately acknowledge the message
     _send_sync(chat_id, "Received, thinking...")
 
@@ -91,12 +116,18 @@ def _do_ask(chat_id: int, user_id: int, prompt: str) -> None:
 
     logger.info("ask user_id=%s chat_id=%s prompt_len=%d", user_id, chat_id, len(prompt))
 
+    stream = StreamingMessage(chat_id) if settings.claude_stream_output else None
     try:
-        output = run_claude(prompt.strip())
+        if stream is not None:
+            output = stream_claude(prompt.strip(), stream.update, resume, on_session)
+        else:
+            output = run_claude(prompt.strip(), resume, on_session)
     except RuntimeError as exc:
         stop_typing.set()
         error_msg = str(exc)
-        if "timed out" in error_msg:
+        if "cancelled" in error_msg:
+            logger.info("cancelled user_id=%s", user_id)
+        elif "timed out" in error_msg:
             _send_sync(chat_id, "Timed out. Try a shorter question or retry later.")
         elif "not found" in error_msg:
             _send_sync(chat_id, "Claude Code binary not found. Check CLAUDE_BIN config.")
@@ -110,8 +141,65 @@ def _do_ask(chat_id: int, user_id: int, prompt: str) -> None:
         return
 
     stop_typing.set()
-    _send_sync(chat_id, output)
-    logger.info("done user_id=%s output_len=%d", user_id, len(output))
+    response_cache.store(cache_key, output)
+    result = _results.save(chat_id, uuid.uuid4().hex, output)
+    delivered = deliver_saved(chat_id, result, _results, stream)
+    logger.info("done user_id=%s output_len=%d delivered=%s", user_id, len(output), delivered)
+
+
+def _ask_job(
+    chat_id: int,
+    user_id: int,
+    prompt: str,
+    use_cache: bool,
+    ticket: int,
+    lane: str,
+    deadline: float | None = None,
+) -> None:
+    if cancel.should_skip(chat_id, ticket, _cancels):
+        return
+    if admission.expired(deadline, lane):
+        _send_sync(chat_id, admission.EXPIRED_TEXT)
+        return
+    start = time.monotonic()
+    try:
+        with (
+            tracing.span("job", executor="polling", lane=lane),
+            cancel.job(chat_id, ticket, _cancels),
+            lanes.use(lane),
+            workspaces.use(chat_id),
+        ):
+            _do_ask(chat_id, user_id, prompt, use_cache)
+    finally:
+        _service.record(lane, time.monotonic() - start)
+
+
+def _submit(
+    chat_id: int, user_id: int, prompt: str, use_cache: bool = True, lane: str | None = None
+) -> None:
+    lane = lane or lanes.classify(prompt)
+    scheduler = _schedulers[lane]
+    slots = admission.local_slots(lane, lanes.concurrency(lane))
+    service_sec = _service.mean(lane)
+    try:
+        admission.admit(lane, scheduler.queue_depth(), slots, service_sec)
+    except admission.OverloadError as exc:
+        _send_sync(chat_id, admission.busy_text(exc.wait_sec))
+        return
+    ticket = _cancels.next_ticket(chat_id)
+    position = scheduler.submit(
+        user_id, _ask_job, chat_id, user_id, prompt, use_cache, ticket, lane,
+        admission.deadline(lane),
+    )
+    if position:
+        logger.info("queued user_id=%s lane=%s position=%d", user_id, lane, position)
+        where = " in the background lane" if lane == lanes.BULK else ""
+        eta = admission.eta_text(admission.estimate(position, slots, service_sec))
+        _send_sync(chat_id, f"Queued{where}, position {position}, starting in {eta}.")
+
+
+def _queue_depth() -> int:
+    return sum(scheduler.queue_depth() for scheduler in _schedulers.values())
 
 
 def _handle_message(message: dict[str, Any]) -> None:
@@ -137,11 +225,17 @@ def _handle_message(message: dict[str, Any]) -> None:
 
     if cmd == "/help":
         lines = [
-            "*TeleClaudeCode Help*\n",
+            "**TeleClaudeCode Help**\n",
             "- `/ask <question>` -- Ask Claude Code",
+            "- `/bg <task>` -- Run a long task in the background lane",
+            "- `/new` -- Start a new conversation",
+            "- `/cancel` -- Stop your running and queued questions",
+            "- `/last` -- Send the last answer again",
             "- `/start` -- Welcome message",
             "- `/help` -- This help\n",
         ]
+        if settings.response_cache:
+            lines.insert(2, "- `/ask! <question>` -- Ask, bypassing cached answers")
         if settings.direct_chat:
             lines.insert(1, "You can also just type your question directly!\n")
         lines.extend([
@@ -152,14 +246,43 @@ def _handle_message(message: dict[str, Any]) -> None:
         _send_sync(chat_id, "\n".join(lines))
         return
 
-    if cmd == "/ask":
-        # Submit to thread pool — don't block polling loop
-        _executor.submit(_do_ask, chat_id, user_id, arg)
+    # These act on the chat's conversation, jobs and answers, which in a group
+    # are not only the sender's
+    if cmd in ("/new", "/cancel", "/last") and not is_allowed(user_id):
+        metrics.ACL_DENIALS.inc()
+        _send_sync(chat_id, "Access denied. Contact the admin.")
+        return
+
+    if cmd == "/new":
+        _sessions.reset(chat_id)
+        _send_sync(chat_id, "Started a new conversation.")
+        return
+
+    if cmd == "/cancel":
+        cancel.cancel_chat(chat_id, _cancels)
+        _send_sync(chat_id, "Cancelled.")
+        return
+
+    if cmd == "/last":
+        last = _results.last(chat_id)
+        if last is None:
+            _send_sync(chat_id, "No saved answer for this chat.")
+        else:
+            deliver_sync(chat_id, last.text)
+        return
+
+    if cmd in ("/ask", "/ask!"):
+        # Submit to the scheduler — don't block polling loop; "/ask!" skips the cache
+        _submit(chat_id, user_id, arg, use_cache=cmd == "/ask")
+        return
+
+    if cmd == "/bg":
+        _submit(chat_id, user_id, arg, lane=lanes.BULK)
         return
 
     # Direct chat mode: treat any non-command text as a claude prompt
     if not cmd and settings.direct_chat:
-        _executor.submit(_do_ask, chat_id, user_id, text)
+        _submit(chat_id, user_id, text)
         return
 
     return
@@ -172,42 +295,84 @@ def run_polling() -> None:
         print("ERROR: TELEGRAM_BOT_TOKEN not set. Check your .env file.")
         return
 
-    with httpx.Client(timeout=10) as client:
-        client.post(_url("deleteWebhook"))
+    tg_api.call("deleteWebhook", {}, timeout=10)
+    metrics.QUEUE_DEPTH.set_function(_queue_depth)
+    metrics.start_server()
 
     print(f"TeleClaudeCode polling started (bot token ...{token[-6:]})")
-    print(f"Concurrent workers: {settings.claude_global_concurrency}")
+    print(
+        f"Concurrent workers: {settings.claude_global_concurrency} "
+        f"(+{settings.lane_bulk_concurrency} for background tasks)"
+    )
+    if settings.claude_executor == "pool":
+        get_pool()
+        print("Warm Claude process pool started.")
     print("Press Ctrl+C to stop.\n")
 
-    offset = 0
-    while True:
-        try:
-            with httpx.Client(timeout=35) as client:
-                resp = client.post(
-                    _url("getUpdates"),
-                    json={"offset": offset, "timeout": 30},
+    offsets = get_offset_store()
+    try:
+        asyncio.run(_poll_updates(offsets))
+    except KeyboardInterrupt:
+        print("\nShutting down thread pool...")
+    finally:
+        for scheduler in _schedulers.values():
+            scheduler.shutdown(wait=False)
+        close_pool()
+        tg_api.close()
+        print("Stopped.")
+
+
+async def _poll_updates(offsets: OffsetStore) -> None:
+    """Fetch update batches on one persistent connection and dispatch them concurrently."""
+    offset = offsets.load()
+    logger.info("polling_resume offset=%d", offset)
+    payload: dict[str, Any] = {
+        "timeout": settings.polling_timeout_sec,
+        "limit": settings.polling_limit,
+        "allowed_updates": _ALLOWED_UPDATES,
+    }
+    try:
+        while True:
+            try:
+                resp = await tg_api.acall(
+                    "getUpdates", {**payload, "offset": offset},
+                    timeout=settings.polling_timeout_sec + 5,
                 )
                 data = resp.json()
+            except Exception:
+                logger.exception("polling_error")
+                await asyncio.sleep(5)
+                continue
 
             if not data.get("ok"):
                 logger.warning("getUpdates failed: %s", data)
-                time.sleep(5)
+                await asyncio.sleep(5)
+                continue
+
+            updates: list[dict[str, Any]] = data.get("result", [])
+            if not updates:
                 continue
+            await _dispatch_batch(updates)
+            offset = updates[-1]["update_id"] + 1
+            await asyncio.to_thread(offsets.save, offset)
+    finally:
+        await tg_api.aclose()
+
+
+async def _dispatch_batch(updates: list[dict[str, Any]]) -> None:
+    # Chats run concurrently; each chat's updates stay in order (e.g. /new, then a question)
+    by_chat: dict[int, list[dict[str, Any]]] = {}
+    for update in updates:
+        message = update.get("message")
+        if message:
+            by_chat.setdefault(message["chat"]["id"], []).append(update)
+    await asyncio.gather(*(asyncio.to_thread(_handle_updates, batch) for batch in by_chat.values()))
 
-            for update in data.get("result", []):
-                offset = update["update_id"] + 1
-                message = update.get("message")
-                if message:
-                    try:
-                        _handle_message(message)
-                    except Exception:
-                        logger.exception("handle_error update_id=%s", update.get("update_id"))
-
-        except KeyboardInterrupt:
-            print("\nShutting down thread pool...")
-            _executor.shutdown(wait=False)
-            print("Stopped.")
-            break
+
+def _handle_updates(updates: list[dict[str, Any]]) -> None:
+    for update in updates:
+        try:
+            with tracing.attach(), tracing.span("update", update_id=update["update_id"]):
+                _handle_message(update["message"])
         except Exception:
-            logger.exception("polling_error")
-            time.sleep(5)
+            logger.exception("handle_error update_id=%s", update.get("update_id"))
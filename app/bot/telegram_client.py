@@ -1,61 +1,311 @@
-"""Async Telegram message sender (for webhook mode)."""
+"""Telegram message senders (async for webhook mode, sync for workers)."""
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from collections.abc import Callable, Iterator
+from functools import partial
 from typing import Any
 
 import httpx
 
+from app.bot import delivery, tg_api
 from app.config import settings
+from app.core import formatter, metrics
 from app.core.chunker import chunk_text
+from app.core.results import Result, ResultStore
 
 logger = logging.getLogger(__name__)
 
-_API_BASE = "https://api.telegram.org/bot{token}"
+_MAX_BACKOFF_SEC = 60.0
 
 
-def _url(method: str) -> str:
-    return f"{_API_BASE.format(token=settings.telegram_bot_token)}/{method}"
+def _payloads(
+    chat_id: int, text: str, parse_mode: str | None
+) -> Iterator[tuple[dict[str, Any], str]]:
+    """Yield each chunk's sendMessage payload and its plain-text fallback."""
+    chunks = chunk_text(text)
+    total = len(chunks)
+    for i, chunk in enumerate(chunks, 1):
+        body = chunk
+        if total > 1:
+            body = f"[{i}/{total}]\n{chunk}"
+        rendered, mode = formatter.prepare(body, parse_mode)
+        payload: dict[str, Any] = {"chat_id": chat_id, "text": rendered}
+        if mode:
+            payload["parse_mode"] = mode
+        yield payload, body
+
+
+def _parse_fallback(payload: dict[str, Any], body: str) -> dict[str, Any]:
+    metrics.TELEGRAM_PARSE_FALLBACKS.inc()
+    logger.warning(
+        "parse_fallback chat_id=%s parse_mode=%s", payload["chat_id"], payload["parse_mode"]
+    )
+    return {"chat_id": payload["chat_id"], "text": body}
 
 
 async def send_message(chat_id: int, text: str, parse_mode: str | None = "Markdown") -> None:
-    """Send a (possibly long) message, splitting into chunks."""
-    chunks = chunk_text(text)
-    total = len(chunks)
-    async with httpx.AsyncClient(timeout=30) as client:
-        for i, chunk in enumerate(chunks, 1):
-            body = chunk
-            if total > 1:
-                body = f"[{i}/{total}]\n{chunk}"
-            payload: dict[str, Any] = {"chat_id": chat_id, "text": body}
-            if parse_mode:
-                payload["parse_mode"] = parse_mode
-            try:
-                resp = await client.post(_url("sendMessage"), json=payload)
-                if resp.status_code == 400 and parse_mode:
-                    payload.pop("parse_mode", None)
-                    await client.post(_url("sendMessage"), json=payload)
-            except Exception:
-                logger.exception("send_error chat_id=%s chunk=%d/%d", chat_id, i, total)
-
-
-def send_message_sync(chat_id: int, text: str, parse_mode: str | None = "Markdown") -> None:
-    """Synchronous wrapper for use in RQ workers."""
-    chunks = chunk_text(text)
-    total = len(chunks)
-    with httpx.Client(timeout=30) as client:
-        for i, chunk in enumerate(chunks, 1):
-            body = chunk
-            if total > 1:
-                body = f"[{i}/{total}]\n{chunk}"
-            payload: dict[str, Any] = {"chat_id": chat_id, "text": body}
-            if parse_mode:
-                payload["parse_mode"] = parse_mode
-            try:
-                resp = client.post(_url("sendMessage"), json=payload)
-                if resp.status_code == 400 and parse_mode:
-                    payload.pop("parse_mode", None)
-                    client.post(_url("sendMessage"), json=payload)
-            except Exception:
-                logger.exception("send_error chat_id=%s chunk=%d/%d", chat_id, i, total)
+    """Send a (possibly long) message, splitting into chunks.
+
+    Markdown is converted for Telegram (see :mod:`app.core.formatter`); a
+    chunk Telegram still rejects is re-sent as plain text.
+    """
+    for payload, body in _payloads(chat_id, text, parse_mode):
+        try:
+            resp = await tg_api.acall("sendMessage", payload)
+            if resp.status_code == 400 and "parse_mode" in payload:
+                await tg_api.acall("sendMessage", _parse_fallback(payload, body))
+        except Exception:
+            logger.exception("send_error chat_id=%s", chat_id)
+
+
+# Rejections a retry cannot fix: a bad request, or a chat that is gone or blocked the bot
+_FINAL_STATUSES = (400, 403)
+
+
+def _settled(resp: httpx.Response) -> bool:
+    """True if Telegram took the message or rejected it for good.
+
+    Server errors and a 429 still there after :mod:`app.bot.tg_api`'s own
+    retries are worth retrying later, so they are not settled.
+    """
+    if resp.status_code == 200:
+        return True
+    if resp.status_code in _FINAL_STATUSES:
+        logger.warning("send_rejected status=%d body=%.200s", resp.status_code, resp.text)
+        return True
+    return False
+
+
+def _send_payload(payload: dict[str, Any], body: str) -> bool:
+    resp = tg_api.call("sendMessage", payload)
+    if resp.status_code == 400 and "parse_mode" in payload:
+        resp = tg_api.call("sendMessage", _parse_fallback(payload, body))
+    return _settled(resp)
+
+
+def send_message_sync(chat_id: int, text: str, parse_mode: str | None = "Markdown") -> bool:
+    """Synchronous wrapper for use in RQ workers; False if a chunk may not have arrived."""
+    settled = True
+    for payload, body in _payloads(chat_id, text, parse_mode):
+        try:
+            settled = _send_payload(payload, body) and settled
+        except Exception:
+            logger.exception("send_error chat_id=%s", chat_id)
+            settled = False
+    return settled
+
+
+async def deliver(chat_id: int, text: str) -> None:
+    """Send Claude's answer inline, or as a summary plus a file when it is long."""
+    if not delivery.as_document(text):
+        await send_message(chat_id, delivery.truncate(text))
+        return
+    await send_message(chat_id, delivery.summary(text))
+    if not await asyncio.to_thread(delivery.send_document_sync, chat_id, text):
+        await send_message(chat_id, text)
+
+
+def _parts(chat_id: int, text: str) -> list[Callable[[], bool]]:
+    """The sends that make up delivering *text*, in order; each is retried on its own."""
+    if not delivery.as_document(text):
+        return [
+            partial(_send_payload, payload, body)
+            for payload, body in _payloads(chat_id, delivery.truncate(text), "Markdown")
+        ]
+    return [
+        partial(send_message_sync, chat_id, delivery.summary(text)),
+        lambda: delivery.send_document_sync(chat_id, text) or send_message_sync(chat_id, text),
+    ]
+
+
+def _with_retries(send: Callable[[], bool], chat_id: int) -> bool:
+    for attempt in range(1, settings.delivery_max_attempts + 1):
+        try:
+            if send():
+                return True
+        except Exception:
+            logger.exception("deliver_error chat_id=%s attempt=%d", chat_id, attempt)
+        if attempt < settings.delivery_max_attempts:
+            time.sleep(min(_MAX_BACKOFF_SEC, settings.delivery_backoff_sec * 2 ** (attempt - 1)))
+    return False
+
+
+def deliver_sync(
+    chat_id: int, text: str, start: int = 0, on_ack: Callable[[int], None] | None = None
+) -> bool:
+    """Synchronous :func:`deliver` for workers and polling mode.
+
+    Sends part by part from part *start*, retrying each with exponential
+    backoff; *on_ack* receives the number of parts delivered after each
+    one. Returns False if a part could not be delivered.
+    """
+    parts = _parts(chat_id, text)
+    for i in range(start, len(parts)):
+        if not _with_retries(parts[i], chat_id):
+            logger.warning(
+                "deliver_incomplete chat_id=%s acked=%d parts=%d", chat_id, i, len(parts)
+            )
+            return False
+        if on_ack is not None:
+            on_ack(i + 1)
+    return True
+
+
+def deliver_saved(
+    chat_id: int,
+    result: Result,
+    store: ResultStore,
+    stream: StreamingMessage | None = None,
+) -> bool:
+    """Deliver a saved answer from its first unacknowledged part, recording progress.
+
+    With *stream*, the answer is first rendered into the streamed messages;
+    only if that fails is it sent again part by part.
+    """
+
+    progress = [result.acked]
+
+    def _ack(acked: int, done: bool = False) -> None:
+        progress[0] = acked
+        try:
+            store.ack(result.job_id, acked, done)
+        except Exception:
+            logger.exception("result_ack_error chat_id=%s job_id=%s", chat_id, result.job_id)
+
+    if stream is not None:
+        if stream.finish(result.text):
+            _ack(stream.delivered, done=True)
+            return True
+        if stream.delivered > progress[0]:
+            _ack(stream.delivered)  # resume after the streamed parts already on screen
+    if deliver_sync(chat_id, result.text, progress[0], _ack):
+        _ack(progress[0], done=True)
+        return True
+    return False
+
+
+class StreamingMessage:
+    """Progressively render streamed Claude output into Telegram messages.
+
+    The first ``update`` sends a message; later updates edit it with
+    ``editMessageText``, at most once per ``telegram_edit_interval_sec``.
+    Once the text outgrows a single chunk, the full chunks are frozen and
+    a new message is started for the remainder, up to
+    ``telegram_inline_max_chunks`` messages. If the final answer is longer
+    than that, the messages are replaced by a summary and the full text is
+    sent as a file (see :mod:`app.bot.delivery`).
+    """
+
+    def __init__(self, chat_id: int, interval: float | None = None) -> None:
+        self.chat_id = chat_id
+        self._interval = settings.telegram_edit_interval_sec if interval is None else interval
+        self._message_ids: list[int] = []
+        self._rendered: list[str] = []  # text each message is known to show
+        self._last_flush = 0.0
+        self.delivered = 0  # leading delivery parts (see deliver_sync) finish() got across
+
+    def due(self) -> bool:
+        """True once the throttle interval since the last flush has passed."""
+        return time.monotonic() - self._last_flush >= self._interval
+
+    def update(self, text: str) -> None:
+        """Record the accumulated text, flushing if the throttle interval has passed."""
+        if not self.due():
+            return
+        self._flush(text)
+
+    def finish(self, text: str, parse_mode: str | None = "Markdown") -> bool:
+        """Render the final text, then apply formatting to messages that have any.
+
+        Returns False if part of the answer could not be sent.
+        """
+        self._last_flush = time.monotonic()
+        complete = True
+        if delivery.as_document(text):
+            summary = delivery.summary(text)
+            self._render([summary])
+            self._drop_after(1)
+            self.delivered = self._confirmed([summary])
+            if self.delivered and (
+                delivery.send_document_sync(self.chat_id, text)
+                or send_message_sync(self.chat_id, text, parse_mode)
+            ):
+                self.delivered = 2
+            complete = self.delivered == 2
+        elif text.strip():
+            chunks = chunk_text(delivery.truncate(text))
+            self._render(chunks)
+            # The preview can outgrow the answer: it holds narration from every tool turn
+            self._drop_after(len(chunks))
+            self.delivered = self._confirmed(chunks)
+            complete = self.delivered == len(chunks)
+        for message_id, chunk in zip(self._message_ids, self._rendered, strict=True):
+            rendered, mode = formatter.prepare(chunk, parse_mode)
+            if mode is None:
+                continue  # plain text, already shown as is
+            payload = {
+                "chat_id": self.chat_id,
+                "message_id": message_id,
+                "text": rendered,
+                "parse_mode": mode,
+            }
+            if self._call("editMessageText", payload) is None:
+                # The plain-text rendering is already visible, nothing to resend
+                metrics.TELEGRAM_PARSE_FALLBACKS.inc()
+        return complete
+
+    def _flush(self, text: str) -> None:
+        self._last_flush = time.monotonic()
+        if not text.strip():
+            return
+        chunks = chunk_text(text)
+        if settings.telegram_inline_max_chunks > 0:
+            chunks = chunks[: settings.telegram_inline_max_chunks]
+        self._render(chunks)
+
+    def _confirmed(self, chunks: list[str]) -> int:
+        """How many leading *chunks* Telegram has confirmed showing."""
+        for i, chunk in enumerate(chunks):
+            if i >= len(self._rendered) or self._rendered[i] != chunk:
+                return i
+        return len(chunks)
+
+    def _drop_after(self, keep: int) -> None:
+        """Delete the messages past the first *keep*."""
+        for message_id in self._message_ids[keep:]:
+            self._call("deleteMessage", {"chat_id": self.chat_id, "message_id": message_id})
+        del self._message_ids[keep:], self._rendered[keep:]
+
+    def _render(self, chunks: list[str]) -> None:
+        for i, chunk in enumerate(chunks):
+            if i < len(self._message_ids):
+                if self._rendered[i] == chunk:
+                    continue
+                edited = self._call(
+                    "editMessageText",
+                    {"chat_id": self.chat_id, "message_id": self._message_ids[i], "text": chunk},
+                )
+                if edited is not None:  # otherwise the message still shows the old text
+                    self._rendered[i] = chunk
+            else:
+                result = self._call("sendMessage", {"chat_id": self.chat_id, "text": chunk})
+                if not result:
+                    return
+                self._message_ids.append(result["message_id"])
+                self._rendered.append(chunk)
+
+    def _call(self, method: str, payload: dict[str, Any]) -> dict[str, Any] | None:
+        try:
+            resp = tg_api.call(method, payload)
+        except Exception:
+            logger.exception("stream_error chat_id=%s method=%s", self.chat_id, method)
+            return None
+        if resp.status_code != 200:
+            logger.debug("stream_%s status=%d body=%.200s", method, resp.status_code, resp.text)
+            return None
+        result: dict[str, Any] | None = resp.json().get("result")
+        return result if isinstance(result, dict) else None
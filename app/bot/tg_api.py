@@ -0,0 +1,216 @@
+"""Process-wide pooled HTTP clients for the Telegram Bot API.
+
+All Telegram traffic goes through the clients returned here so that
+connections to api.telegram.org are kept alive and reused instead of
+paying a TCP+TLS handshake per request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import threading
+from typing import IO, Any
+
+import httpx
+
+from app.config import settings
+from app.core import metrics, ratelimit, tracing
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TIMEOUT = 30.0
+
+# Multipart uploads: field name -> (filename, file object, content type)
+Files = dict[str, tuple[str, IO[bytes], str]]
+
+# Methods that count against Telegram's per-chat and global flood limits
+_LIMITED_METHODS = frozenset({"sendMessage", "editMessageText", "sendDocument"})
+
+_lock = threading.Lock()
+_client: httpx.Client | None = None
+_async_client: httpx.AsyncClient | None = None
+_async_loop: asyncio.AbstractEventLoop | None = None
+
+
+def api_url(method: str) -> str:
+    base = settings.telegram_api_base.rstrip("/")
+    return f"{base}/bot{settings.telegram_bot_token}/{method}"
+
+
+def _http2_enabled() -> bool:
+    if not settings.telegram_http2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("telegram_http2 requested but h2 is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def _client_kwargs() -> dict[str, Any]:
+    return {
+        "timeout": _DEFAULT_TIMEOUT,
+        "http2": _http2_enabled(),
+        "limits": httpx.Limits(
+            max_connections=settings.telegram_pool_max_connections,
+            max_keepalive_connections=settings.telegram_pool_max_keepalive,
+            keepalive_expiry=settings.telegram_keepalive_expiry_sec,
+        ),
+    }
+
+
+def get_client() -> httpx.Client:
+    """Return the shared synchronous client (thread-safe)."""
+    global _client
+    if _client is None or _client.is_closed:
+        with _lock:
+            if _client is None or _client.is_closed:
+                _client = httpx.Client(**_client_kwargs())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the shared async client for the running event loop.
+
+    An ``AsyncClient`` is bound to the loop it was first used on, so a new
+    one is created if the running loop changed (e.g. between test clients);
+    the previous one is closed so its connection pool is not leaked.
+    """
+    global _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_loop is not loop:
+        if _async_client is not None and not _async_client.is_closed:
+            _close_stale(_async_client, _async_loop, loop)
+        _async_client = httpx.AsyncClient(**_client_kwargs())
+        _async_loop = loop
+    return _async_client
+
+
+_stale_closes: set[asyncio.Future[None]] = set()  # keeps pending closes referenced
+
+
+def _close_stale(
+    client: httpx.AsyncClient,
+    owner: asyncio.AbstractEventLoop | None,
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    """Close *client* on the loop that owns its connections, if that loop still runs."""
+    if owner is not None and owner.is_running() and not owner.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), owner)
+        return
+
+    async def _close() -> None:
+        try:
+            await client.aclose()
+        except Exception:  # its loop is gone; the sockets are dropped with it
+            logger.debug("tg_async_client_close_error", exc_info=True)
+
+    task = loop.create_task(_close())
+    _stale_closes.add(task)
+    task.add_done_callback(_stale_closes.discard)
+
+
+def _retry_after(resp: httpx.Response) -> float:
+    try:
+        return float(resp.json().get("parameters", {}).get("retry_after", 1))
+    except Exception:
+        return 1.0
+
+
+def _post(
+    method: str, payload: dict[str, Any], timeout: float | None, files: Files | None = None
+) -> httpx.Response:
+    kwargs: dict[str, Any] = {"json": payload}
+    if files:
+        for _, file, _ in files.values():
+            file.seek(0)  # rewind when retried after a 429
+        kwargs = {"data": payload, "files": files}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    with metrics.TELEGRAM_SECONDS.labels(method).time(), tracing.span("telegram", method=method):
+        return get_client().post(api_url(method), **kwargs)
+
+
+async def _apost(
+    method: str, payload: dict[str, Any], timeout: float | None = None
+) -> httpx.Response:
+    with metrics.TELEGRAM_SECONDS.labels(method).time(), tracing.span("telegram", method=method):
+        if timeout is None:
+            return await get_async_client().post(api_url(method), json=payload)
+        return await get_async_client().post(api_url(method), json=payload, timeout=timeout)
+
+
+def call(
+    method: str,
+    payload: dict[str, Any],
+    timeout: float | None = None,
+    files: Files | None = None,
+) -> httpx.Response:
+    """POST *payload* to a Bot API method using the shared sync client.
+
+    With *files* the request is sent as ``multipart/form-data`` (uploads).
+    Sending methods are rate limited per chat and globally; a 429 blocks the
+    chat for ``retry_after`` seconds and the call is retried.
+    """
+    if method not in _LIMITED_METHODS:
+        return _post(method, payload, timeout, files)
+    chat_id = payload.get("chat_id")
+    attempt = 0
+    while True:
+        ratelimit.acquire(chat_id)
+        resp = _post(method, payload, timeout, files)
+        if resp.status_code != 429:
+            return resp
+        metrics.TELEGRAM_429.inc()
+        if attempt >= settings.telegram_max_retries:
+            return resp
+        attempt += 1
+        retry_after = _retry_after(resp)
+        logger.warning("tg_429 method=%s chat_id=%s retry_after=%s", method, chat_id, retry_after)
+        ratelimit.penalize(chat_id, retry_after)
+
+
+async def acall(
+    method: str, payload: dict[str, Any], timeout: float | None = None
+) -> httpx.Response:
+    """POST *payload* to a Bot API method using the shared async client."""
+    if method not in _LIMITED_METHODS:
+        return await _apost(method, payload, timeout)
+    chat_id = payload.get("chat_id")
+    attempt = 0
+    while True:
+        await ratelimit.aacquire(chat_id)
+        resp = await _apost(method, payload, timeout)
+        if resp.status_code != 429:
+            return resp
+        metrics.TELEGRAM_429.inc()
+        if attempt >= settings.telegram_max_retries:
+            return resp
+        attempt += 1
+        retry_after = _retry_after(resp)
+        logger.warning("tg_429 method=%s chat_id=%s retry_after=%s", method, chat_id, retry_after)
+        ratelimit.penalize(chat_id, retry_after)
+
+
+def send_chat_action(chat_id: int, action: str = "typing") -> None:
+    """Send a chat action at background priority; skipped when the chat is busy."""
+    if not ratelimit.acquire(chat_id, ratelimit.BACKGROUND):
+        return
+    _post("sendChatAction", {"chat_id": chat_id, "action": action}, 10)
+
+
+def close() -> None:
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose() -> None:
+    global _async_client, _async_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _async_loop = None
@@ -14,25 +14,125 @@ class Settings(BaseSettings):
 
     # Telegram
     telegram_bot_token: str = ""
+    telegram_api_base: str = "https://api.telegram.org"  # or a local Bot API server
     telegram_webhook_secret: str = ""
     telegram_allowed_user_ids: str = ""  # comma-separated
+    dedup_backend: str = "memory"  # "memory" (single process) or "redis" (cluster-safe)
+    dedup_ttl_sec: int = 86400  # how long a handled update_id is remembered in Redis
+    dedup_local_cache_size: int = 10_000  # per-process LRU (front cache for redis)
+    telegram_http2: bool = False  # needs the "http2" extra (h2)
+    telegram_pool_max_connections: int = 20
+    telegram_pool_max_keepalive: int = 10
+    telegram_keepalive_expiry_sec: float = 30.0
+    telegram_rate_limit_backend: str = "memory"  # "memory" or "redis" (multi-worker)
+    telegram_rate_global_per_sec: float = 30.0
+    telegram_rate_chat_per_sec: float = 1.0
+    telegram_rate_group_per_min: float = 20.0
+    telegram_max_retries: int = 3  # retries after a 429 Too Many Requests
+    telegram_parse_mode: str = "html"  # "html", "markdownv2", "markdown" (legacy) or "none"
+    # Long answers: beyond this many chunks, send a summary plus the full text as a file
+    telegram_inline_max_chunks: int = 3  # 0 = always inline (truncated at claude_max_output_chars)
+    telegram_document_summary_chars: int = 600
+    telegram_document_spool_bytes: int = 1_000_000  # kept in memory up to this, then a temp file
 
     # Redis
     redis_url: str = "redis://localhost:6379/0"
     queue_name: str = "teleclaudecode"
+    redis_max_connections: int = 20  # per API process
+    redis_socket_timeout_sec: float = 5.0
 
     # Mode: "polling" for local dev, "webhook" for production
     mode: str = "polling"
 
+    # Polling: updates per getUpdates batch, long-poll wait, and where the offset survives restarts
+    polling_limit: int = 100
+    polling_timeout_sec: int = 30
+    polling_offset_backend: str = "file"  # "file", "redis" or "memory"
+    polling_offset_file: str = ".telegram_offset"
+
     # Claude Code
     claude_bin: str = "claude"
     claude_timeout_sec: int = 300
-    claude_max_output_chars: int = 12000
+    claude_max_output_chars: int = 12000  # only applies when answers are always sent inline
+    claude_max_output_bytes: int = 20_000_000  # kill a run printing more (0 = no cap)
+    claude_capture_spool_bytes: int = 1_000_000  # stdout in memory up to this, then a temp file
+    claude_stderr_tail_bytes: int = 4096  # only the end of stderr is kept for error messages
     claude_concurrency_per_user: int = 1
     claude_global_concurrency: int = 4
     claude_model: str = ""  # e.g. "sonnet", "opus" — empty = claude default
     claude_permission_mode: str = ""  # e.g. "bypassPermissions" — empty = default
     claude_max_budget_usd: str = ""  # e.g. "1.0" — empty = no limit
+    claude_stream_output: bool = True  # stream replies via progressive message edits
+    telegram_edit_interval_sec: float = 1.5  # min gap between editMessageText calls
+    claude_executor: str = "oneshot"  # "oneshot" or "pool" (pre-spawned warm processes)
+    claude_pool_size: int = 0  # 0 = claude_global_concurrency
+    claude_pool_max_jobs: int = 1  # recycle a warm process after this many prompts
+    claude_pool_max_rss_mb: int = 1024  # recycle a warm process above this RSS
+    # Priority lanes: short prompts run in the fast lane (claude_global_concurrency,
+    # claude_timeout_sec); long or agentic prompts and /bg go to the bulk lane
+    lane_fast_max_chars: int = 500
+    lane_bulk_keywords: str = "refactor,implement,migrate,rewrite,write tests,codebase"
+    lane_bulk_concurrency: int = 1
+    lane_bulk_timeout_sec: int = 1800
+    # Adaptive concurrency: claude_global_concurrency is only the starting limit; it grows
+    # while runs stay fast and shrinks on timeouts, slow runs, low memory or high load
+    concurrency_adaptive: bool = False
+    concurrency_min: int = 1
+    concurrency_max: int = 16
+    concurrency_backoff: float = 0.75  # multiplicative decrease
+    concurrency_latency_tolerance: float = 2.0  # recent vs. long-run run time per lane
+    concurrency_min_free_mem: float = 0.1  # fraction of RAM that must stay available
+    concurrency_max_load: float = 1.5  # 1-minute load average per CPU
+    worker_lanes: str = "fast,bulk"  # lanes an RQ worker serves, in priority order
+    # Worker supervisor (python -m app.worker.supervisor): RQ worker processes per host
+    worker_processes: int = 0  # 0 = one per CPU, within worker_mem_mb of RAM each
+    worker_mem_mb: int = 1024
+    worker_heartbeat_sec: float = 5.0  # node heartbeat in Redis (slots, busy workers)
+    node_name: str = ""  # "" = hostname
+    claude_supersede_queued: bool = False  # a newer prompt drops the chat's still-queued one
+    cancel_poll_interval_sec: float = 1.0  # how often RQ jobs check for /cancel
+    claude_sessions: bool = True  # resume the chat's Claude session on follow-ups
+    claude_session_ttl_sec: int = 7200  # idle time before a chat starts fresh
+    claude_session_max: int = 1000  # LRU cap on remembered sessions
+
+    # Admission control: a prompt whose estimated queue wait is over its lane's budget gets a
+    # "try later" reply, and queued jobs still waiting after the budget are dropped (0 = no limit)
+    admission_max_wait_sec: int = 600
+    admission_bulk_max_wait_sec: int = 3600
+    admission_default_service_sec: float = 30.0  # assumed job time until some have finished
+    admission_samples: int = 50  # recent jobs per lane the service time is averaged over
+
+    # Answers are saved before they are sent: failed sends resume, /last re-sends
+    result_ttl_sec: int = 86400
+    result_max: int = 1000  # answers kept in memory (polling, in-process executor)
+    delivery_max_attempts: int = 5  # per message part, with exponential backoff
+    delivery_backoff_sec: float = 1.0
+    delivery_job_retries: int = 3  # RQ retries of an undelivered job (Claude is not re-run)
+
+    # Per-chat workspaces: run each chat's Claude in its own checkout of this project
+    workspace_base: str = ""  # "" = run in the current directory, shared by all jobs
+    workspace_root: str = ""  # "" = <tmp>/tcc-workspaces
+    workspace_mode: str = "auto"  # "worktree" (git), "copy" (reflink where supported) or "auto"
+    workspace_max_disk_mb: int = 10240  # idle workspaces are removed LRU above this (0 = no cap)
+    workspace_idle_ttl_sec: int = 86400  # remove workspaces unused this long (0 = keep)
+
+    # Response cache for repeated prompts (opt-in; use "redis" with RQ workers)
+    response_cache: bool = False
+    response_cache_backend: str = "memory"  # "memory" or "redis"
+    response_cache_ttl_sec: int = 3600
+    response_cache_max_bytes: int = 50_000_000
+
+    # Webhook mode executor: "rq" (Redis + worker processes) or "inprocess" (asyncio, single node)
+    webhook_executor: str = "rq"
+    inprocess_queue_size: int = 100  # prompts beyond this get a "busy" reply
+    shutdown_drain_sec: int = 60  # time to finish queued jobs on shutdown
+
+    # Prometheus: the API serves /metrics; polling mode and RQ workers listen here
+    metrics_port: int = 0  # 0 = disabled
+
+    # Tracing: "off", "log" (JSON spans) or "otel" (OpenTelemetry if installed, else log)
+    tracing: str = "off"
+    tracing_file: str = ""  # write JSON spans here instead of the log
 
     # Direct chat: if True, any text without / prefix is treated as /ask
     direct_chat: bool = True
@@ -0,0 +1,153 @@
+"""Admission control: bounded queue waits instead of an unbounded backlog.
+
+When prompts arrive faster than Claude runs finish, the backlog would grow
+without limit and users, seeing no answer, send their prompts again. So a
+new prompt's wait is estimated before it is queued, from the jobs already
+waiting in its lane, the lane's slots and its recent service time (the
+mean of the last ``admission_samples`` jobs, ``admission_default_service_sec``
+until any have finished)::
+
+    wait ~ position / slots * service time
+
+A prompt whose estimate is over its lane's budget (``admission_max_wait_sec``,
+``admission_bulk_max_wait_sec``; 0 = no limit) gets a "try later" reply
+instead of a place in the queue, and accepted prompts are told their
+position and ETA. Each queued job also carries a deadline of that budget;
+a job still waiting when it passes is dropped before Claude starts and its
+user is asked to send it again.
+
+Polling mode and the in-process executor keep service times in memory; RQ
+workers record them in Redis, where the API reads them.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from app.config import settings
+from app.core import lanes, metrics
+from app.core.limiter import get_limiter
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_TEXT = "Your request waited too long in the queue and was dropped. Please send it again."
+
+
+class OverloadError(Exception):
+    """The estimated wait for a new prompt is over its lane's budget."""
+
+    def __init__(self, wait_sec: float) -> None:
+        super().__init__(f"estimated queue wait {wait_sec:.0f}s is over budget")
+        self.wait_sec = wait_sec
+
+
+def budget(lane: str) -> int:
+    """Longest queue wait *lane* accepts, in seconds (0 = no limit)."""
+    if lane == lanes.FAST:
+        return settings.admission_max_wait_sec
+    return settings.admission_bulk_max_wait_sec
+
+
+def estimate(position: int, slots: int, service_sec: float) -> float:
+    """Seconds until the job at *position* (1 = next) starts."""
+    return position / max(1, slots) * service_sec
+
+
+def admit(lane: str, queued: int, slots: int, service_sec: float) -> None:
+    """Raise :class:`OverloadError` if a prompt behind *queued* others would wait too long."""
+    limit = budget(lane)
+    if not limit:
+        return
+    wait = estimate(queued + 1, slots, service_sec)
+    if wait > limit:
+        metrics.ADMISSION_REJECTED.labels(lane).inc()
+        logger.info("admission_rejected lane=%s queued=%d wait_sec=%.0f", lane, queued, wait)
+        raise OverloadError(wait)
+
+
+def deadline(lane: str) -> float | None:
+    """Wall-clock time after which a job queued now is dropped, or None."""
+    limit = budget(lane)
+    return time.time() + limit if limit else None
+
+
+def expired(deadline: float | None, lane: str) -> bool:
+    """True (and counted) if a job with *deadline* must be dropped rather than started."""
+    if deadline is None or time.time() <= deadline:
+        return False
+    metrics.JOBS_EXPIRED.labels(lane).inc()
+    logger.info("job_expired lane=%s late_sec=%.0f", lane, time.time() - deadline)
+    return True
+
+
+def local_slots(lane: str, workers: int) -> int:
+    """Runs *lane* can have at once in this process, given its *workers*."""
+    limiter = get_limiter()
+    if limiter is not None:
+        return min(workers, limiter.limit)
+    return workers
+
+
+def eta_text(seconds: float) -> str:
+    if seconds < 60:
+        return "under a minute"
+    return f"about {round(seconds / 60)} min"
+
+
+def busy_text(wait_sec: float) -> str:
+    return (
+        f"Busy right now: the queue would hold you for {eta_text(wait_sec)}. "
+        "Please try again later."
+    )
+
+
+class MemoryServiceTimes:
+    """Recent job durations per lane, for this process."""
+
+    def __init__(self, samples: int | None = None) -> None:
+        self._samples = samples or settings.admission_samples
+        self._lock = threading.Lock()
+        self._times: dict[str, deque[float]] = {}
+
+    def record(self, lane: str, seconds: float) -> None:
+        with self._lock:
+            self._times.setdefault(lane, deque(maxlen=self._samples)).append(seconds)
+
+    def mean(self, lane: str) -> float:
+        with self._lock:
+            times = self._times.get(lane)
+            if not times:
+                return settings.admission_default_service_sec
+            return sum(times) / len(times)
+
+
+class RedisServiceTimes:
+    """Recent job durations per lane in Redis lists, shared by workers and the API."""
+
+    def __init__(self, redis: Any, prefix: str = "tcc:service:") -> None:
+        self._redis = redis
+        self._prefix = prefix
+
+    def record(self, lane: str, seconds: float) -> None:
+        key = f"{self._prefix}{lane}"
+        try:
+            pipe = self._redis.pipeline()
+            pipe.lpush(key, f"{seconds:.3f}")
+            pipe.ltrim(key, 0, settings.admission_samples - 1)
+            pipe.execute()
+        except Exception:
+            logger.exception("service_time_error lane=%s", lane)
+
+    def mean(self, lane: str) -> float:
+        try:
+            times = [float(t) for t in self._redis.lrange(f"{self._prefix}{lane}", 0, -1)]
+        except Exception:
+            logger.exception("service_time_error lane=%s", lane)
+            times = []
+        if not times:
+            return settings.admission_default_service_sec
+        return sum(times) / len(times)
@@ -0,0 +1,238 @@
+"""Opt-in cache of Claude answers for repeated prompts.
+
+Keys combine the normalised prompt with everything else that shapes the
+answer: model, permission mode and working directory (the chat's own
+workspace when per-chat workspaces are on). When the ACL
+whitelist is set the key is also scoped to the user, so answers are never
+shared between users of a restricted bot. Only stateless runs are cached:
+a prompt that resumes a Claude session depends on its conversation.
+
+Use the Redis backend with RQ workers; the memory backend only helps a
+long-lived process (polling mode, in-process executor).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from app.config import settings
+from app.core import metrics, workspaces
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+    def stats(self) -> dict[str, float]: ...
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key."""
+    return " ".join(prompt.split()).casefold()
+
+
+def cache_key(prompt: str, user_id: int) -> str:
+    scope = str(user_id) if settings.allowed_user_ids else "*"
+    parts = [
+        normalize_prompt(prompt),
+        settings.claude_model,
+        settings.claude_permission_mode,
+        workspaces.path() or settings.workspace_base or os.getcwd(),
+        scope,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+            metrics.CACHE_HITS.inc()
+        else:
+            self.misses += 1
+            metrics.CACHE_MISSES.inc()
+
+    def as_dict(self) -> dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class MemoryResponseCache:
+    """LRU cache bounded by the total UTF-8 size of cached answers."""
+
+    def __init__(
+        self, ttl: float, max_bytes: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._stats = _Stats()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._clock() - entry[2] > self._ttl:
+                self._evict(key)
+                entry = None
+            self._stats.record(entry is not None)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode())
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+            self._data[key] = (value, size, self._clock())
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                self._evict(next(iter(self._data)))
+
+    def _evict(self, key: str) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {**self._stats.as_dict(), "bytes": self._bytes, "entries": len(self._data)}
+
+
+class RedisResponseCache:
+    """Answers in Redis with a TTL; a sorted set by insert time caps total bytes.
+
+    The total is kept as a running counter next to the per-key sizes, so a
+    write costs a few commands however many answers are cached.
+    """
+
+    def __init__(self, redis: Any, ttl: int, max_bytes: int, prefix: str = "tcc:cache:") -> None:
+        self._redis = redis
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._prefix = prefix
+        self._index = f"{prefix}index"
+        self._sizes = f"{prefix}sizes"
+        self._total = f"{prefix}bytes"
+        self._stats = _Stats()
+
+    def get(self, key: str) -> str | None:
+        value = self._redis.get(f"{self._prefix}{key}")
+        self._stats.record(value is not None)
+        if value is None:
+            return None
+        return value.decode() if isinstance(value, bytes) else str(value)
+
+    def set(self, key: str, value: str) -> None:
+        data = value.encode()
+        if len(data) > self._max_bytes:
+            return
+        old = int(self._redis.hget(self._sizes, key) or 0)
+        pipe = self._redis.pipeline()
+        pipe.set(f"{self._prefix}{key}", data, ex=self._ttl)
+        pipe.zadd(self._index, {key: time.time()})
+        pipe.hset(self._sizes, key, len(data))
+        pipe.incrby(self._total, len(data) - old)
+        pipe.execute()
+        self._trim()
+
+    def _trim(self) -> None:
+        # Drop index entries whose keys expired, then the oldest until under the cap
+        cutoff = time.time() - self._ttl
+        for old in self._redis.zrangebyscore(self._index, "-inf", cutoff):
+            self._forget(old)
+        total = int(self._redis.get(self._total) or 0)
+        while total > self._max_bytes:
+            oldest = self._redis.zrange(self._index, 0, 0)
+            if not oldest:
+                break
+            total -= self._forget(oldest[0])
+
+    def _forget(self, member: Any) -> int:
+        """Drop one cached answer and return the bytes it freed."""
+        key = member.decode() if isinstance(member, bytes) else str(member)
+        size = int(self._redis.hget(self._sizes, key) or 0)
+        # Only the caller whose HDEL removed the size takes it off the total
+        removed = self._redis.hdel(self._sizes, key)
+        pipe = self._redis.pipeline()
+        pipe.delete(f"{self._prefix}{key}")
+        pipe.zrem(self._index, key)
+        if removed:
+            pipe.decrby(self._total, size)
+        pipe.execute()
+        return size
+
+    def stats(self) -> dict[str, float]:
+        return self._stats.as_dict()
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    """The process-wide response cache, or None when ``response_cache`` is off."""
+    global _cache
+    if not settings.response_cache:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if settings.response_cache_backend == "redis":
+                    from redis import Redis
+
+                    _cache = RedisResponseCache(
+                        Redis.from_url(settings.redis_url),
+                        ttl=settings.response_cache_ttl_sec,
+                        max_bytes=settings.response_cache_max_bytes,
+                    )
+                else:
+                    _cache = MemoryResponseCache(
+                        ttl=settings.response_cache_ttl_sec,
+                        max_bytes=settings.response_cache_max_bytes,
+                    )
+    return _cache
+
+
+def lookup(prompt: str, user_id: int) -> tuple[str | None, str | None]:
+    """Return ``(key, cached answer)``; key is None when caching is off.
+
+    Cache errors are logged and treated as a miss.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(prompt, user_id)
+    try:
+        return key, cache.get(key)
+    except Exception:
+        logger.exception("response_cache_get_error")
+        return key, None
+
+
+def store(key: str | None, answer: str) -> None:
+    cache = get_cache()
+    if cache is None or key is None or not answer:
+        return
+    try:
+        cache.set(key, answer)
+    except Exception:
+        logger.exception("response_cache_set_error")
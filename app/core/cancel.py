@@ -0,0 +1,226 @@
+"""Cancelling a chat's queued and running Claude jobs.
+
+Every prompt gets a per-chat *ticket* (an increasing number) when it is
+queued. ``/cancel`` records the chat's latest ticket as cancelled: queued
+jobs with a ticket at or below it are skipped when they reach a worker,
+and running jobs have their Claude process group killed. With
+``claude_supersede_queued`` a queued job is also skipped when a newer
+prompt from the same chat has been queued since.
+
+Running processes are registered under the job's chat (see :func:`job`
+and :func:`track`), so the process that receives ``/cancel`` kills its
+own jobs directly. RQ jobs run in other processes; there the cancel mark
+lives in Redis and a watcher thread polls it while Claude runs.
+
+Polling mode and the in-process executor use :class:`MemoryCancelStore`;
+RQ uses :class:`RedisCancelStore`.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import signal
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any, Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Marks cancelled jobs are remembered for (Redis), long enough to outlive any queue wait
+_TTL_SEC = 86400
+
+
+class CancelStore(Protocol):
+    remote: bool
+
+    def next_ticket(self, chat_id: int) -> int: ...
+
+    def cancel(self, chat_id: int) -> None: ...
+
+    def state(self, chat_id: int) -> tuple[int, int]: ...
+
+
+class MemoryCancelStore:
+    """Tickets and cancel marks for a single process."""
+
+    remote = False
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest: dict[int, int] = {}
+        self._cancelled: dict[int, int] = {}
+
+    def next_ticket(self, chat_id: int) -> int:
+        with self._lock:
+            ticket = self._latest.get(chat_id, 0) + 1
+            self._latest[chat_id] = ticket
+            return ticket
+
+    def cancel(self, chat_id: int) -> None:
+        with self._lock:
+            self._cancelled[chat_id] = self._latest.get(chat_id, 0)
+
+    def state(self, chat_id: int) -> tuple[int, int]:
+        """``(latest ticket, cancelled through ticket)`` for *chat_id*."""
+        with self._lock:
+            return self._latest.get(chat_id, 0), self._cancelled.get(chat_id, 0)
+
+
+class RedisCancelStore:
+    """Tickets and cancel marks shared by the API and RQ workers."""
+
+    remote = True
+
+    def __init__(self, redis: Any, prefix: str = "tcc:cancel:") -> None:
+        self._redis = redis
+        self._prefix = prefix
+
+    def next_ticket(self, chat_id: int) -> int:
+        key = f"{self._prefix}{chat_id}:latest"
+        pipe = self._redis.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, _TTL_SEC)
+        return int(pipe.execute()[0])
+
+    def cancel(self, chat_id: int) -> None:
+        latest = self._redis.get(f"{self._prefix}{chat_id}:latest")
+        self._redis.set(f"{self._prefix}{chat_id}:cancelled", latest or 0, ex=_TTL_SEC)
+
+    def state(self, chat_id: int) -> tuple[int, int]:
+        latest, cancelled = self._redis.mget(
+            f"{self._prefix}{chat_id}:latest", f"{self._prefix}{chat_id}:cancelled"
+        )
+        return int(latest or 0), int(cancelled or 0)
+
+
+class _Job:
+    def __init__(self, chat_id: int, ticket: int, store: CancelStore) -> None:
+        self.chat_id = chat_id
+        self.ticket = ticket
+        self.store = store
+
+    def cancelled(self) -> bool:
+        return self.ticket <= self.store.state(self.chat_id)[1]
+
+
+class Handle:
+    """A tracked process; ``cancelled`` is set if it was killed by a cancel."""
+
+    def __init__(self, proc: Any) -> None:
+        self.proc = proc
+        self.cancelled = threading.Event()
+
+    def kill(self) -> None:
+        self.cancelled.set()
+        kill_group(self.proc)
+
+
+_current: contextvars.ContextVar[_Job | None] = contextvars.ContextVar(
+    "tcc_cancel_job", default=None
+)
+_lock = threading.Lock()
+_running: dict[int, set[Handle]] = {}  # chat_id -> processes of its running jobs
+
+
+def issue_ticket(chat_id: int, store: CancelStore) -> int | None:
+    """Next ticket for *chat_id*, or None (job not cancellable) if the store failed."""
+    try:
+        return store.next_ticket(chat_id)
+    except Exception:
+        logger.exception("cancel_ticket_error chat_id=%s", chat_id)
+        return None
+
+
+def should_skip(chat_id: int, ticket: int | None, store: CancelStore) -> bool:
+    """True if a queued job was cancelled or superseded before it started."""
+    if ticket is None:
+        return False
+    try:
+        latest, cancelled = store.state(chat_id)
+    except Exception:
+        logger.exception("cancel_state_error chat_id=%s", chat_id)
+        return False
+    if ticket <= cancelled:
+        logger.info("job_cancelled chat_id=%s ticket=%d", chat_id, ticket)
+        return True
+    if settings.claude_supersede_queued and ticket < latest:
+        logger.info("job_superseded chat_id=%s ticket=%d latest=%d", chat_id, ticket, latest)
+        return True
+    return False
+
+
+@contextmanager
+def job(chat_id: int, ticket: int | None, store: CancelStore) -> Iterator[None]:
+    """Run the block as *chat_id*'s job so Claude processes it starts can be cancelled."""
+    if ticket is None:
+        yield
+        return
+    token = _current.set(_Job(chat_id, ticket, store))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def track(proc: Any) -> Iterator[Handle]:
+    """Register a Claude process under the current job while the block runs."""
+    handle = Handle(proc)
+    current = _current.get()
+    if current is None:
+        yield handle
+        return
+    with _lock:
+        _running.setdefault(current.chat_id, set()).add(handle)
+    stop = threading.Event()
+    if current.store.remote:
+        threading.Thread(target=_watch, args=(current, handle, stop), daemon=True).start()
+    try:
+        yield handle
+    finally:
+        stop.set()
+        with _lock:
+            handles = _running.get(current.chat_id)
+            if handles is not None:
+                handles.discard(handle)
+                if not handles:
+                    del _running[current.chat_id]
+
+
+def _watch(current: _Job, handle: Handle, stop: threading.Event) -> None:
+    # Poll the shared cancel mark; the API that received /cancel is another process
+    while not stop.wait(settings.cancel_poll_interval_sec):
+        try:
+            if current.cancelled():
+                logger.info("claude_cancelled chat_id=%s pid=%s", current.chat_id, handle.proc.pid)
+                handle.kill()
+                return
+        except Exception:
+            logger.exception("cancel_watch_error chat_id=%s", current.chat_id)
+
+
+def cancel_chat(chat_id: int, store: CancelStore) -> int:
+    """Cancel everything *chat_id* has queued or running; return processes killed here."""
+    store.cancel(chat_id)
+    with _lock:
+        handles = list(_running.get(chat_id, ()))
+    for handle in handles:
+        logger.info("claude_cancelled chat_id=%s pid=%s", chat_id, handle.proc.pid)
+        handle.kill()
+    return len(handles)
+
+
+def kill_group(proc: Any) -> None:
+    """Kill *proc* and, if it leads its own process group, everything it started."""
+    try:
+        if hasattr(os, "killpg") and os.getpgid(proc.pid) == proc.pid:
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass  # already exited
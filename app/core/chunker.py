@@ -1,30 +1,130 @@
-"""Split long text into Telegram-safe chunks (≤ 4096 chars)."""
+"""Split long text into Telegram-safe chunks (≤ 4096 chars).
+
+Telegram counts message length in UTF-16 code units, so characters outside
+the Basic Multilingual Plane (most emoji) count twice. The text is scanned
+once with indices instead of repeatedly slicing off the remainder, and a
+chunk that ends inside a ``` code block is closed with a fence and the
+next chunk reopens it (with the same language), so every chunk is valid
+Markdown on its own.
+"""
 
 from __future__ import annotations
 
+import re
+from bisect import bisect_left
+
 _TG_LIMIT = 4096
 _RESERVE = 20  # room for "[n/N]\n" prefix
 _MAX = _TG_LIMIT - _RESERVE
 
+_FENCE_RE = re.compile(r"^```([^\n`]*)", re.MULTILINE)
+_CLOSE_FENCE = "\n```"
+
+
+def utf16_len(text: str) -> int:
+    """Length of *text* as Telegram counts it."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class _Units:
+    """UTF-16 lengths of slices of one text, in O(log n) per query."""
+
+    def __init__(self, text: str) -> None:
+        # Indices of characters that take two code units (usually none)
+        self._wide: list[int] = []
+        if not text.isascii() and utf16_len(text) != len(text):
+            self._wide = [i for i, ch in enumerate(text) if ord(ch) > 0xFFFF]
+
+    def span(self, start: int, end: int) -> int:
+        if not self._wide:
+            return end - start
+        return end - start + bisect_left(self._wide, end) - bisect_left(self._wide, start)
+
+    def end_within(self, start: int, budget: int, stop: int) -> int:
+        """Largest end ≤ *stop* with ``span(start, end) <= budget``."""
+        low, high = start, min(stop, start + budget)
+        if self.span(start, high) > budget:
+            while low < high:  # binary search; only reached when wide characters exist
+                mid = (low + high + 1) // 2
+                if self.span(start, mid) <= budget:
+                    low = mid
+                else:
+                    high = mid - 1
+        return max(high, min(stop, start + 1))  # always make progress
+
+
+class _Fences:
+    """Where ``` fences open and close, to know if a position is inside a code block."""
+
+    def __init__(self, text: str) -> None:
+        self._starts: list[int] = []
+        self._langs: list[str] = []
+        if "```" not in text:
+            return
+        for match in _FENCE_RE.finditer(text):
+            self._starts.append(match.start())
+            self._langs.append(match.group(1).strip())
+
+    def open_at(self, pos: int) -> str | None:
+        """Language of the code block open at *pos* ("" if none given), or None."""
+        count = bisect_left(self._starts, pos)
+        if count % 2 == 0:
+            return None
+        return self._langs[count - 1]
+
+
+def _find_cut(text: str, start: int, end: int, floor: int) -> int:
+    # Prefer a newline in the second half, then a space, then a hard cut
+    cut = text.rfind("\n", floor, end)
+    if cut > start:
+        return cut
+    cut = text.rfind(" ", floor, end)
+    if cut > start:
+        # Don't split an inline `code` span
+        line_start = text.rfind("\n", start, cut) + 1
+        if text.count("`", line_start, cut) % 2:
+            tick = text.rfind("`", line_start, cut)
+            if tick > floor:
+                return tick
+        return cut
+    return end
+
 
 def chunk_text(text: str, limit: int = _MAX) -> list[str]:
-    """Return a list of chunks, each ≤ *limit* characters."""
+    """Return a list of chunks, each ≤ *limit* UTF-16 code units."""
     if not text:
         return [text]
-    if len(text) <= limit:
+    units = _Units(text)
+    if units.span(0, len(text)) <= limit:
         return [text]
 
+    fences = _Fences(text)
     chunks: list[str] = []
-    while text:
-        if len(text) <= limit:
-            chunks.append(text)
+    start, length = 0, len(text)
+    while start < length:
+        lang = fences.open_at(start)
+        prefix = f"```{lang}\n" if lang is not None else ""
+        budget = limit - utf16_len(prefix)
+        end = units.end_within(start, budget, length)
+        if end == length:
+            chunks.append(prefix + text[start:])
             break
-        # Try to split at a newline in the second half
-        cut = text.rfind("\n", limit // 2, limit)
-        if cut == -1:
-            cut = text.rfind(" ", limit // 2, limit)
-        if cut == -1:
-            cut = limit
-        chunks.append(text[:cut])
-        text = text[cut:].lstrip("\n")
+        floor = start + (end - start) // 2
+        cut = _find_cut(text, start, end, floor)
+        suffix = _CLOSE_FENCE if fences.open_at(cut) is not None else ""
+        if suffix:
+            # Leave room to close the code block
+            end = units.end_within(start, budget - len(suffix), length)
+            cut = _find_cut(text, start, end, floor)
+            suffix = _CLOSE_FENCE if fences.open_at(cut) is not None else ""
+        chunks.append(prefix + text[start:cut] + suffix)
+        start = cut
+        while start < length and text[start] == "\n":
+            start += 1
+        if suffix and text.startswith("```", start) and fences.open_at(start) is not None:
+            # The block's own closing fence follows; ours already closed it
+            newline = text.find("\n", start)
+            start = length if newline == -1 else newline
+            while start < length and text[start] == "\n":
+                start += 1
     return chunks
@@ -0,0 +1,91 @@
+"""Webhook update de-duplication.
+
+Telegram re-delivers an update until it sees a 200. With several API
+processes a retry can land on a different process, so the in-memory store
+is only safe for a single process; the Redis store claims each update_id
+with ``SET NX EX`` so exactly one process across the cluster handles it.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import Any, Protocol
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DedupStore(Protocol):
+    async def is_duplicate(self, update_id: int) -> bool:
+        """Record *update_id*; return True if it was already seen."""
+
+    async def release(self, update_id: int) -> None:
+        """Forget *update_id* so a redelivery of an update that failed is handled."""
+
+
+class MemoryDedupStore:
+    """LRU of recently seen update ids for one process."""
+
+    def __init__(self, max_size: int = 10_000) -> None:
+        self._max_size = max_size
+        self._seen: OrderedDict[int, None] = OrderedDict()
+
+    def check(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return True
+        self._seen[update_id] = None
+        if len(self._seen) > self._max_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def forget(self, update_id: int) -> None:
+        self._seen.pop(update_id, None)
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        seen = self.check(update_id)
+        metrics.DEDUP_LOOKUPS.labels("local_hit" if seen else "miss").inc()
+        return seen
+
+    async def release(self, update_id: int) -> None:
+        self.forget(update_id)
+
+
+class RedisDedupStore:
+    """Cluster-wide dedup with ``SET NX EX``, fronted by a local LRU.
+
+    Update ids this process already saw are answered locally without a
+    Redis round-trip. If Redis is unreachable the local answer is used, so
+    updates are processed rather than dropped.
+    """
+
+    def __init__(
+        self, redis: Any, ttl: int, local_size: int = 10_000, prefix: str = "tcc:update:"
+    ) -> None:
+        self._redis = redis
+        self._ttl = ttl
+        self._prefix = prefix
+        self._local = MemoryDedupStore(local_size) if local_size > 0 else None
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        if self._local is not None and self._local.check(update_id):
+            metrics.DEDUP_LOOKUPS.labels("local_hit").inc()
+            return True
+        try:
+            claimed = await self._redis.set(f"{self._prefix}{update_id}", 1, nx=True, ex=self._ttl)
+        except Exception:
+            logger.exception("dedup_redis_error update_id=%s", update_id)
+            metrics.DEDUP_LOOKUPS.labels("redis_error").inc()
+            return False
+        metrics.DEDUP_LOOKUPS.labels("miss" if claimed else "redis_hit").inc()
+        return not claimed
+
+    async def release(self, update_id: int) -> None:
+        if self._local is not None:
+            self._local.forget(update_id)
+        try:
+            await self._redis.delete(f"{self._prefix}{update_id}")
+        except Exception:
+            logger.exception("dedup_redis_error update_id=%s", update_id)
@@ -0,0 +1,163 @@
+"""Convert Claude's Markdown into Telegram HTML or MarkdownV2 before sending.
+
+Claude writes CommonMark-style Markdown (``**bold**``, ``# headings``,
+``[links](url)``, fenced code). Sent as Telegram's legacy ``Markdown`` it
+is often rejected with a 400 and has to be re-sent as plain text. Here
+the Markdown is rendered to entities Telegram accepts: recognised markup
+becomes tags, and everything else — including unmatched ``*`` or ``_`` —
+is escaped, so the output always parses. Text without any markup
+characters skips rendering and is sent as plain text.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+
+from app.config import settings
+
+# Characters that can start markup or need escaping; absent = plain text fast path
+_SPECIAL_RE = re.compile(r"[*_`\[\]~#&<\\]")
+_FENCE_RE = re.compile(r"^```([^\n`]*)\n(.*?)(?:^```[ \t]*$|\Z)", re.MULTILINE | re.DOTALL)
+_HEADING_RE = re.compile(r"^#{1,6}[ \t]+(.+?)[ \t#]*$")
+_BULLET_RE = re.compile(r"^([ \t]*)[-*+][ \t]+")
+_INLINE_RE = re.compile(
+    r"`(?P<code>[^`\n]+)`"
+    r"|\[(?P<label>[^\]\n]+)\]\((?P<url>(?:[^()\s]|\([^()\s]*\))+)\)"
+    r"|\*\*(?P<bold>[^\n]+?)\*\*"
+    r"|__(?P<bold2>[^\n]+?)__"
+    r"|~~(?P<strike>[^\n]+?)~~"
+    r"|(?<![\w*])\*(?P<italic>[^*\s][^*\n]*?)\*(?![\w*])"
+    r"|(?<![\w_])_(?P<italic2>[^_\s][^_\n]*?)_(?![\w_])"
+)
+_STYLES = {
+    "bold": "bold",
+    "bold2": "bold",
+    "strike": "strike",
+    "italic": "italic",
+    "italic2": "italic",
+}
+_MDV2_SPECIAL_RE = re.compile(r"([_*\[\]()~`>#+\-=|{}.!\\])")
+
+
+class _Html:
+    parse_mode = "HTML"
+
+    @staticmethod
+    def text(s: str) -> str:
+        return html.escape(s, quote=False)
+
+    @staticmethod
+    def code(s: str) -> str:
+        return f"<code>{html.escape(s, quote=False)}</code>"
+
+    @staticmethod
+    def pre(s: str, lang: str) -> str:
+        body = html.escape(s, quote=False)
+        if lang:
+            return f'<pre><code class="language-{html.escape(lang)}">{body}</code></pre>'
+        return f"<pre>{body}</pre>"
+
+    @staticmethod
+    def link(label: str, url: str) -> str:
+        return f'<a href="{html.escape(url)}">{label}</a>'
+
+    @staticmethod
+    def wrap(style: str, s: str) -> str:
+        tag = {"bold": "b", "italic": "i", "strike": "s"}[style]
+        return f"<{tag}>{s}</{tag}>"
+
+
+class _MarkdownV2:
+    parse_mode = "MarkdownV2"
+
+    @staticmethod
+    def text(s: str) -> str:
+        return _MDV2_SPECIAL_RE.sub(r"\\\1", s)
+
+    @staticmethod
+    def code(s: str) -> str:
+        return "`" + s.replace("\\", "\\\\").replace("`", "\\`") + "`"
+
+    @staticmethod
+    def pre(s: str, lang: str) -> str:
+        body = s.replace("\\", "\\\\").replace("`", "\\`")
+        return f"```{lang}\n{body}\n```"
+
+    @staticmethod
+    def link(label: str, url: str) -> str:
+        url = url.replace("\\", "\\\\").replace(")", "\\)")
+        return f"[{label}]({url})"
+
+    @staticmethod
+    def wrap(style: str, s: str) -> str:
+        mark = {"bold": "*", "italic": "_", "strike": "~"}[style]
+        return f"{mark}{s}{mark}"
+
+
+_Renderer = type[_Html] | type[_MarkdownV2]
+
+
+def _inline(text: str, r: _Renderer) -> str:
+    out: list[str] = []
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        out.append(r.text(text[pos : match.start()]))
+        pos = match.end()
+        groups = match.groupdict()
+        if groups["code"] is not None:
+            out.append(r.code(groups["code"]))
+        elif groups["label"] is not None:
+            out.append(r.link(_inline(groups["label"], r), groups["url"]))
+        else:
+            name = next(n for n in _STYLES if groups[n] is not None)
+            out.append(r.wrap(_STYLES[name], _inline(groups[name], r)))
+    out.append(r.text(text[pos:]))
+    return "".join(out)
+
+
+def _line(line: str, r: _Renderer) -> str:
+    heading = _HEADING_RE.match(line)
+    if heading:
+        return r.wrap("bold", _inline(heading.group(1), r))
+    bullet = _BULLET_RE.match(line)
+    if bullet:
+        return r.text(bullet.group(1)) + "• " + _inline(line[bullet.end() :], r)
+    return _inline(line, r)
+
+
+def _render(text: str, r: _Renderer) -> str:
+    out: list[str] = []
+    pos = 0
+    for match in _FENCE_RE.finditer(text):
+        out.extend(_line(line, r) + "\n" for line in text[pos : match.start()].splitlines())
+        out.append(r.pre(match.group(2).rstrip("\n"), match.group(1).strip()))
+        pos = match.end()
+    tail = text[pos:]
+    rendered_tail = "\n".join(_line(line, r) for line in tail.split("\n"))
+    return "".join(out) + rendered_tail
+
+
+def render_html(text: str) -> str:
+    return _render(text, _Html)
+
+
+def render_markdown_v2(text: str) -> str:
+    return _render(text, _MarkdownV2)
+
+
+def prepare(text: str, parse_mode: str | None = "Markdown") -> tuple[str, str | None]:
+    """Return ``(text, parse_mode)`` to send for *text* written in *parse_mode*.
+
+    Markdown from Claude is converted according to ``telegram_parse_mode``;
+    other parse modes are passed through untouched.
+    """
+    if parse_mode != "Markdown":
+        return text, parse_mode
+    target = settings.telegram_parse_mode.lower()
+    if target == "markdown":
+        return text, "Markdown"
+    if target == "none" or not _SPECIAL_RE.search(text):
+        return text, None
+    renderer: _Renderer = _MarkdownV2 if target == "markdownv2" else _Html
+    return _render(text, renderer), renderer.parse_mode
@@ -0,0 +1,81 @@
+"""Priority lanes: a fast lane for short questions, a bulk lane for long runs.
+
+A one-line question should not wait behind a multi-minute refactoring
+run. Prompts are classified when they are queued: ``/bg`` forces the bulk
+lane, and otherwise long prompts or ones that mention agentic work
+(``lane_bulk_keywords``) go to bulk. Each lane has its own concurrency
+budget and Claude timeout:
+
+- polling mode runs one :class:`~app.core.scheduler.FairScheduler` per lane;
+- the in-process executor runs separate worker tasks per lane;
+- RQ uses one queue per lane (the fast lane keeps ``queue_name``), workers
+  listen on them in priority order, and a Redis semaphore caps running
+  bulk jobs at ``lane_bulk_concurrency``.
+
+The lane of the running job is kept in a context variable so the Claude
+executors pick the right timeout.
+"""
+
+from __future__ import annotations
+
+import contextvars
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from app.config import settings
+
+FAST = "fast"
+BULK = "bulk"
+LANES = (FAST, BULK)  # in priority order
+
+_current: contextvars.ContextVar[str] = contextvars.ContextVar("tcc_lane", default=FAST)
+
+
+def classify(prompt: str) -> str:
+    """The lane for *prompt* (without an explicit ``/bg``)."""
+    if len(prompt) > settings.lane_fast_max_chars:
+        return BULK
+    lowered = prompt.lower()
+    keywords = (k.strip() for k in settings.lane_bulk_keywords.split(","))
+    if any(keyword and keyword in lowered for keyword in keywords):
+        return BULK
+    return FAST
+
+
+def queue_name(lane: str) -> str:
+    """RQ queue for *lane*; the fast lane keeps the configured ``queue_name``."""
+    return settings.queue_name if lane == FAST else f"{settings.queue_name}-{lane}"
+
+
+def concurrency(lane: str) -> int:
+    """Claude runs *lane* may have in flight at once.
+
+    With ``concurrency_adaptive`` the fast lane is sized for
+    ``concurrency_max``; the limiter (see :mod:`app.core.limiter`) decides
+    how much of that is used.
+    """
+    if lane != FAST:
+        return settings.lane_bulk_concurrency
+    if settings.concurrency_adaptive:
+        return max(settings.concurrency_max, settings.claude_global_concurrency)
+    return settings.claude_global_concurrency
+
+
+def timeout_sec(lane: str | None = None) -> int:
+    """Claude timeout for *lane* (default: the lane of the running job)."""
+    lane = _current.get() if lane is None else lane
+    return settings.claude_timeout_sec if lane == FAST else settings.lane_bulk_timeout_sec
+
+
+def current() -> str:
+    return _current.get()
+
+
+@contextmanager
+def use(lane: str) -> Iterator[None]:
+    """Run the block as a job of *lane*."""
+    token = _current.set(lane)
+    try:
+        yield
+    finally:
+        _current.reset(token)
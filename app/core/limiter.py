@@ -0,0 +1,201 @@
+"""Adaptive limit on concurrent Claude runs (AIMD).
+
+With ``concurrency_adaptive`` the number of Claude runs a process starts
+at once is no longer fixed at ``claude_global_concurrency``; that is only
+the starting point. The limit moves between ``concurrency_min`` and
+``concurrency_max``:
+
+- after each run that finished normally it grows by ``1 / limit``
+  (about one per ``limit`` runs), but only while the limit is actually in
+  use and the host has headroom;
+- it shrinks by ``concurrency_backoff`` on a Claude timeout, when recent
+  run times (a fast moving average per lane) exceed
+  ``concurrency_latency_tolerance`` times their long-run average, or when
+  the host runs short of memory (``concurrency_min_free_mem``) or its load
+  average per CPU passes ``concurrency_max_load``. Decreases are spaced
+  out so that one burst of slow runs counts once.
+
+Polling mode and the in-process executor take a permit from the limiter
+before each job (see :meth:`AdaptiveLimiter.try_acquire`). RQ workers run
+one job each, so there a worker only checks :func:`host_pressure` and
+leaves a job queued while the host is overloaded. The current limit is
+exported as ``tcc_concurrency_limit``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+
+from app.config import settings
+from app.core import lanes, metrics
+
+logger = logging.getLogger(__name__)
+
+_HOST_CHECK_SEC = 2.0  # memory and load are sampled at most this often
+_DECREASE_COOLDOWN_SEC = 10.0
+_FAST_ALPHA = 0.3  # weight of a new run time in the recent average
+_SLOW_ALPHA = 0.02  # ... and in the long-run baseline
+_MIN_SAMPLES = 10  # runs per lane before latency is compared to the baseline
+
+
+def _available_memory() -> float | None:
+    """Fraction of RAM available (Linux), or None if unknown."""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            fields = {line.split(":")[0]: line.split()[1] for line in meminfo}
+        return int(fields["MemAvailable"]) / int(fields["MemTotal"])
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+def host_pressure() -> str | None:
+    """Why this host should not start more Claude runs ("memory", "load"), or None."""
+    available = _available_memory()
+    if available is not None and available < settings.concurrency_min_free_mem:
+        return "memory"
+    try:
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+    if load > settings.concurrency_max_load:
+        return "load"
+    return None
+
+
+class _Latency:
+    def __init__(self) -> None:
+        self.recent = 0.0
+        self.baseline = 0.0
+        self.samples = 0
+
+    def add(self, seconds: float) -> None:
+        if not self.samples:
+            self.recent = self.baseline = seconds
+        else:
+            self.recent += _FAST_ALPHA * (seconds - self.recent)
+            self.baseline += _SLOW_ALPHA * (seconds - self.baseline)
+        self.samples += 1
+
+    def degraded(self) -> bool:
+        return (
+            self.samples >= _MIN_SAMPLES
+            and self.recent > self.baseline * settings.concurrency_latency_tolerance
+        )
+
+
+class AdaptiveLimiter:
+    """Permits for concurrent Claude runs, with a limit that follows observed load."""
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        pressure: Callable[[], str | None] = host_pressure,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._pressure = pressure
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._latency: dict[str, _Latency] = {}
+        self._pressured: str | None = None
+        self._last_host_check = float("-inf")
+        self._last_decrease = float("-inf")
+        self._listeners: list[Callable[[], None]] = []
+        metrics.CONCURRENCY_LIMIT.set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def inflight(self) -> int:
+        return self._inflight
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Call *callback* whenever a permit is released (to dispatch waiting jobs)."""
+        self._listeners.append(callback)
+
+    def try_acquire(self) -> bool:
+        """Take a permit if fewer than ``limit`` runs are in flight."""
+        with self._lock:
+            self._check_host_locked()
+            if self._inflight >= self.limit:
+                return False
+            self._inflight += 1
+            return True
+
+    def release(self) -> None:
+        """Return a permit; must not be called with a lock a listener takes."""
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+        for callback in self._listeners:
+            callback()
+
+    def observe(self, seconds: float, outcome: str) -> None:
+        """Adjust the limit after a Claude run of the current lane."""
+        with self._lock:
+            if outcome == "timeout":
+                self._decrease_locked("timeout")
+                return
+            if outcome != "ok":
+                return  # failures say nothing about load
+            latency = self._latency.setdefault(lanes.current(), _Latency())
+            latency.add(seconds)
+            self._check_host_locked()
+            if latency.degraded():
+                self._decrease_locked("latency")
+            elif self._pressured is None and self._inflight + 1 >= self.limit:
+                # Grow only while the limit is what holds runs back
+                self._set_locked(self._limit + 1 / self._limit)
+
+    def _check_host_locked(self) -> None:
+        now = self._clock()
+        if now - self._last_host_check < _HOST_CHECK_SEC:
+            return
+        self._last_host_check = now
+        self._pressured = self._pressure()
+        if self._pressured is not None:
+            self._decrease_locked(self._pressured)
+
+    def _decrease_locked(self, reason: str) -> None:
+        now = self._clock()
+        if now - self._last_decrease < _DECREASE_COOLDOWN_SEC:
+            return
+        self._last_decrease = now
+        before = self.limit
+        self._set_locked(self._limit * settings.concurrency_backoff)
+        logger.info("concurrency_decrease reason=%s limit=%d->%d", reason, before, self.limit)
+
+    def _set_locked(self, limit: float) -> None:
+        self._limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+        metrics.CONCURRENCY_LIMIT.set(self.limit)
+
+
+_limiter: AdaptiveLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> AdaptiveLimiter | None:
+    """The process-wide limiter, or None when ``concurrency_adaptive`` is off."""
+    global _limiter
+    if not settings.concurrency_adaptive:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                limiter = AdaptiveLimiter(
+                    settings.claude_global_concurrency,
+                    settings.concurrency_min,
+                    settings.concurrency_max,
+                )
+                metrics.on_claude_run(limiter.observe)
+                _limiter = limiter
+    return _limiter
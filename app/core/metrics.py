@@ -0,0 +1,185 @@
+"""Prometheus metrics.
+
+Stage histograms answer "where did the time go" for a slow reply:
+webhook handling, queue wait, Claude spawn-to-first-text, Claude total and
+each Telegram API call. The API process serves them at ``/metrics``; polling
+mode and RQ workers start a metrics HTTP server on ``metrics_port``.
+
+RQ forks a work-horse per job, so metrics recorded inside jobs only survive
+with prometheus_client's multiprocess mode: set ``PROMETHEUS_MULTIPROC_DIR``
+to a directory shared by the API and worker processes.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Claude runs take seconds to many minutes; Telegram calls take milliseconds
+_CLAUDE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600, float("inf"))
+_FAST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+WEBHOOK_SECONDS = Histogram(
+    "tcc_webhook_handle_seconds", "Time to handle one webhook update", buckets=_FAST_BUCKETS
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "tcc_queue_wait_seconds",
+    "Time a prompt waited before Claude started",
+    ["mode"],
+    buckets=_CLAUDE_BUCKETS,
+)
+CLAUDE_FIRST_TEXT_SECONDS = Histogram(
+    "tcc_claude_first_text_seconds",
+    "Claude spawn to first streamed answer text",
+    buckets=_CLAUDE_BUCKETS,
+)
+CLAUDE_SECONDS = Histogram(
+    "tcc_claude_seconds", "Total Claude run time", ["executor"], buckets=_CLAUDE_BUCKETS
+)
+CLAUDE_OUTPUT_BYTES = Histogram(
+    "tcc_claude_output_bytes",
+    "Bytes a Claude run wrote to stdout",
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8, float("inf")),
+)
+WORKSPACE_SETUP_SECONDS = Histogram(
+    "tcc_workspace_setup_seconds",
+    "Time to create a chat workspace",
+    ["mode"],
+    buckets=_CLAUDE_BUCKETS,
+)
+TELEGRAM_SECONDS = Histogram(
+    "tcc_telegram_call_seconds",
+    "Telegram Bot API call latency",
+    ["method"],
+    buckets=_FAST_BUCKETS,
+)
+
+CLAUDE_TIMEOUTS = Counter("tcc_claude_timeouts_total", "Claude runs killed by the timeout")
+CLAUDE_FAILURES = Counter(
+    "tcc_claude_failures_total", "Claude runs that failed (non-zero exit or reported error)"
+)
+TELEGRAM_429 = Counter("tcc_telegram_429_total", "Telegram 429 Too Many Requests responses")
+TELEGRAM_PARSE_FALLBACKS = Counter(
+    "tcc_telegram_parse_fallbacks_total", "Formatted messages Telegram rejected (sent as plain)"
+)
+CLAUDE_RUNS = Counter(
+    "tcc_claude_runs_total",
+    "Finished Claude runs by outcome (ok, timeout, cancelled, error)",
+    ["outcome"],
+)
+DEDUP_HITS = Counter("tcc_dedup_hits_total", "Duplicate webhook updates skipped")
+DEDUP_LOOKUPS = Counter(
+    "tcc_dedup_lookups_total",
+    "Update-id dedup lookups by result (miss, local_hit, redis_hit, redis_error)",
+    ["result"],
+)
+CACHE_HITS = Counter("tcc_cache_hits_total", "Prompts answered from the response cache")
+CACHE_MISSES = Counter("tcc_cache_misses_total", "Response cache lookups that found no answer")
+ACL_DENIALS = Counter("tcc_acl_denials_total", "Prompts rejected by the user whitelist")
+ADMISSION_REJECTED = Counter(
+    "tcc_admission_rejected_total",
+    "Prompts turned away because the queue wait was over budget",
+    ["lane"],
+)
+JOBS_EXPIRED = Counter(
+    "tcc_jobs_expired_total", "Queued jobs dropped after their queue-wait deadline", ["lane"]
+)
+
+JOBS_INFLIGHT = Gauge(
+    "tcc_jobs_inflight", "Claude runs currently executing", multiprocess_mode="livesum"
+)
+WORKSPACE_BYTES = Gauge(
+    "tcc_workspace_bytes",
+    "Disk used by chat workspaces after the last collection",
+    multiprocess_mode="max",
+)
+WORKER_SLOTS = Gauge(
+    "tcc_worker_slots", "RQ worker processes per live node", ["node"], multiprocess_mode="max"
+)
+WORKER_BUSY = Gauge(
+    "tcc_worker_busy",
+    "RQ worker processes running a job per live node",
+    ["node"],
+    multiprocess_mode="max",
+)
+QUEUE_DEPTH = Gauge("tcc_queue_depth", "Prompts waiting to start", multiprocess_mode="max")
+CONCURRENCY_LIMIT = Gauge(
+    "tcc_concurrency_limit",
+    "Current adaptive limit on concurrent Claude runs",
+    multiprocess_mode="max",
+)
+
+# Called with (seconds, outcome) after every Claude run; outcome as in CLAUDE_RUNS
+_claude_observers: list[Callable[[float, str], None]] = []
+
+
+def on_claude_run(callback: Callable[[float, str], None]) -> None:
+    """Have *callback* see the duration and outcome of every Claude run."""
+    _claude_observers.append(callback)
+
+
+@contextmanager
+def track_claude(executor: str) -> Iterator[None]:
+    """Time a Claude run and count it by outcome."""
+    JOBS_INFLIGHT.inc()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except RuntimeError as exc:
+        if "timed out" in str(exc):
+            outcome = "timeout"
+            CLAUDE_TIMEOUTS.inc()
+        elif "cancelled" in str(exc):
+            outcome = "cancelled"  # stopped by /cancel, not a failure
+        else:
+            CLAUDE_FAILURES.inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        CLAUDE_SECONDS.labels(executor).observe(elapsed)
+        CLAUDE_RUNS.labels(outcome).inc()
+        JOBS_INFLIGHT.dec()
+        for callback in _claude_observers:
+            callback(elapsed, outcome)
+
+
+def render() -> tuple[bytes, str]:
+    """Return the exposition payload and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def start_server() -> None:
+    """Serve /metrics from a background thread when ``metrics_port`` is set."""
+    if settings.metrics_port <= 0:
+        return
+    try:
+        start_http_server(settings.metrics_port)
+    except OSError:
+        logger.exception("metrics_server_failed port=%d", settings.metrics_port)
+        return
+    logger.info("metrics_server port=%d", settings.metrics_port)
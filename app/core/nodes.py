@@ -0,0 +1,54 @@
+"""Worker node heartbeats in Redis.
+
+Each worker supervisor (see :mod:`app.worker.supervisor`) publishes its
+host's Claude slots and how many are busy every ``worker_heartbeat_sec``.
+A node whose heartbeat is missed three times in a row drops out of
+:meth:`NodeRegistry.nodes`, so the list shows which hosts are alive and
+which have free capacity.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any
+
+# Missed heartbeats before a node counts as gone
+_MISSED_BEATS = 3
+
+
+class NodeRegistry:
+    """Heartbeats of the worker nodes sharing one Redis."""
+
+    def __init__(self, redis: Any, prefix: str = "tcc:node:", index: str = "tcc:nodes") -> None:
+        self._redis = redis
+        self._prefix = prefix
+        self._index = index
+
+    def beat(self, node: str, slots: int, busy: int, interval: float, **info: Any) -> None:
+        """Record that *node* is alive with *busy* of its *slots* running jobs."""
+        state = {"node": node, "slots": slots, "busy": busy, "updated": time.time(), **info}
+        pipe = self._redis.pipeline()
+        ttl = max(1, int(interval * _MISSED_BEATS))
+        pipe.set(f"{self._prefix}{node}", json.dumps(state), ex=ttl)
+        pipe.sadd(self._index, node)
+        pipe.execute()
+
+    def remove(self, node: str) -> None:
+        """Forget *node* now (clean shutdown) rather than when its heartbeat expires."""
+        pipe = self._redis.pipeline()
+        pipe.delete(f"{self._prefix}{node}")
+        pipe.srem(self._index, node)
+        pipe.execute()
+
+    def nodes(self) -> list[dict[str, Any]]:
+        """Live nodes, sorted by name."""
+        members = self._redis.smembers(self._index)
+        names = sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+        if not names:
+            return []
+        states = self._redis.mget([f"{self._prefix}{name}" for name in names])
+        gone = [name for name, state in zip(names, states, strict=True) if state is None]
+        if gone:
+            self._redis.srem(self._index, *gone)
+        return [json.loads(state) for state in states if state is not None]
@@ -0,0 +1,93 @@
+"""Persistent ``getUpdates`` offset for polling mode.
+
+The offset is committed only after a batch of updates was dispatched, so a
+restart resumes where the previous process stopped: nothing is lost, and
+at most the last uncommitted batch is handled again.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+from typing import Any, Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OffsetStore(Protocol):
+    def load(self) -> int: ...
+
+    def save(self, offset: int) -> None: ...
+
+
+class MemoryOffsetStore:
+    """Keeps the offset for the life of the process only."""
+
+    def __init__(self) -> None:
+        self._offset = 0
+
+    def load(self) -> int:
+        return self._offset
+
+    def save(self, offset: int) -> None:
+        self._offset = offset
+
+
+class FileOffsetStore:
+    """Offset in a small local file, replaced atomically on every commit."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def load(self) -> int:
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError):
+            logger.exception("offset_load_error path=%s", self._path)
+            return 0
+
+    def save(self, offset: int) -> None:
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".offset-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(str(offset))
+            os.replace(tmp, self._path)
+        except OSError:
+            logger.exception("offset_save_error path=%s", self._path)
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+
+class RedisOffsetStore:
+    """Offset in Redis, keyed by bot so several bots can share an instance."""
+
+    def __init__(self, redis: Any, bot_id: str, prefix: str = "tcc:offset:") -> None:
+        self._redis = redis
+        self._key = f"{prefix}{bot_id}"
+
+    def load(self) -> int:
+        value = self._redis.get(self._key)
+        return int(value) if value is not None else 0
+
+    def save(self, offset: int) -> None:
+        self._redis.set(self._key, offset)
+
+
+def get_offset_store() -> OffsetStore:
+    """The store selected by ``polling_offset_backend``."""
+    backend = settings.polling_offset_backend
+    if backend == "redis":
+        from redis import Redis
+
+        bot_id = settings.telegram_bot_token.split(":", 1)[0]
+        return RedisOffsetStore(Redis.from_url(settings.redis_url), bot_id)
+    if backend == "file":
+        return FileOffsetStore(settings.polling_offset_file)
+    return MemoryOffsetStore()
@@ -0,0 +1,234 @@
+"""Outbound rate limiting for the Telegram Bot API.
+
+Telegram allows roughly 30 messages/s per bot, 1 message/s per chat and
+20 messages/min per group. Every send reserves a slot in a global bucket
+and in its chat's bucket; reservations are handed out in arrival order, so
+each chat behaves like a FIFO queue. Background calls (typing indicators)
+never wait and only use global capacity: they are dropped when the chat
+has no free slot right now, which keeps interactive replies ahead of them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_GLOBAL_KEY = "global"
+_MAX_IDLE_BUCKETS = 10_000
+
+
+class RateLimiter(Protocol):
+    def reserve(self, chat_id: int | None, priority: int = INTERACTIVE) -> float | None:
+        """Reserve a send slot and return the seconds to wait before sending.
+
+        Returns None when a BACKGROUND call cannot be served immediately.
+        """
+
+    def penalize(self, chat_id: int | None, retry_after: float) -> None:
+        """Block *chat_id* (or everything, if None) for *retry_after* seconds."""
+
+
+def _chat_rate(chat_id: int) -> float:
+    # Group and channel ids are negative
+    if chat_id < 0:
+        return settings.telegram_rate_group_per_min / 60.0
+    return settings.telegram_rate_chat_per_sec
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+
+class MemoryRateLimiter:
+    """Token buckets kept in process memory (polling mode, single worker)."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: dict[int | str, _Bucket] = {}
+
+    def _bucket(self, key: int | str, now: float) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > _MAX_IDLE_BUCKETS:
+                self._prune(now)
+            if key == _GLOBAL_KEY:
+                rate = settings.telegram_rate_global_per_sec
+            else:
+                rate = _chat_rate(int(key))
+            bucket = _Bucket(rate, max(1.0, rate), now)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        for key, bucket in list(self._buckets.items()):
+            if key != _GLOBAL_KEY and bucket.wait_time(now) == 0 and bucket.tokens >= bucket.burst:
+                del self._buckets[key]
+
+    def reserve(self, chat_id: int | None, priority: int = INTERACTIVE) -> float | None:
+        with self._lock:
+            now = self._clock()
+            buckets = [self._bucket(_GLOBAL_KEY, now)]
+            if chat_id is not None:
+                buckets.append(self._bucket(chat_id, now))
+            wait = max(b.wait_time(now) for b in buckets)
+            if priority == BACKGROUND:
+                if wait > 0:
+                    return None
+                # Chat actions don't count against the per-chat message limit
+                buckets = buckets[:1]
+            for b in buckets:
+                b.tokens -= 1
+            return wait
+
+    def penalize(self, chat_id: int | None, retry_after: float) -> None:
+        with self._lock:
+            now = self._clock()
+            key: int | str = _GLOBAL_KEY if chat_id is None else chat_id
+            bucket = self._bucket(key, now)
+            bucket.blocked_until = max(bucket.blocked_until, now + retry_after)
+
+
+# Reserve one token from every bucket in KEYS atomically.
+# ARGV: now, background flag, then (rate, burst) per key.
+_RESERVE_LUA = """
+local now = tonumber(ARGV[1])
+local background = ARGV[2] == '1'
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[1 + 2 * i])
+  local burst = tonumber(ARGV[2 + 2 * i])
+  local v = redis.call('HMGET', key, 'tokens', 'ts', 'blocked')
+  local t = tonumber(v[1]) or burst
+  local ts = tonumber(v[2]) or now
+  local blocked = tonumber(v[3]) or 0
+  t = math.min(burst, t + (now - ts) * rate)
+  tokens[i] = t
+  local w = 0
+  if t < 1 then w = (1 - t) / rate end
+  if blocked - now > w then w = blocked - now end
+  if w > wait then wait = w end
+end
+if background and wait > 0 then return '-1' end
+local n = #KEYS
+if background then n = 1 end
+for i = 1, n do
+  redis.call('HSET', KEYS[i], 'tokens', tokens[i] - 1, 'ts', now)
+  redis.call('EXPIRE', KEYS[i], 3600)
+end
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets shared through Redis so limits hold across worker processes."""
+
+    def __init__(self, redis: Any, prefix: str = "tcc:rl:") -> None:
+        self._redis = redis
+        self._prefix = prefix
+        self._script = redis.register_script(_RESERVE_LUA)
+
+    def _key(self, chat_id: int | None) -> str:
+        return f"{self._prefix}{_GLOBAL_KEY if chat_id is None else chat_id}"
+
+    def reserve(self, chat_id: int | None, priority: int = INTERACTIVE) -> float | None:
+        global_rate = settings.telegram_rate_global_per_sec
+        keys = [self._key(None)]
+        args: list[Any] = [time.time(), int(priority == BACKGROUND), global_rate, global_rate]
+        if chat_id is not None:
+            rate = _chat_rate(chat_id)
+            keys.append(self._key(chat_id))
+            args.extend([rate, max(1.0, rate)])
+        wait = float(self._script(keys=keys, args=args))
+        return None if wait < 0 else wait
+
+    def penalize(self, chat_id: int | None, retry_after: float) -> None:
+        key = self._key(chat_id)
+        until = time.time() + retry_after
+        current = self._redis.hget(key, "blocked")
+        if current is None or float(current) < until:
+            self._redis.hset(key, "blocked", until)
+            self._redis.expire(key, 3600)
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter selected by ``telegram_rate_limit_backend``."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if settings.telegram_rate_limit_backend == "redis":
+                    from redis import Redis
+
+                    _limiter = RedisRateLimiter(Redis.from_url(settings.redis_url))
+                else:
+                    _limiter = MemoryRateLimiter()
+    return _limiter
+
+
+def acquire(chat_id: int | None, priority: int = INTERACTIVE) -> bool:
+    """Block until a send slot is available. False means: drop this background call."""
+    try:
+        wait = get_limiter().reserve(chat_id, priority)
+    except Exception:
+        logger.exception("ratelimit_error chat_id=%s", chat_id)
+        return True
+    if wait is None:
+        return False
+    if wait > 0:
+        time.sleep(wait)
+    return True
+
+
+async def aacquire(chat_id: int | None, priority: int = INTERACTIVE) -> bool:
+    """Async variant of :func:`acquire`; the Redis round-trip runs off the event loop."""
+    limiter = get_limiter()
+    try:
+        if isinstance(limiter, MemoryRateLimiter):
+            wait = limiter.reserve(chat_id, priority)
+        else:
+            wait = await asyncio.to_thread(limiter.reserve, chat_id, priority)
+    except Exception:
+        logger.exception("ratelimit_error chat_id=%s", chat_id)
+        return True
+    if wait is None:
+        return False
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return True
+
+
+def penalize(chat_id: int | None, retry_after: float) -> None:
+    try:
+        get_limiter().penalize(chat_id, retry_after)
+    except Exception:
+        logger.exception("ratelimit_error chat_id=%s", chat_id)
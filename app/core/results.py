@@ -0,0 +1,134 @@
+"""Saved Claude answers, kept apart from their delivery to Telegram.
+
+An answer is saved as soon as Claude returns it, together with how many of
+its delivery parts Telegram has acknowledged (see
+:func:`app.bot.telegram_client.deliver_saved`). A delivery that fails part
+way, because Telegram is unreachable or the worker died, resumes from the
+first unacknowledged part instead of re-running Claude: RQ retries the job,
+which finds the saved answer under its job id, and ``/last`` re-sends a
+chat's latest answer on demand.
+
+Polling mode and the in-process executor keep answers in memory; RQ keeps
+them in Redis. Either way they expire after ``result_ttl_sec``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from app.config import settings
+
+
+class Result:
+    """One saved answer and its delivery progress."""
+
+    def __init__(self, job_id: str, text: str, acked: int = 0, done: bool = False) -> None:
+        self.job_id = job_id
+        self.text = text
+        self.acked = acked  # delivery parts Telegram has acknowledged
+        self.done = done
+
+
+class ResultStore(Protocol):
+    def save(self, chat_id: int, job_id: str, text: str) -> Result: ...
+
+    def get(self, job_id: str) -> Result | None: ...
+
+    def last(self, chat_id: int) -> Result | None: ...
+
+    def ack(self, job_id: str, acked: int, done: bool = False) -> None: ...
+
+
+class MemoryResultStore:
+    """The latest ``result_max`` answers of this process, with a TTL."""
+
+    def __init__(
+        self,
+        ttl: float | None = None,
+        max_results: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl = settings.result_ttl_sec if ttl is None else ttl
+        self._max = settings.result_max if max_results is None else max_results
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[Result, float]] = OrderedDict()
+        self._last: dict[int, str] = {}
+
+    def save(self, chat_id: int, job_id: str, text: str) -> Result:
+        result = Result(job_id, text)
+        with self._lock:
+            self._data[job_id] = (result, self._clock())
+            self._data.move_to_end(job_id)
+            self._last[chat_id] = job_id
+            while len(self._data) > self._max:
+                self._data.popitem(last=False)
+        return result
+
+    def get(self, job_id: str) -> Result | None:
+        with self._lock:
+            entry = self._data.get(job_id)
+            if entry is None:
+                return None
+            result, saved = entry
+            if self._clock() - saved > self._ttl:
+                del self._data[job_id]
+                return None
+            return Result(result.job_id, result.text, result.acked, result.done)
+
+    def last(self, chat_id: int) -> Result | None:
+        with self._lock:
+            job_id = self._last.get(chat_id)
+        return None if job_id is None else self.get(job_id)
+
+    def ack(self, job_id: str, acked: int, done: bool = False) -> None:
+        with self._lock:
+            entry = self._data.get(job_id)
+            if entry is not None:
+                entry[0].acked, entry[0].done = acked, done
+
+
+class RedisResultStore:
+    """Answers in Redis hashes keyed by job id, plus each chat's latest job id."""
+
+    def __init__(self, redis: Any, prefix: str = "tcc:result:") -> None:
+        self._redis = redis
+        self._prefix = prefix
+
+    def save(self, chat_id: int, job_id: str, text: str) -> Result:
+        key = f"{self._prefix}{job_id}"
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={"text": text, "acked": 0, "done": 0})
+        pipe.expire(key, settings.result_ttl_sec)
+        pipe.set(f"{self._prefix}last:{chat_id}", job_id, ex=settings.result_ttl_sec)
+        pipe.execute()
+        return Result(job_id, text)
+
+    def get(self, job_id: str) -> Result | None:
+        fields = self._redis.hgetall(f"{self._prefix}{job_id}")
+        if not fields:
+            return None
+        fields = {(k.decode() if isinstance(k, bytes) else k): v for k, v in fields.items()}
+        text = fields.get("text", b"")
+        return Result(
+            job_id,
+            text.decode() if isinstance(text, bytes) else str(text),
+            int(fields.get("acked", 0)),
+            int(fields.get("done", 0)) == 1,
+        )
+
+    def last(self, chat_id: int) -> Result | None:
+        job_id = self._redis.get(f"{self._prefix}last:{chat_id}")
+        if job_id is None:
+            return None
+        return self.get(job_id.decode() if isinstance(job_id, bytes) else str(job_id))
+
+    def ack(self, job_id: str, acked: int, done: bool = False) -> None:
+        # HSET on an expired hash would recreate it without its text or TTL
+        key = f"{self._prefix}{job_id}"
+        if self._redis.exists(key):
+            self._redis.hset(key, mapping={"acked": acked, "done": int(done)})
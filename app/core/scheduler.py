@@ -0,0 +1,189 @@
+"""Fair per-user scheduling of Claude jobs.
+
+Polling mode uses :class:`FairScheduler`, which sits in front of a thread
+pool: each user has their own FIFO queue, at most
+``claude_concurrency_per_user`` of a user's jobs run at once, and free
+slots are handed out round-robin across users so one user pasting many
+prompts cannot starve everyone else. With an adaptive limiter (see
+:mod:`app.core.limiter`) each job also needs one of its permits to start.
+
+Webhook mode uses :class:`RedisSemaphore` so the per-user cap holds across
+RQ worker processes.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+from app.core import metrics
+
+if TYPE_CHECKING:
+    from app.core.limiter import AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+# fn, args, enqueued_at, context of the submitter (carries the trace)
+_Job = tuple[Callable[..., Any], tuple[Any, ...], float, contextvars.Context]
+
+
+class FairScheduler:
+    """Round-robin scheduler with a per-user in-flight cap."""
+
+    def __init__(
+        self, max_workers: int, per_user: int, limiter: AdaptiveLimiter | None = None
+    ) -> None:
+        self._max_workers = max(1, max_workers)
+        self._per_user = max(1, per_user)
+        self._limiter = limiter
+        self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
+        self._lock = threading.Lock()
+        self._pending: dict[int, deque[_Job]] = {}
+        self._ring: deque[int] = deque()  # users with pending jobs, in service order
+        self._inflight: dict[int, int] = {}
+        self._running = 0
+        if limiter is not None:
+            limiter.subscribe(self._on_permit)
+
+    def submit(self, user_id: int, fn: Callable[..., Any], *args: Any) -> int:
+        """Queue *fn(*args)* for *user_id*.
+
+        Returns the job's position in the wait queue: 0 if it started
+        immediately, otherwise the number of jobs that will start before it
+        plus one.
+        """
+        job: _Job = (fn, args, time.monotonic(), contextvars.copy_context())
+        with self._lock:
+            queue = self._pending.get(user_id)
+            if queue is None:
+                queue = self._pending[user_id] = deque()
+                self._ring.append(user_id)
+            queue.append(job)
+            self._dispatch_locked()
+            remaining = self._pending.get(user_id, deque())
+            for index, queued in enumerate(remaining):
+                if queued is job:
+                    return self._position_locked(user_id, index)
+            return 0
+
+    def position(self, user_id: int) -> int:
+        """Position of *user_id*'s next queued job (0 if nothing is queued)."""
+        with self._lock:
+            if not self._pending.get(user_id):
+                return 0
+            return self._position_locked(user_id, 0)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._pending.values())
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._ring.clear()
+        self._pool.shutdown(wait=wait)
+
+    def _position_locked(self, user_id: int, index: int) -> int:
+        # Jobs of other users that round-robin serves before our (index+1)-th job
+        ahead = index + 1
+        before = True
+        for other in self._ring:
+            if other == user_id:
+                before = False
+                continue
+            pending = len(self._pending.get(other, ()))
+            ahead += min(pending, index + 1 if before else index)
+        return ahead
+
+    def _dispatch_locked(self) -> None:
+        while self._running < self._max_workers and self._ring:
+            for _ in range(len(self._ring)):
+                user_id = self._ring[0]
+                self._ring.rotate(-1)
+                if self._inflight.get(user_id, 0) < self._per_user:
+                    break
+            else:
+                return  # every waiting user is at their cap
+            if self._limiter is not None and not self._limiter.try_acquire():
+                self._ring.rotate(1)  # keep this user first in line for the next permit
+                return
+            queue = self._pending[user_id]
+            fn, args, enqueued_at, context = queue.popleft()
+            metrics.QUEUE_WAIT_SECONDS.labels("polling").observe(time.monotonic() - enqueued_at)
+            if not queue:
+                del self._pending[user_id]
+                self._ring.remove(user_id)
+            self._inflight[user_id] = self._inflight.get(user_id, 0) + 1
+            self._running += 1
+            self._pool.submit(self._run, user_id, context, fn, args)
+
+    def _on_permit(self) -> None:
+        with self._lock:
+            self._dispatch_locked()
+
+    def _run(
+        self,
+        user_id: int,
+        context: contextvars.Context,
+        fn: Callable[..., Any],
+        args: tuple[Any, ...],
+    ) -> None:
+        try:
+            context.run(fn, *args)
+        except Exception:
+            logger.exception("scheduler_job_error user_id=%s", user_id)
+        finally:
+            with self._lock:
+                self._running -= 1
+                left = self._inflight.get(user_id, 1) - 1
+                if left:
+                    self._inflight[user_id] = left
+                else:
+                    self._inflight.pop(user_id, None)
+                if self._limiter is None:
+                    self._dispatch_locked()
+            if self._limiter is not None:
+                # Outside our lock: the release dispatches every scheduler sharing the limiter
+                self._limiter.release()
+
+
+# Acquire a slot in a sorted-set semaphore. Holders older than the lease
+# are treated as dead (crashed worker) and evicted first.
+# KEYS[1]: semaphore key; ARGV: holder id, now, lease seconds, limit
+_ACQUIRE_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - tonumber(ARGV[3]))
+if redis.call('ZCARD', key) >= tonumber(ARGV[4]) then
+  return 0
+end
+redis.call('ZADD', key, now, ARGV[1])
+redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[3])))
+return 1
+"""
+
+
+class RedisSemaphore:
+    """Counting semaphore shared through Redis (per-user cap across workers)."""
+
+    def __init__(self, redis: Any, prefix: str = "tcc:sem:") -> None:
+        self._redis = redis
+        self._prefix = prefix
+        self._script = redis.register_script(_ACQUIRE_LUA)
+
+    def _key(self, name: str | int) -> str:
+        return f"{self._prefix}{name}"
+
+    def acquire(self, name: str | int, holder: str, limit: int, lease: float) -> bool:
+        """Try to take one of *limit* slots; the slot expires after *lease* seconds."""
+        args = [holder, time.time(), lease, limit]
+        return bool(self._script(keys=[self._key(name)], args=args))
+
+    def release(self, name: str | int, holder: str) -> None:
+        self._redis.zrem(self._key(name), holder)
@@ -0,0 +1,87 @@
+"""Per-chat Claude session ids, so follow-up messages can ``--resume``.
+
+Polling mode keeps sessions in process memory; webhook mode stores them in
+Redis because each RQ job runs in its own work-horse process.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from app.config import settings
+
+
+class MemorySessionStore:
+    """LRU map of chat_id -> session id with a TTL since last use."""
+
+    def __init__(
+        self,
+        ttl: float | None = None,
+        max_sessions: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl = settings.claude_session_ttl_sec if ttl is None else ttl
+        self._max = settings.claude_session_max if max_sessions is None else max_sessions
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: OrderedDict[int, tuple[str, float]] = OrderedDict()
+
+    def get(self, chat_id: int) -> str | None:
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None:
+                return None
+            session_id, touched = entry
+            if self._clock() - touched > self._ttl:
+                del self._data[chat_id]
+                return None
+            self._data.move_to_end(chat_id)  # active chats are evicted last
+            return session_id
+
+    def set(self, chat_id: int, session_id: str) -> None:
+        with self._lock:
+            self._data[chat_id] = (session_id, self._clock())
+            self._data.move_to_end(chat_id)
+            while len(self._data) > self._max:
+                self._data.popitem(last=False)
+
+    def reset(self, chat_id: int) -> None:
+        with self._lock:
+            self._data.pop(chat_id, None)
+
+
+class RedisSessionStore:
+    """Session ids in Redis with per-key TTL; a sorted set by last use enforces the cap."""
+
+    def __init__(self, redis: Any, prefix: str = "tcc:session:") -> None:
+        self._redis = redis
+        self._prefix = prefix
+        self._index = f"{prefix}lru"
+
+    def get(self, chat_id: int) -> str | None:
+        value = self._redis.get(f"{self._prefix}{chat_id}")
+        if value is None:
+            return None
+        return value.decode() if isinstance(value, bytes) else str(value)
+
+    def set(self, chat_id: int, session_id: str) -> None:
+        pipe = self._redis.pipeline()
+        pipe.set(f"{self._prefix}{chat_id}", session_id, ex=settings.claude_session_ttl_sec)
+        pipe.zadd(self._index, {str(chat_id): time.time()})
+        pipe.zcard(self._index)
+        size = pipe.execute()[-1]
+        overflow = int(size) - settings.claude_session_max
+        if overflow > 0:
+            for old in self._redis.zpopmin(self._index, overflow):
+                member = old[0].decode() if isinstance(old[0], bytes) else old[0]
+                self._redis.delete(f"{self._prefix}{member}")
+
+    def reset(self, chat_id: int) -> None:
+        pipe = self._redis.pipeline()
+        pipe.delete(f"{self._prefix}{chat_id}")
+        pipe.zrem(self._index, str(chat_id))
+        pipe.execute()
@@ -0,0 +1,209 @@
+"""Request tracing across webhook, queue, worker, Claude and Telegram.
+
+A trace starts when an update arrives and travels with the prompt as a
+W3C ``traceparent`` string: in the RQ job's meta, in the in-process
+executor's queue entries and in the ``TRACEPARENT`` environment variable
+of the Claude subprocess. Each hop records a timed span.
+
+``tracing="log"`` writes each finished span as one JSON object, to
+``tracing_file`` if set, otherwise to the ``app.trace`` logger.
+``tracing="otel"`` records spans with OpenTelemetry (exporters are
+configured the usual OpenTelemetry way) and falls back to JSON logs when
+``opentelemetry-api`` is not installed.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+_span_logger = logging.getLogger("app.trace")
+
+# (trace id, id of the active span or None at the start of a hop)
+_current: ContextVar[tuple[str, str | None] | None] = ContextVar("tcc_trace", default=None)
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def _new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def current_trace_id() -> str | None:
+    current = _current.get()
+    return current[0] if current else None
+
+
+def traceparent() -> str | None:
+    """The active trace as a W3C ``traceparent`` header value, for the next hop."""
+    current = _current.get()
+    if current is None:
+        return None
+    trace_id, span_id = current
+    return f"00-{trace_id}-{span_id or _new_span_id()}-01"
+
+
+def _parse(value: str | None) -> tuple[str, str | None] | None:
+    match = _TRACEPARENT_RE.match(value or "")
+    return (match.group(1), match.group(2)) if match else None
+
+
+@contextmanager
+def attach(parent: str | None = None) -> Iterator[None]:
+    """Continue the trace carried by *parent* (a traceparent), or start a new one."""
+    token = _current.set(_parse(parent) or (new_trace_id(), None))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def child_env() -> dict[str, str] | None:
+    """Environment for a subprocess that should join the trace (None = inherit)."""
+    parent = traceparent()
+    if parent is None:
+        return None
+    return {**os.environ, "TRACEPARENT": parent, "TCC_TRACE_ID": parent[3:35]}
+
+
+class FileExporter:
+    """Append spans as JSON lines to a local file."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)  # noqa: SIM115
+
+    def export(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class LogExporter:
+    """Write spans as JSON to the ``app.trace`` logger."""
+
+    def export(self, record: dict[str, Any]) -> None:
+        _span_logger.info(json.dumps(record, default=str))
+
+
+_exporter: FileExporter | LogExporter | None = None
+_exporter_lock = threading.Lock()
+_otel_tracer: Any = None
+_otel_checked = False
+
+
+def _get_exporter() -> FileExporter | LogExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = (
+                    FileExporter(settings.tracing_file) if settings.tracing_file else LogExporter()
+                )
+    return _exporter
+
+
+def _get_otel_tracer() -> Any:
+    global _otel_tracer, _otel_checked
+    if not _otel_checked:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("tracing=otel but opentelemetry is not installed; logging spans")
+        else:
+            _otel_tracer = trace.get_tracer("teleclaudecode")
+        _otel_checked = True
+    return _otel_tracer
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Record a timed span for the enclosed block (no-op when tracing is off)."""
+    if settings.tracing == "off":
+        yield
+        return
+    tracer = _get_otel_tracer() if settings.tracing == "otel" else None
+    if tracer is not None:
+        with _otel_span(tracer, name, attrs):
+            yield
+        return
+
+    trace_id, parent_id = _current.get() or (new_trace_id(), None)
+    span_id = _new_span_id()
+    token = _current.set((trace_id, span_id))
+    started = time.time()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException as exc:
+        status = f"error: {type(exc).__name__}"
+        raise
+    finally:
+        _current.reset(token)
+        record = {
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "start": started,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "status": status,
+            **attrs,
+        }
+        try:
+            _get_exporter().export(record)
+        except Exception:
+            logger.exception("trace_export_error span=%s", name)
+
+
+@contextmanager
+def _otel_span(tracer: Any, name: str, attrs: dict[str, Any]) -> Iterator[None]:
+    from opentelemetry import trace
+    from opentelemetry.trace import NonRecordingSpan, SpanContext, TraceFlags
+
+    context = None
+    current = _current.get()
+    if current is not None and current[1] is not None and not _in_otel_span(current[0]):
+        # Continue a trace that arrived from another process
+        remote = SpanContext(
+            int(current[0], 16),
+            int(current[1], 16),
+            is_remote=True,
+            trace_flags=TraceFlags(TraceFlags.SAMPLED),
+        )
+        context = trace.set_span_in_context(NonRecordingSpan(remote))
+    with tracer.start_as_current_span(name, context=context, attributes=attrs) as otel_span:
+        span_context = otel_span.get_span_context()
+        if span_context.is_valid:
+            ids = (f"{span_context.trace_id:032x}", f"{span_context.span_id:016x}")
+        else:
+            ids = (current[0] if current else new_trace_id(), _new_span_id())
+        token = _current.set(ids)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+
+def _in_otel_span(trace_id: str) -> bool:
+    from opentelemetry import trace
+
+    span_context = trace.get_current_span().get_span_context()
+    return span_context.is_valid and f"{span_context.trace_id:032x}" == trace_id
@@ -0,0 +1,327 @@
+"""Per-chat workspaces: isolated working directories for Claude runs.
+
+Without them every Claude process runs in the worker's current directory,
+so concurrent jobs edit the same working tree. With ``workspace_base``
+set, each chat gets its own checkout of that project under
+``workspace_root``, created cheaply instead of copied file by file:
+
+- ``worktree``: ``git worktree add`` shares the base repository's object
+  store, so only the checked-out files are written. It checks out the
+  base's ``HEAD``; uncommitted changes in the base are not included.
+- ``copy``: ``cp --reflink=auto`` makes a copy-on-write clone on
+  filesystems that support it (btrfs, XFS) and a plain copy elsewhere.
+
+``auto`` picks ``worktree`` for git repositories and ``copy`` otherwise.
+Hardlinked trees are not offered: Claude edits files in place, which would
+write through the shared inode into the base project.
+
+A chat keeps its workspace between turns, so follow-ups see Claude's
+earlier edits. Idle workspaces are removed least recently used first once
+together they take more than ``workspace_max_disk_mb``, and after
+``workspace_idle_ttl_sec`` without use. A workspace in use holds a shared
+lock on its lock file, so a collection in another process (RQ workers
+share the root) never removes it mid-run.
+
+The chat of the running job is kept in a context variable (see
+:func:`use`); the Claude executors check its workspace out around each
+run (see :func:`checkout`) and start Claude there (see :func:`cwd`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import IO
+
+from app.config import settings
+from app.core import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-use marks only cover this process
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Disk usage is summed over every workspace, so collect at most this often
+_GC_INTERVAL_SEC = 60.0
+_GIT_TIMEOUT_SEC = 300
+
+
+class Lease:
+    """A checked-out workspace; hold it for the duration of one Claude run."""
+
+    def __init__(self, key: str, path: Path, lock: IO[bytes]) -> None:
+        self.key = key
+        self.path = path
+        self.lock = lock
+
+
+class WorkspaceManager:
+    """Creates, hands out and collects the workspaces under *root*."""
+
+    def __init__(
+        self, base: str, root: str, mode: str, max_bytes: int, idle_ttl_sec: float
+    ) -> None:
+        self.base = Path(base).resolve()
+        self.root = Path(root)
+        if mode == "auto":
+            mode = "worktree" if (self.base / ".git").exists() else "copy"
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.idle_ttl_sec = idle_ttl_sec
+        self._lock = threading.Lock()
+        self._in_use: dict[str, int] = {}
+        self._last_gc = 0.0
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Serialises creation and collection across threads and processes
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / ".lock", "ab") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+
+    def _lock_path(self, key: str) -> Path:
+        return self.root / f"{key}.lock"
+
+    def acquire(self, key: str) -> Lease:
+        """The workspace for *key*, created from the base project if needed."""
+        path = self.root / key
+        with self._locked():
+            if not path.is_dir():
+                self._create(path)
+            lock = open(self._lock_path(key), "ab")  # held until release
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        os.utime(lock.name)  # last used, for the LRU order
+        return Lease(key, path, lock)
+
+    def release(self, lease: Lease) -> None:
+        try:
+            os.utime(lease.lock.name)
+        except OSError:
+            pass
+        with self._lock:
+            self._in_use[lease.key] -= 1
+            if not self._in_use[lease.key]:
+                del self._in_use[lease.key]
+            lease.lock.close()  # drops the shared lock
+        if time.monotonic() - self._last_gc >= _GC_INTERVAL_SEC:
+            try:
+                self.gc()
+            except OSError:
+                logger.exception("workspace_gc_error root=%s", self.root)
+
+    def _create(self, path: Path) -> None:
+        start = time.monotonic()
+        try:
+            if self.mode == "worktree":
+                # --force: reuse a path whose earlier worktree was deleted without git
+                _run(
+                    [
+                        "git",
+                        "-C",
+                        str(self.base),
+                        "worktree",
+                        "add",
+                        "--force",
+                        "--detach",
+                        str(path),
+                    ]
+                )
+            elif platform.system() == "Linux":
+                _run(["cp", "-a", "--reflink=auto", str(self.base), str(path)])
+            else:
+                shutil.copytree(self.base, path, symlinks=True)
+        except (OSError, subprocess.SubprocessError):
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        elapsed = time.monotonic() - start
+        metrics.WORKSPACE_SETUP_SECONDS.labels(self.mode).observe(elapsed)
+        logger.info("workspace_created path=%s mode=%s ms=%d", path, self.mode, elapsed * 1000)
+
+    def _remove(self, key: str) -> None:
+        path = self.root / key
+        if self.mode == "worktree":
+            try:
+                _run(["git", "-C", str(self.base), "worktree", "remove", "--force", str(path)])
+            except (OSError, subprocess.SubprocessError):
+                shutil.rmtree(path, ignore_errors=True)
+                subprocess.run(
+                    ["git", "-C", str(self.base), "worktree", "prune"],
+                    capture_output=True,
+                    timeout=_GIT_TIMEOUT_SEC,
+                    check=False,
+                )
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+        self._lock_path(key).unlink(missing_ok=True)
+
+    def _idle(self, key: str) -> bool:
+        if self._in_use.get(key):
+            return False
+        if fcntl is None:
+            return True
+        with open(self._lock_path(key), "ab") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False  # in use by another process
+        return True
+
+    def gc(self) -> int:
+        """Remove idle workspaces over the disk budget or TTL; return how many."""
+        self._last_gc = time.monotonic()
+        removed = 0
+        with self._locked():
+            entries = []
+            for path in self.root.iterdir():
+                if not path.is_dir():
+                    continue
+                lock_path = self._lock_path(path.name)
+                last_used = (lock_path if lock_path.exists() else path).stat().st_mtime
+                entries.append((last_used, path.name, _disk_usage(path)))
+            total = sum(size for _, _, size in entries)
+            now = time.time()
+            for last_used, key, size in sorted(entries):  # least recently used first
+                over_budget = bool(self.max_bytes) and total > self.max_bytes
+                expired = bool(self.idle_ttl_sec) and now - last_used > self.idle_ttl_sec
+                if not (over_budget or expired) or not self._idle(key):
+                    continue
+                self._remove(key)
+                total -= size
+                removed += 1
+        metrics.WORKSPACE_BYTES.set(total)
+        logger.info("workspace_gc removed=%d total_mb=%.0f", removed, total / 1e6)
+        return removed
+
+
+def _run(cmd: list[str]) -> None:
+    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=_GIT_TIMEOUT_SEC)
+    if proc.returncode != 0:
+        raise subprocess.SubprocessError(proc.stderr.strip()[-500:] or f"{cmd[0]} failed")
+
+
+def _disk_usage(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            # Allocated blocks where available, so sparse files count as stored
+            total += getattr(st, "st_blocks", 0) * 512 or st.st_size
+    return total
+
+
+_manager: WorkspaceManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> WorkspaceManager | None:
+    """The process-wide manager, or None when ``workspace_base`` is unset."""
+    global _manager
+    if not settings.workspace_base:
+        return None
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = WorkspaceManager(
+                    base=settings.workspace_base,
+                    root=settings.workspace_root
+                    or os.path.join(tempfile.gettempdir(), "tcc-workspaces"),
+                    mode=settings.workspace_mode,
+                    max_bytes=settings.workspace_max_disk_mb * 1_000_000,
+                    idle_ttl_sec=settings.workspace_idle_ttl_sec,
+                )
+    return _manager
+
+
+_chat: contextvars.ContextVar[int | None] = contextvars.ContextVar("tcc_ws_chat", default=None)
+_cwd: contextvars.ContextVar[str | None] = contextvars.ContextVar("tcc_ws_cwd", default=None)
+
+
+@contextmanager
+def use(chat_id: int) -> Iterator[None]:
+    """Run the block as *chat_id*'s job, so Claude runs in the chat's workspace."""
+    token = _chat.set(chat_id)
+    try:
+        yield
+    finally:
+        _chat.reset(token)
+
+
+def active() -> bool:
+    """True if Claude runs of the current job get a workspace."""
+    return _chat.get() is not None and get_manager() is not None
+
+
+def acquire() -> Lease | None:
+    """Check out the current chat's workspace; None when there is none to use."""
+    chat_id, manager = _chat.get(), get_manager()
+    if chat_id is None or manager is None:
+        return None
+    try:
+        return manager.acquire(f"chat-{chat_id}")
+    except (OSError, subprocess.SubprocessError) as exc:
+        logger.exception("workspace_error chat_id=%s", chat_id)
+        raise RuntimeError(f"workspace unavailable: {exc}") from None
+
+
+def path() -> str | None:
+    """The current chat's workspace directory (it may not exist yet), or None."""
+    chat_id, manager = _chat.get(), get_manager()
+    if chat_id is None or manager is None:
+        return None
+    return str((manager.root / f"chat-{chat_id}").resolve())
+
+
+def release(lease: Lease | None) -> None:
+    manager = get_manager()
+    if lease is not None and manager is not None:
+        manager.release(lease)
+
+
+@contextmanager
+def checkout() -> Iterator[str | None]:
+    """Run the block in the current chat's workspace (see :func:`cwd`)."""
+    lease = acquire()
+    token = _cwd.set(str(lease.path) if lease is not None else None)
+    try:
+        yield _cwd.get()
+    finally:
+        _cwd.reset(token)
+        release(lease)
+
+
+@asynccontextmanager
+async def checkout_async() -> AsyncIterator[str | None]:
+    """:func:`checkout` for the event loop; git and disk work run in a thread."""
+    lease = await asyncio.to_thread(acquire)
+    token = _cwd.set(str(lease.path) if lease is not None else None)
+    try:
+        yield _cwd.get()
+    finally:
+        _cwd.reset(token)
+        await asyncio.to_thread(release, lease)
+
+
+def cwd() -> str | None:
+    """Directory to start Claude in: the checked-out workspace, or None (inherit)."""
+    return _cwd.get()
@@ -3,18 +3,45 @@
 from __future__ import annotations
 
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from app.api.deps import close_redis
 from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
 from app.api.webhook import router as webhook_router
+from app.bot import tg_api
 from app.config import settings
+from app.core import lanes
 
 logging.basicConfig(
     level=getattr(logging, settings.log_level.upper(), logging.INFO),
     format="%(asctime)s %(levelname)s %(name)s %(message)s",
 )
 
-app = FastAPI(title="TeleClaudeCode", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    executor = None
+    if settings.webhook_executor == "inprocess":
+        from app.worker.async_exec import InProcessExecutor
+
+        executor = InProcessExecutor(
+            concurrency=lanes.concurrency(lanes.FAST),
+            max_queue=settings.inprocess_queue_size,
+        )
+        executor.start()
+    app.state.executor = executor
+    yield
+    if executor is not None:
+        await executor.drain(settings.shutdown_drain_sec)
+    await close_redis(app)
+    await tg_api.aclose()
+
+
+app = FastAPI(title="TeleClaudeCode", version="0.1.0", lifespan=lifespan)
 app.include_router(health_router)
+app.include_router(metrics_router)
 app.include_router(webhook_router, prefix="/telegram")
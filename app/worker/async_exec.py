@@ -0,0 +1,350 @@
+"""In-process asyncio execution of Claude jobs (webhook mode without RQ).
+
+For single-node deployments the API process can run Claude itself: jobs go
+into a bounded queue per lane (see :mod:`app.core.lanes`), served by
+``claude_global_concurrency`` fast and ``lane_bulk_concurrency`` bulk
+worker tasks, each driving ``claude`` through
+``asyncio.create_subprocess_exec``. A full queue rejects new prompts with a
+"busy" reply, as does a queue whose expected wait is over its lane's budget
+(see :mod:`app.core.admission`), and shutdown drains queued jobs before
+exiting. With ``concurrency_adaptive`` a job also waits for a permit of the
+adaptive limiter (see :mod:`app.core.limiter`). The RQ path remains for
+scale-out.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import subprocess
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+from app.bot.telegram_client import StreamingMessage, deliver, deliver_saved, send_message
+from app.config import settings
+from app.core import admission, cancel, lanes, metrics, tracing, workspaces
+from app.core import cache as response_cache
+from app.core.cancel import MemoryCancelStore
+from app.core.limiter import get_limiter
+from app.core.results import MemoryResultStore
+from app.core.sessions import MemorySessionStore
+from app.worker.capture import Capture
+from app.worker.claude_exec import (
+    _IS_WINDOWS,
+    StreamResult,
+    _build_cmd,
+    _is_missing_session,
+    _session_args,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pause before retrying a job whose user is at their concurrency cap (or without a permit)
+_REQUEUE_DELAY_SEC = 0.5
+
+# chat, user, prompt, use_cache, enqueued_at, traceparent, cancel ticket, deadline
+_Job = tuple[int, int, str, bool, float, str | None, int, float | None]
+
+
+async def run_claude_async(
+    prompt: str,
+    resume: str | None = None,
+    on_text: Callable[[str], Awaitable[None]] | None = None,
+    on_session: Callable[[str], None] | None = None,
+) -> str:
+    """Async counterpart of :func:`app.worker.claude_exec.stream_claude`.
+
+    Raises RuntimeError on failure or timeout.
+    """
+    with metrics.track_claude("async"), tracing.span("claude", executor="async"):
+        async with workspaces.checkout_async():
+            try:
+                return await _run_claude_async(prompt, resume, on_text, on_session)
+            except RuntimeError as exc:
+                if resume and _is_missing_session(exc):
+                    logger.info("claude_session_missing session=%s, starting fresh", resume)
+                    return await _run_claude_async(prompt, None, on_text, on_session)
+                raise
+
+
+async def _run_claude_async(
+    prompt: str,
+    resume: str | None,
+    on_text: Callable[[str], Awaitable[None]] | None,
+    on_session: Callable[[str], None] | None,
+) -> str:
+    cmd = _build_cmd(
+        prompt,
+        *_session_args(
+            resume, "--output-format", "stream-json", "--verbose", "--include-partial-messages"
+        ),
+    )
+    logger.info("claude_async prompt_len=%d timeout=%d", len(prompt), lanes.timeout_sec())
+    # A stream-json line can be as long as the answer; the default 64 KiB limit is too small
+    limit = settings.claude_max_output_bytes + 1 if settings.claude_max_output_bytes else 2**31
+    try:
+        if _IS_WINDOWS:  # .cmd wrappers need a shell
+            proc = await asyncio.create_subprocess_shell(
+                subprocess.list2cmdline(cmd),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=tracing.child_env(),
+                cwd=workspaces.cwd(),
+                limit=limit,
+            )
+        else:
+            # Own process group, so a cancel also kills the tools Claude started
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=tracing.child_env(),
+                cwd=workspaces.cwd(),
+                limit=limit,
+                start_new_session=True,
+            )
+    except FileNotFoundError:
+        raise RuntimeError(f"claude binary not found: {settings.claude_bin}") from None
+
+    stdout, stderr_pipe = proc.stdout, proc.stderr
+    if stdout is None or stderr_pipe is None:
+        proc.kill()
+        raise RuntimeError("claude output pipes unavailable")
+    state = StreamResult(on_session)
+    capture = Capture(keep_stdout=False)
+
+    async def _read_stdout() -> None:
+        while True:
+            try:
+                raw = await stdout.readline()
+            except ValueError:  # a single line beyond the cap
+                capture.overflow = True
+                return
+            if not raw or not capture.add_stdout(raw):
+                return
+            if state.feed(raw.decode("utf-8", errors="replace")) and on_text is not None:
+                try:
+                    await on_text(state.partial())
+                except Exception:
+                    logger.exception("claude_async on_text callback failed")
+
+    async def _read_stderr() -> None:
+        while chunk := await stderr_pipe.read(64 * 1024):
+            capture.add_stderr(chunk)
+
+    stderr_task = asyncio.create_task(_read_stderr())
+    try:
+        with cancel.track(proc) as handle:
+            await asyncio.wait_for(_read_stdout(), timeout=lanes.timeout_sec())
+            if capture.overflow:
+                cancel.kill_group(proc)
+                while await stdout.read(64 * 1024):  # discard until EOF so wait() can finish
+                    pass
+            await proc.wait()
+    except asyncio.TimeoutError:
+        cancel.kill_group(proc)
+        await proc.wait()
+        raise RuntimeError(f"claude timed out after {lanes.timeout_sec()}s") from None
+    except asyncio.CancelledError:
+        cancel.kill_group(proc)
+        await proc.wait()
+        raise
+    finally:
+        await stderr_task
+        capture.report()
+
+    if handle.cancelled.is_set():
+        raise RuntimeError("claude run cancelled")
+    if capture.overflow:
+        raise RuntimeError(f"claude output exceeded {capture.max_bytes} bytes, run stopped")
+    if proc.returncode != 0:
+        detail = capture.stderr_tail()[-500:] or "(no stderr)"
+        raise RuntimeError(f"claude exited with code {proc.returncode}: {detail}")
+    return state.output()
+
+
+class InProcessExecutor:
+    """Bounded asyncio job queues, one per lane, served by a fixed number of worker tasks."""
+
+    def __init__(
+        self, concurrency: int, max_queue: int, bulk_concurrency: int | None = None
+    ) -> None:
+        if bulk_concurrency is None:
+            bulk_concurrency = settings.lane_bulk_concurrency
+        self._concurrency = {lanes.FAST: max(1, concurrency), lanes.BULK: max(1, bulk_concurrency)}
+        self._queues: dict[str, asyncio.Queue[_Job]] = {
+            lane: asyncio.Queue(maxsize=max(1, max_queue)) for lane in lanes.LANES
+        }
+        self._workers: list[asyncio.Task[None]] = []
+        self._inflight: dict[tuple[str, int], int] = {}  # (lane, user) -> running jobs
+        self._accepting = False
+        self.sessions = MemorySessionStore()
+        self.cancels = MemoryCancelStore()
+        self.results = MemoryResultStore()
+        self.limiter = get_limiter()
+        self.service = admission.MemoryServiceTimes()
+
+    def start(self) -> None:
+        self._accepting = True
+        self._workers = [
+            asyncio.create_task(self._worker(lane), name=f"claude-{lane}-worker-{i}")
+            for lane in lanes.LANES
+            for i in range(self._concurrency[lane])
+        ]
+        logger.info(
+            "inprocess_executor started concurrency=%d bulk_concurrency=%d",
+            self._concurrency[lanes.FAST],
+            self._concurrency[lanes.BULK],
+        )
+
+    def submit(
+        self,
+        chat_id: int,
+        user_id: int,
+        prompt: str,
+        use_cache: bool = True,
+        lane: str = lanes.FAST,
+    ) -> int | None:
+        """Queue a job in *lane*; return its queue position, or None if the queue is full.
+
+        Raises :class:`~app.core.admission.OverloadError` if the job would wait
+        longer than the lane's budget.
+        """
+        queue = self._queues[lane]
+        if not self._accepting or queue.full():
+            return None
+        admission.admit(lane, queue.qsize(), self._slots(lane), self.service.mean(lane))
+        ticket = self.cancels.next_ticket(chat_id)
+        queue.put_nowait(
+            (
+                chat_id,
+                user_id,
+                prompt,
+                use_cache,
+                time.monotonic(),
+                tracing.traceparent(),
+                ticket,
+                admission.deadline(lane),
+            )
+        )
+        return queue.qsize()
+
+    def wait_estimate(self, position: int, lane: str = lanes.FAST) -> float:
+        """Seconds until the job at *position* of *lane* is expected to start."""
+        return admission.estimate(position, self._slots(lane), self.service.mean(lane))
+
+    def _slots(self, lane: str) -> int:
+        return admission.local_slots(lane, self._concurrency[lane])
+
+    def cancel(self, chat_id: int) -> int:
+        """Drop *chat_id*'s queued jobs and kill its running ones; return processes killed."""
+        return cancel.cancel_chat(chat_id, self.cancels)
+
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    async def drain(self, timeout: float) -> None:
+        """Stop accepting jobs, finish queued and running ones, then stop the workers."""
+        self._accepting = False
+        joined = asyncio.gather(*(queue.join() for queue in self._queues.values()))
+        try:
+            await asyncio.wait_for(joined, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "inprocess_executor drain timed out, %d jobs dropped", self.queue_depth()
+            )
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _worker(self, lane: str) -> None:
+        queue = self._queues[lane]
+        while True:
+            job = await queue.get()
+            chat_id, user_id, prompt, use_cache, enqueued_at, parent, ticket, deadline = job
+            key = (lane, user_id)
+            try:
+                if cancel.should_skip(chat_id, ticket, self.cancels):
+                    continue
+                if admission.expired(deadline, lane):
+                    await send_message(chat_id, admission.EXPIRED_TEXT)
+                    continue
+                at_cap = self._inflight.get(key, 0) >= settings.claude_concurrency_per_user
+                if at_cap or (self.limiter is not None and not self.limiter.try_acquire()):
+                    # Back of the queue so other users go first.
+                    # The slot we just took is still free, so this cannot overflow.
+                    queue.put_nowait(job)
+                    await asyncio.sleep(_REQUEUE_DELAY_SEC)
+                    continue
+                metrics.QUEUE_WAIT_SECONDS.labels("inprocess").observe(
+                    time.monotonic() - enqueued_at
+                )
+                self._inflight[key] = self._inflight.get(key, 0) + 1
+                start = time.monotonic()
+                try:
+                    with (
+                        tracing.attach(parent),
+                        tracing.span("job", executor="inprocess", lane=lane),
+                        cancel.job(chat_id, ticket, self.cancels),
+                        lanes.use(lane),
+                        workspaces.use(chat_id),
+                    ):
+                        await self._execute(chat_id, user_id, prompt, use_cache)
+                finally:
+                    self._inflight[key] -= 1
+                    if not self._inflight[key]:
+                        del self._inflight[key]
+                    if self.limiter is not None:
+                        self.limiter.release()
+                    self.service.record(lane, time.monotonic() - start)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("inprocess_job_error user_id=%s", user_id)
+            finally:
+                queue.task_done()
+
+    async def _execute(self, chat_id: int, user_id: int, prompt: str, use_cache: bool) -> None:
+        logger.info("inprocess_task user_id=%s prompt_len=%d", user_id, len(prompt))
+        resume, on_session = None, None
+        if settings.claude_sessions:
+            resume, on_session = self.sessions.get(chat_id), partial(self.sessions.set, chat_id)
+
+        cache_key = None
+        if use_cache and resume is None:
+            cache_key, cached = await asyncio.to_thread(response_cache.lookup, prompt, user_id)
+            if cached is not None:
+                logger.info("cache_hit user_id=%s output_len=%d", user_id, len(cached))
+                await deliver(chat_id, cached)
+                return
+
+        stream = StreamingMessage(chat_id) if settings.claude_stream_output else None
+
+        async def _on_text(text: str) -> None:
+            # Only hop to a thread when the sink will actually send an edit
+            if stream is not None and stream.due():
+                await asyncio.to_thread(stream.update, text)
+
+        try:
+            output = await run_claude_async(
+                prompt, resume, _on_text if stream is not None else None, on_session
+            )
+        except RuntimeError as exc:
+            error_msg = str(exc)
+            if "cancelled" in error_msg:
+                logger.info("cancelled user_id=%s", user_id)
+            elif "timed out" in error_msg:
+                await send_message(chat_id, "Timed out. Try a shorter question or retry later.")
+            elif "not found" in error_msg:
+                await send_message(chat_id, "Claude Code binary not found. Contact the admin.")
+            else:
+                await send_message(chat_id, f"Error: {error_msg}")
+            return
+
+        await asyncio.to_thread(response_cache.store, cache_key, output)
+        result = self.results.save(chat_id, uuid.uuid4().hex, output)
+        # Part-by-part delivery with retries and backoff runs on the sync client
+        delivered = await asyncio.to_thread(deliver_saved, chat_id, result, self.results, stream)
+        logger.info("done user_id=%s output_len=%d delivered=%s", user_id, len(output), delivered)
@@ -0,0 +1,106 @@
+"""Bounded-memory capture of a Claude process's stdout and stderr.
+
+``subprocess.run(capture_output=True)`` keeps everything a process prints
+in memory, so a runaway run printing hundreds of MB can take the worker
+down with it. Here stdout is read incrementally into a spooled file (in
+memory up to ``claude_capture_spool_bytes``, then on disk), or parsed
+line by line and discarded in streaming mode; once it passes
+``claude_max_output_bytes`` the caller kills the process. Only the last
+``claude_stderr_tail_bytes`` of stderr are kept.
+"""
+
+from __future__ import annotations
+
+import logging
+import tempfile
+from collections.abc import Iterator
+from typing import IO
+
+from app.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+_READ_BYTES = 64 * 1024
+
+
+class Capture:
+    """Byte counts, a capped copy of stdout and the tail of stderr for one run."""
+
+    def __init__(self, keep_stdout: bool = True) -> None:
+        self.max_bytes = settings.claude_max_output_bytes
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        self.overflow = False
+        self._stdout: IO[bytes] | None = None
+        if keep_stdout:
+            self._stdout = tempfile.SpooledTemporaryFile(
+                max_size=settings.claude_capture_spool_bytes
+            )
+        self._tail = bytearray()
+        self._tail_bytes = settings.claude_stderr_tail_bytes
+
+    def __enter__(self) -> Capture:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def add_stdout(self, data: bytes) -> bool:
+        """Record *data*; False once the output cap is exceeded (stop reading)."""
+        self.stdout_bytes += len(data)
+        if self.max_bytes and self.stdout_bytes > self.max_bytes:
+            self.overflow = True
+            return False
+        if self._stdout is not None:
+            self._stdout.write(data)
+        return True
+
+    def add_stderr(self, data: bytes) -> None:
+        self.stderr_bytes += len(data)
+        self._tail += data
+        if len(self._tail) > self._tail_bytes:
+            del self._tail[: len(self._tail) - self._tail_bytes]
+
+    def read_stdout(self, pipe: IO[bytes]) -> None:
+        """Copy *pipe* until EOF or the cap."""
+        while chunk := pipe.read(_READ_BYTES):
+            if not self.add_stdout(chunk):
+                return
+
+    def lines(self, pipe: IO[bytes]) -> Iterator[str]:
+        """Yield decoded lines from *pipe* until EOF or the cap."""
+        # A line longer than the cap is read only up to the cap
+        limit = self.max_bytes + 1 if self.max_bytes else -1
+        while raw := pipe.readline(limit):
+            if not self.add_stdout(raw):
+                return
+            yield raw.decode("utf-8", errors="replace")
+
+    def drain_stderr(self, pipe: IO[bytes]) -> None:
+        """Read *pipe* until EOF, keeping only the tail."""
+        while chunk := pipe.read(_READ_BYTES):
+            self.add_stderr(chunk)
+
+    def stdout_text(self) -> str:
+        if self._stdout is None:
+            return ""
+        self._stdout.seek(0)
+        return self._stdout.read().decode("utf-8", errors="replace")
+
+    def stderr_tail(self) -> str:
+        return self._tail.decode("utf-8", errors="replace").strip()
+
+    def report(self) -> None:
+        """Log and record how much the process printed."""
+        metrics.CLAUDE_OUTPUT_BYTES.observe(self.stdout_bytes)
+        logger.info(
+            "claude_output stdout_bytes=%d stderr_bytes=%d overflow=%s",
+            self.stdout_bytes,
+            self.stderr_bytes,
+            self.overflow,
+        )
+
+    def close(self) -> None:
+        if self._stdout is not None:
+            self._stdout.close()
@@ -2,23 +2,33 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import platform
 import subprocess
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import IO, Any, TypeVar
 
 from app.config import settings
+from app.core import cancel, lanes, metrics, tracing, workspaces
+from app.worker.capture import Capture
 
 logger = logging.getLogger(__name__)
 
 _IS_WINDOWS = platform.system() == "Windows"
 
+T = TypeVar("T")
 
-def run_claude(prompt: str) -> str:
-    """Execute Claude Code CLI with the given prompt and return stdout.
 
-    Raises RuntimeError on failure or timeout.
-    """
-    cmd = [settings.claude_bin, "-p"]
+def _build_cmd(prompt: str, *extra: str) -> list[str]:
+    return [*base_cmd(*extra), prompt]
+
+
+def base_cmd(*extra: str) -> list[str]:
+    """The ``claude -p`` command line with configured flags, without a prompt."""
+    cmd = [settings.claude_bin, "-p", *extra]
 
     if settings.claude_model:
         cmd.extend(["--model", settings.claude_model])
@@ -26,32 +36,294 @@ def run_claude(prompt: str) -> str:
         cmd.extend(["--permission-mode", settings.claude_permission_mode])
     if settings.claude_max_budget_usd:
         cmd.extend(["--max-budget-usd", settings.claude_max_budget_usd])
+    return cmd
+
+
+def _is_missing_session(exc: RuntimeError) -> bool:
+    return "no conversation found" in str(exc).lower()
+
+
+def run_claude(
+    prompt: str,
+    resume: str | None = None,
+    on_session: Callable[[str], None] | None = None,
+) -> str:
+    """Execute Claude Code CLI with the given prompt and return stdout.
+
+    With *resume*, continue that Claude session (falling back to a fresh
+    one if Claude no longer knows it). With *on_session*, the run uses JSON
+    output and the callback receives the session id to resume next time.
+
+    Raises RuntimeError on failure or timeout.
+    """
+    with (
+        metrics.track_claude(settings.claude_executor),
+        tracing.span("claude", executor=settings.claude_executor),
+    ):
+        # Warm processes run in the worker's directory, not in a chat's workspace
+        if settings.claude_executor == "pool" and not resume and not workspaces.active():
+            output = _run_pooled(prompt, None, on_session)
+            if output is not None:
+                return output
+        with workspaces.checkout():
+            try:
+                return _run_claude(prompt, resume, on_session)
+            except RuntimeError as exc:
+                if resume and _is_missing_session(exc):
+                    logger.info("claude_session_missing session=%s, starting fresh", resume)
+                    return _run_claude(prompt, None, on_session)
+                raise
 
-    cmd.append(prompt)
-    logger.info("claude_exec prompt_len=%d timeout=%d", len(prompt), settings.claude_timeout_sec)
+
+def _run_pooled(
+    prompt: str,
+    on_text: Callable[[str], None] | None,
+    on_session: Callable[[str], None] | None,
+) -> str | None:
+    """Run on a warm pooled process; None means no process was free (run one-shot)."""
+    from app.worker.claude_pool import PoolUnavailableError, get_pool
 
     try:
-        result = subprocess.run(
+        return get_pool().run(prompt, on_text, on_session)
+    except PoolUnavailableError as exc:
+        logger.info("claude_pool_unavailable reason=%s, running one-shot", exc)
+        return None
+
+
+def _session_args(resume: str | None, *extra: str) -> list[str]:
+    args = list(extra)
+    if resume:
+        args.extend(["--resume", resume])
+    return args
+
+
+def _run_claude(prompt: str, resume: str | None, on_session: Callable[[str], None] | None) -> str:
+    extra = ["--output-format", "json"] if on_session is not None else []
+    cmd = _build_cmd(prompt, *_session_args(resume, *extra))
+    logger.info("claude_exec prompt_len=%d timeout=%d", len(prompt), lanes.timeout_sec())
+
+    with Capture() as capture:
+        _communicate(_spawn(cmd), capture, capture.read_stdout)
+        stdout = capture.stdout_text()
+
+    if on_session is None:
+        return stdout.strip()
+
+    event = _parse_event(stdout)
+    if event is None:
+        return stdout.strip()
+    if event.get("session_id"):
+        on_session(str(event["session_id"]))
+    if event.get("is_error"):
+        raise RuntimeError(f"claude reported an error: {str(event.get('result', ''))[:500]}")
+    return str(event.get("result", "")).strip()
+
+
+def _spawn(cmd: list[str]) -> subprocess.Popen[bytes]:
+    try:
+        proc = subprocess.Popen(
             cmd,
-            capture_output=True,
-            text=True,
-            timeout=settings.claude_timeout_sec,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             shell=_IS_WINDOWS,  # Windows needs shell=True for .cmd wrappers
-            encoding="utf-8",
-            errors="replace",
+            env=tracing.child_env(),
+            cwd=workspaces.cwd(),
+            start_new_session=not _IS_WINDOWS,  # own process group, so cancel kills its tools
         )
-    except subprocess.TimeoutExpired:
-        raise RuntimeError(f"claude timed out after {settings.claude_timeout_sec}s")
     except FileNotFoundError:
-        raise RuntimeError(f"claude binary not found: {settings.claude_bin}")
+        raise RuntimeError(f"claude binary not found: {settings.claude_bin}") from None
+    return proc
+
+
+def _communicate(
+    proc: subprocess.Popen[bytes], capture: Capture, consume: Callable[[IO[bytes]], T]
+) -> T:
+    """Run *consume* on the process's stdout while stderr drains into *capture*.
+
+    The process is killed on timeout, on ``/cancel``, or once *consume*
+    stops early because the output cap was exceeded. Raises RuntimeError
+    for any of these, and for a non-zero exit.
+    """
+    stdout, stderr_pipe = proc.stdout, proc.stderr
+    if stdout is None or stderr_pipe is None:
+        proc.kill()
+        raise RuntimeError("claude output pipes unavailable")
+    timed_out = threading.Event()
+
+    def _kill() -> None:
+        timed_out.set()
+        cancel.kill_group(proc)
+
+    timer = threading.Timer(lanes.timeout_sec(), _kill)
+    timer.daemon = True
+    timer.start()
+
+    # Drain stderr concurrently so a chatty process cannot block on a full pipe
+    stderr_thread = threading.Thread(target=capture.drain_stderr, args=(stderr_pipe,), daemon=True)
+    stderr_thread.start()
+
+    try:
+        with cancel.track(proc) as handle:
+            result = consume(stdout)
+            if capture.overflow:
+                cancel.kill_group(proc)
+            proc.wait()
+    finally:
+        timer.cancel()
+        stderr_thread.join(timeout=5)
+        stdout.close()
+        stderr_pipe.close()
+    capture.report()
+
+    if handle.cancelled.is_set():
+        raise RuntimeError("claude run cancelled")
+    if timed_out.is_set():
+        raise RuntimeError(f"claude timed out after {lanes.timeout_sec()}s")
+    if capture.overflow:
+        raise RuntimeError(f"claude output exceeded {capture.max_bytes} bytes, run stopped")
+    if proc.returncode != 0:
+        stderr = capture.stderr_tail()[-500:] or "(no stderr)"
+        raise RuntimeError(f"claude exited with code {proc.returncode}: {stderr}")
+    return result
+
+
+def _parse_event(line: str) -> dict[str, Any] | None:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        logger.debug("claude_stream non-json line: %.200s", line)
+        return None
+    return event if isinstance(event, dict) else None
+
+
+def stream_claude(
+    prompt: str,
+    on_text: Callable[[str], None],
+    resume: str | None = None,
+    on_session: Callable[[str], None] | None = None,
+) -> str:
+    """Execute Claude Code with ``--output-format stream-json``.
+
+    *on_text* is called with the accumulated answer text every time it grows.
+    *resume* and *on_session* work as in :func:`run_claude`.
+    Returns the final output, like :func:`run_claude`.
+
+    Raises RuntimeError on failure or timeout.
+    """
+    with (
+        metrics.track_claude(settings.claude_executor),
+        tracing.span("claude", executor=settings.claude_executor),
+    ):
+        if settings.claude_executor == "pool" and not resume and not workspaces.active():
+            output = _run_pooled(prompt, on_text, on_session)
+            if output is not None:
+                return output
+        with workspaces.checkout():
+            try:
+                return _stream_claude(prompt, on_text, resume, on_session)
+            except RuntimeError as exc:
+                if resume and _is_missing_session(exc):
+                    logger.info("claude_session_missing session=%s, starting fresh", resume)
+                    return _stream_claude(prompt, on_text, None, on_session)
+                raise
+
+
+def _stream_claude(
+    prompt: str,
+    on_text: Callable[[str], None],
+    resume: str | None,
+    on_session: Callable[[str], None] | None,
+) -> str:
+    cmd = _build_cmd(
+        prompt,
+        *_session_args(
+            resume, "--output-format", "stream-json", "--verbose", "--include-partial-messages"
+        ),
+    )
+    logger.info("claude_stream prompt_len=%d timeout=%d", len(prompt), lanes.timeout_sec())
+
+    def _consume(stdout: IO[bytes]) -> StreamResult:
+        lines = capture.lines(stdout)
+        result = read_stream_events(lines, on_text, on_session)
+        for _ in lines:  # drain anything after the result event
+            pass
+        return result
+
+    with Capture(keep_stdout=False) as capture:
+        stream_result = _communicate(_spawn(cmd), capture, _consume)
+    return stream_result.output()
+
+
+class StreamResult:
+    """Incremental state of one Claude turn read from stream-json output."""
+
+    def __init__(self, on_session: Callable[[str], None] | None = None) -> None:
+        self.text = ""
+        self.session_id: str | None = None
+        self.result: str | None = None
+        self.is_error = False
+        self.finished = False
+        self._on_session = on_session
+        self._saw_delta = False
+        self._started = time.monotonic()
+
+    def feed(self, line: str) -> bool:
+        """Apply one stream-json line; return True if the answer text grew."""
+        event = _parse_event(line)
+        if event is None:
+            return False
+        if self.session_id is None and event.get("session_id"):
+            self.session_id = str(event["session_id"])
+            if self._on_session is not None:
+                self._on_session(self.session_id)
+        kind = event.get("type")
+        added = ""
+        if kind == "stream_event":
+            inner = event.get("event") or {}
+            delta = inner.get("delta") or {}
+            if inner.get("type") == "content_block_delta" and delta.get("type") == "text_delta":
+                self._saw_delta = True
+                added = delta.get("text", "")
+        elif kind == "assistant" and not self._saw_delta:
+            for block in (event.get("message") or {}).get("content") or []:
+                if block.get("type") == "text":
+                    added += block.get("text", "")
+        elif kind == "result":
+            self.result = event.get("result")
+            self.is_error = bool(event.get("is_error"))
+            self.finished = True
+        if added and not self.text:
+            metrics.CLAUDE_FIRST_TEXT_SECONDS.observe(time.monotonic() - self._started)
+        self.text += added
+        return bool(added)
+
+    def partial(self) -> str:
+        """The answer so far, capped at ``claude_max_output_chars`` for live previews."""
+        return self.text[: settings.claude_max_output_chars]
 
-    if result.returncode != 0:
-        stderr = result.stderr.strip()[:500] if result.stderr else "(no stderr)"
-        raise RuntimeError(f"claude exited with code {result.returncode}: {stderr}")
+    def output(self) -> str:
+        """Return the final answer; raise RuntimeError if Claude reported an error."""
+        if self.is_error:
+            raise RuntimeError(f"claude reported an error: {(self.result or '').strip()[:500]}")
+        return (self.result if self.result is not None else self.text).strip()
 
-    output = result.stdout.strip()
-    max_chars = settings.claude_max_output_chars
-    if len(output) > max_chars:
-        output = output[:max_chars] + "\n\n... (output truncated)"
 
-    return output
+def read_stream_events(
+    lines: Iterable[str],
+    on_text: Callable[[str], None] | None = None,
+    on_session: Callable[[str], None] | None = None,
+) -> StreamResult:
+    """Consume stream-json lines until the turn's ``result`` event (or EOF)."""
+    state = StreamResult(on_session)
+    for line in lines:
+        if state.feed(line) and on_text is not None:
+            try:
+                on_text(state.partial())
+            except Exception:
+                logger.exception("claude_stream on_text callback failed")
+        if state.finished:
+            break
+    return state
@@ -0,0 +1,253 @@
+"""Warm pool of pre-spawned Claude Code processes.
+
+Each pooled process is started ahead of time with ``--input-format
+stream-json``, so Node startup and CLI initialisation are paid before a
+prompt arrives. A prompt is written to an idle process's stdin and its
+answer read from the stream-json output.
+
+A process keeps the conversation of every prompt it served, so by default
+it is recycled after a single job (``claude_pool_max_jobs=1``); raise it
+only for single-user deployments. Processes are also recycled when their
+RSS grows past ``claude_pool_max_rss_mb``, and killed with the tools they
+started when a run times out, is cancelled or prints more than
+``claude_max_output_bytes``. Prompts that resume an existing
+session cannot use a pre-spawned process and run one-shot instead.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import subprocess
+import threading
+from collections import deque
+from collections.abc import Callable
+
+from app.config import settings
+from app.core import cancel, lanes
+from app.worker.capture import Capture
+from app.worker.claude_exec import _IS_WINDOWS, base_cmd, read_stream_events
+
+logger = logging.getLogger(__name__)
+
+_POOL_ARGS = (
+    "--input-format",
+    "stream-json",
+    "--output-format",
+    "stream-json",
+    "--verbose",
+    "--include-partial-messages",
+)
+
+
+class PoolUnavailableError(Exception):
+    """No warm process could take the prompt; the caller should run one-shot."""
+
+
+class _WarmProcess:
+    def __init__(self) -> None:
+        self.proc = subprocess.Popen(
+            base_cmd(*_POOL_ARGS),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            shell=_IS_WINDOWS,  # Windows needs shell=True for .cmd wrappers
+            start_new_session=not _IS_WINDOWS,  # own process group, so cancel kills its tools
+        )
+        self.jobs = 0
+        self.stderr_tail: deque[str] = deque(maxlen=20)
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+    def _drain_stderr(self) -> None:
+        if self.proc.stderr is None:
+            return
+        for line in self.proc.stderr:
+            self.stderr_tail.append(line.decode("utf-8", errors="replace"))
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def rss_mb(self) -> float | None:
+        try:
+            with open(f"/proc/{self.proc.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def send(self, prompt: str, last: bool) -> None:
+        if self.proc.stdin is None:
+            raise OSError("stdin closed")
+        message = {"type": "user", "message": {"role": "user", "content": prompt}}
+        self.proc.stdin.write(json.dumps(message).encode() + b"\n")
+        self.proc.stdin.flush()
+        if last:
+            # Let the process exit on its own after answering
+            self.proc.stdin.close()
+
+    def stop(self) -> None:
+        if self.proc.stdin is not None and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            cancel.kill_group(self.proc)
+            self.proc.wait()
+
+
+class ClaudePool:
+    """Fixed-size pool of warm Claude processes with health checks and recycling."""
+
+    def __init__(self, size: int, max_jobs: int, max_rss_mb: float) -> None:
+        self._size = max(1, size)
+        self._max_jobs = max(1, max_jobs)
+        self._max_rss_mb = max_rss_mb
+        self._idle: queue.SimpleQueue[_WarmProcess] = queue.SimpleQueue()
+        self._closed = False
+
+    def start(self) -> None:
+        for _ in range(self._size):
+            self._spawn()
+        logger.info("claude_pool started size=%d max_jobs=%d", self._size, self._max_jobs)
+
+    def _spawn(self) -> None:
+        if self._closed:
+            return
+        try:
+            self._idle.put(_WarmProcess())
+        except OSError:
+            logger.exception("claude_pool spawn failed")
+
+    def _retire(self, warm: _WarmProcess) -> None:
+        # Spawn the replacement first so a warm process is ready as soon as possible
+        self._spawn()
+        threading.Thread(target=warm.stop, daemon=True).start()
+
+    def _acquire(self) -> _WarmProcess:
+        while True:
+            try:
+                warm = self._idle.get_nowait()
+            except queue.Empty:
+                raise PoolUnavailableError("no idle claude process") from None
+            if warm.alive():
+                return warm
+            logger.warning(
+                "claude_pool process exited while idle code=%s stderr=%s",
+                warm.proc.returncode,
+                "".join(warm.stderr_tail).strip()[-200:],
+            )
+            self._retire(warm)
+
+    def _release(self, warm: _WarmProcess) -> None:
+        warm.jobs += 1
+        rss = warm.rss_mb()
+        if warm.jobs >= self._max_jobs or not warm.alive():
+            self._retire(warm)
+        elif rss is not None and rss > self._max_rss_mb:
+            logger.info("claude_pool recycling pid=%d rss_mb=%.0f", warm.proc.pid, rss)
+            self._retire(warm)
+        else:
+            self._idle.put(warm)
+
+    def run(
+        self,
+        prompt: str,
+        on_text: Callable[[str], None] | None = None,
+        on_session: Callable[[str], None] | None = None,
+    ) -> str:
+        """Answer *prompt* on a warm process.
+
+        Raises PoolUnavailableError if no process could accept the prompt, and
+        RuntimeError on failure or timeout once the prompt was sent.
+        """
+        warm = self._acquire()
+        stdout = warm.proc.stdout
+        if stdout is None:
+            self._retire(warm)
+            raise PoolUnavailableError("claude process has no stdout")
+        try:
+            warm.send(prompt, last=warm.jobs + 1 >= self._max_jobs)
+        except (OSError, ValueError):
+            self._retire(warm)
+            raise PoolUnavailableError("claude process rejected the prompt") from None
+
+        timed_out = threading.Event()
+
+        def _kill() -> None:
+            timed_out.set()
+            cancel.kill_group(warm.proc)
+
+        timer = threading.Timer(lanes.timeout_sec(), _kill)
+        timer.daemon = True
+        timer.start()
+        logger.info("claude_pool prompt_len=%d pid=%d", len(prompt), warm.proc.pid)
+        # Output is counted per prompt, so one run cannot exhaust the worker's memory
+        capture = Capture(keep_stdout=False)
+        try:
+            with cancel.track(warm.proc) as handle:
+                result = read_stream_events(capture.lines(stdout), on_text, on_session)
+                if capture.overflow:
+                    cancel.kill_group(warm.proc)
+        finally:
+            timer.cancel()
+        capture.report()
+
+        if handle.cancelled.is_set():
+            self._retire(warm)
+            raise RuntimeError("claude run cancelled")
+        if timed_out.is_set():
+            self._retire(warm)
+            raise RuntimeError(f"claude timed out after {lanes.timeout_sec()}s")
+        if capture.overflow:
+            self._retire(warm)
+            raise RuntimeError(f"claude output exceeded {capture.max_bytes} bytes, run stopped")
+        if not result.finished:
+            code = warm.proc.wait()
+            stderr = "".join(warm.stderr_tail).strip()[-500:] or "(no stderr)"
+            self._retire(warm)
+            raise RuntimeError(f"claude exited with code {code}: {stderr}")
+
+        self._release(warm)
+        return result.output()
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_pool: ClaudePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ClaudePool:
+    """Return the process-wide pool, starting it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ClaudePool(
+                    size=settings.claude_pool_size or settings.claude_global_concurrency,
+                    max_jobs=settings.claude_pool_max_jobs,
+                    max_rss_mb=settings.claude_pool_max_rss_mb,
+                )
+                pool.start()
+                _pool = pool
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -3,21 +3,213 @@
 from __future__ import annotations
 
 import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
 
-from app.bot.telegram_client import send_message_sync
-from app.worker.claude_exec import run_claude
+from rq import Queue, Retry, get_current_job
+from rq.job import Job
+
+from app.bot.telegram_client import (
+    StreamingMessage,
+    deliver_saved,
+    deliver_sync,
+    send_message_sync,
+)
+from app.config import settings
+from app.core import admission, cancel, lanes, metrics, tracing, workspaces
+from app.core import cache as response_cache
+from app.core.cancel import RedisCancelStore
+from app.core.limiter import host_pressure
+from app.core.results import RedisResultStore, Result
+from app.core.scheduler import RedisSemaphore
+from app.core.sessions import RedisSessionStore
+from app.worker.claude_exec import run_claude, stream_claude
 
 logger = logging.getLogger(__name__)
 
+# Delay before re-trying a job whose user is at their cap (or whose host is overloaded)
+_REQUEUE_DELAY_SEC = 2
+
+
+class DeliveryError(Exception):
+    """Telegram did not take the whole answer; RQ retries the job, reusing the saved answer."""
+
+
+def retry_policy() -> Retry | None:
+    """RQ retries for a job whose delivery failed, or whose worker died."""
+    if settings.delivery_job_retries <= 0:
+        return None
+    return Retry(
+        max=settings.delivery_job_retries,
+        interval=[60 * 2**i for i in range(settings.delivery_job_retries)],
+    )
+
+
+def execute_claude_task(chat_id: int, user_id: int, prompt: str, use_cache: bool = True) -> None:
+    """Run Claude Code and send the result back via Telegram.
+
+    Enforces ``claude_concurrency_per_user`` and the bulk lane's
+    ``lane_bulk_concurrency`` across workers: if either is exhausted, the
+    job goes back to the end of its queue so other jobs are served first.
+    A job cancelled or superseded while queued is dropped (see
+    :mod:`app.core.cancel`), as is one still queued past its deadline (see
+    :mod:`app.core.admission`). The answer is saved before it is sent; if
+    sending fails, :class:`DeliveryError` makes RQ retry the job, which then
+    only re-sends the saved answer (see :mod:`app.core.results`).
+    """
+    job = get_current_job()
+    if job is None:
+        _run_task(chat_id, user_id, prompt, None, use_cache, None, uuid.uuid4().hex)
+        return
+    with tracing.attach(job.meta.get("traceparent")), tracing.span("job", executor="rq"):
+        _run_job(job, chat_id, user_id, prompt, use_cache)
+
 
-def execute_claude_task(chat_id: int, user_id: int, prompt: str) -> None:
-    """Run Claude Code and send the result back via Telegram."""
+def _run_job(job: Job, chat_id: int, user_id: int, prompt: str, use_cache: bool) -> None:
+    if job.enqueued_at is not None:
+        # RQ stores enqueued_at as naive UTC
+        waited = datetime.utcnow() - job.enqueued_at
+        metrics.QUEUE_WAIT_SECONDS.labels("rq").observe(waited.total_seconds())
+    cancels = RedisCancelStore(job.connection)
+    ticket = job.meta.get("ticket")
+    if cancel.should_skip(chat_id, ticket, cancels):
+        return
+    results = RedisResultStore(job.connection)
+    saved = _saved_result(results, job.id)
+    if saved is not None:
+        logger.info("redeliver chat_id=%s job_id=%s acked=%d", chat_id, job.id, saved.acked)
+        if not saved.done and not deliver_saved(chat_id, saved, results):
+            raise DeliveryError(f"answer for chat {chat_id} not delivered")
+        return
+    lane = job.meta.get("lane", lanes.FAST)
+    if admission.expired(job.meta.get("deadline"), lane):
+        send_message_sync(chat_id, admission.EXPIRED_TEXT)
+        return
+    # One job per worker process, so the adaptive limit here is the host's headroom
+    pressure = host_pressure() if settings.concurrency_adaptive else None
+    if pressure is not None:
+        logger.info(
+            "host_pressure reason=%s user_id=%s requeue_in=%ds",
+            pressure,
+            user_id,
+            _REQUEUE_DELAY_SEC,
+        )
+        _requeue(job, chat_id, user_id, prompt, use_cache)
+        return
+    sessions = RedisSessionStore(job.connection) if settings.claude_sessions else None
+
+    # Slots the job needs: one of the user's, and one of its lane's budget (bulk only)
+    slots: list[tuple[str | int, int]] = [(user_id, settings.claude_concurrency_per_user)]
+    if lane != lanes.FAST:
+        slots.append((f"lane:{lane}", lanes.concurrency(lane)))
+    try:
+        sem = RedisSemaphore(job.connection)
+        held = _acquire_slots(sem, job.id, slots, lease=lanes.timeout_sec(lane) + 60)
+    except Exception:
+        logger.exception("semaphore_error user_id=%s", user_id)
+        with cancel.job(chat_id, ticket, cancels), lanes.use(lane), workspaces.use(chat_id):
+            _run_task(chat_id, user_id, prompt, sessions, use_cache, results, job.id)
+        return
+
+    if held is None:
+        logger.info("at_cap user_id=%s lane=%s requeue_in=%ds", user_id, lane, _REQUEUE_DELAY_SEC)
+        _requeue(job, chat_id, user_id, prompt, use_cache)
+        return
+
+    start = time.monotonic()
+    try:
+        with cancel.job(chat_id, ticket, cancels), lanes.use(lane), workspaces.use(chat_id):
+            _run_task(chat_id, user_id, prompt, sessions, use_cache, results, job.id)
+    finally:
+        for name in held:
+            sem.release(name, job.id)
+        # Read by the API to estimate queue waits
+        admission.RedisServiceTimes(job.connection).record(lane, time.monotonic() - start)
+
+
+def _requeue(job: Job, chat_id: int, user_id: int, prompt: str, use_cache: bool) -> None:
+    """Put *job* back at the end of its queue after ``_REQUEUE_DELAY_SEC``."""
+    Queue(job.origin, connection=job.connection).enqueue_in(
+        timedelta(seconds=_REQUEUE_DELAY_SEC),
+        "app.worker.jobs.execute_claude_task",
+        chat_id,
+        user_id,
+        prompt,
+        use_cache,
+        meta=job.meta,
+        job_timeout=job.timeout,
+        retry=retry_policy(),
+    )
+
+
+def _acquire_slots(
+    sem: RedisSemaphore, holder: str, slots: list[tuple[str | int, int]], lease: float
+) -> list[str | int] | None:
+    """Take a slot of every ``(name, limit)`` in *slots*, or none of them (None)."""
+    held: list[str | int] = []
+    for name, limit in slots:
+        if not sem.acquire(name, holder, limit, lease=lease):
+            for taken in held:
+                sem.release(taken, holder)
+            return None
+        held.append(name)
+    return held
+
+
+def _saved_result(results: RedisResultStore, job_id: str) -> Result | None:
+    try:
+        return results.get(job_id)
+    except Exception:
+        logger.exception("result_lookup_error job_id=%s", job_id)
+        return None
+
+
+def _save_session(sessions: RedisSessionStore, chat_id: int, session_id: str) -> None:
+    try:
+        sessions.set(chat_id, session_id)
+    except Exception:
+        logger.exception("session_save_error chat_id=%s", chat_id)
+
+
+def _run_task(
+    chat_id: int,
+    user_id: int,
+    prompt: str,
+    sessions: RedisSessionStore | None,
+    use_cache: bool,
+    results: RedisResultStore | None,
+    job_id: str,
+) -> None:
     logger.info("execute_claude_task user_id=%s prompt_len=%d", user_id, len(prompt))
+    resume, on_session = None, None
+    if sessions is not None:
+        try:
+            resume = sessions.get(chat_id)
+        except Exception:
+            logger.exception("session_lookup_error chat_id=%s", chat_id)
+        on_session = partial(_save_session, sessions, chat_id)
+
+    cache_key = None
+    if use_cache and resume is None:
+        cache_key, cached = response_cache.lookup(prompt, user_id)
+        if cached is not None:
+            logger.info("cache_hit user_id=%s output_len=%d", user_id, len(cached))
+            deliver_sync(chat_id, cached)
+            return
+
+    stream = StreamingMessage(chat_id) if settings.claude_stream_output else None
     try:
-        output = run_claude(prompt)
+        if stream is not None:
+            output = stream_claude(prompt, stream.update, resume, on_session)
+        else:
+            output = run_claude(prompt, resume, on_session)
     except RuntimeError as exc:
         error_msg = str(exc)
-        if "timed out" in error_msg:
+        if "cancelled" in error_msg:
+            logger.info("cancelled user_id=%s", user_id)
+        elif "timed out" in error_msg:
             send_message_sync(chat_id, "Timed out. Try a shorter question or retry later.")
         elif "not found" in error_msg:
             send_message_sync(chat_id, "Claude Code binary not found. Contact the admin.")
@@ -29,5 +221,18 @@ def execute_claude_task(chat_id: int, user_id: int, prompt: str) -> None:
         send_message_sync(chat_id, "System error. Please retry later.")
         return
 
-    send_message_sync(chat_id, output)
-    logger.info("done user_id=%s output_len=%d", user_id, len(output))
+    response_cache.store(cache_key, output)
+    result = Result(job_id, output)
+    if results is not None:
+        try:
+            result = results.save(chat_id, job_id, output)
+        except Exception:
+            logger.exception("result_save_error chat_id=%s", chat_id)
+            results = None
+    if results is None:
+        delivered = stream.finish(output) if stream is not None else deliver_sync(chat_id, output)
+    else:
+        delivered = deliver_saved(chat_id, result, results, stream)
+    logger.info("done user_id=%s output_len=%d delivered=%s", user_id, len(output), delivered)
+    if not delivered and results is not None:
+        raise DeliveryError(f"answer for chat {chat_id} not delivered")
@@ -2,12 +2,14 @@
 
 from __future__ import annotations
 
+import atexit
 import logging
 
 from redis import Redis
-from rq import Worker
+from rq import SimpleWorker, Worker
 
 from app.config import settings
+from app.core import lanes, metrics
 
 logging.basicConfig(
     level=getattr(logging, settings.log_level.upper(), logging.INFO),
@@ -16,9 +18,22 @@ logging.basicConfig(
 
 
 def main() -> None:
+    metrics.start_server()
     conn = Redis.from_url(settings.redis_url)
-    worker = Worker([settings.queue_name], connection=conn)
-    worker.work()
+    # Warm Claude processes only survive between jobs without the per-job fork
+    worker_class = Worker
+    if settings.claude_executor == "pool":
+        worker_class = SimpleWorker
+        # Spawn them now, so the first job does not pay the CLI cold start
+        from app.worker.claude_pool import close_pool, get_pool
+
+        get_pool()
+        atexit.register(close_pool)
+    # Queues are listed in priority order: a free worker always takes fast-lane jobs first
+    queues = [lanes.queue_name(lane.strip()) for lane in settings.worker_lanes.split(",")]
+    worker = worker_class(queues, connection=conn)
+    # The scheduler releases jobs deferred by the per-user concurrency cap
+    worker.work(with_scheduler=True)
 
 
 if __name__ == "__main__":
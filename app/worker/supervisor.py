@@ -0,0 +1,196 @@
+"""Worker supervisor: runs a host's RQ worker processes and reports its capacity.
+
+``python -m app.worker.supervisor`` starts ``worker_processes`` copies of
+:mod:`app.worker.runner` (by default as many as the host's CPUs and
+memory allow, ``worker_mem_mb`` each), restarts any that exit, and
+publishes a heartbeat with the host's slots and busy workers to Redis
+(see :mod:`app.core.nodes`).
+
+Placement is pull-based: every worker process takes a job from the shared
+queues only when it is idle, so a host never holds more jobs than it has
+slots and adding hosts adds capacity without any central assignment.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Any
+
+from app.config import settings
+from app.core.nodes import NodeRegistry
+
+logging.basicConfig(
+    level=getattr(logging, settings.log_level.upper(), logging.INFO),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# A worker that ran at least this long before exiting is restarted without backoff
+_STABLE_SEC = 30.0
+_MAX_BACKOFF_SEC = 60.0
+
+
+def default_processes() -> int:
+    """Worker processes this host can run: one per CPU, within ``worker_mem_mb`` each."""
+    cpus = os.cpu_count() or 1
+    try:
+        mem_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 1_000_000
+    except (AttributeError, ValueError, OSError):
+        return cpus
+    return max(1, min(cpus, mem_mb // max(1, settings.worker_mem_mb)))
+
+
+class _Slot:
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.proc: subprocess.Popen[bytes] | None = None
+        self.started = 0.0
+        self.backoff = 0.0
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    """Keeps *processes* worker processes running and beats for *node*."""
+
+    def __init__(
+        self,
+        processes: int,
+        node: str,
+        redis: Any = None,
+        command: list[str] | None = None,
+    ) -> None:
+        self.node = node
+        self.redis = redis
+        self.registry = NodeRegistry(redis) if redis is not None else None
+        self.command = command or [sys.executable, "-m", "app.worker.runner"]
+        self.slots = [_Slot(i) for i in range(processes)]
+        self.restarts = 0
+        self._stopping = False
+
+    def _env(self, slot: _Slot) -> dict[str, str]:
+        env = dict(os.environ)
+        # One Prometheus port per worker; each runs one job at a time, so one warm process
+        if settings.metrics_port > 0:
+            env["METRICS_PORT"] = str(settings.metrics_port + slot.index)
+        if not settings.claude_pool_size:
+            env["CLAUDE_POOL_SIZE"] = "1"
+        return env
+
+    def _start(self, slot: _Slot) -> None:
+        slot.proc = subprocess.Popen(self.command, env=self._env(slot))
+        slot.started = time.monotonic()
+        logger.info("worker_started node=%s slot=%d pid=%d", self.node, slot.index, slot.proc.pid)
+
+    def check(self) -> None:
+        """Start missing workers and schedule restarts of exited ones."""
+        now = time.monotonic()
+        for slot in self.slots:
+            if slot.proc is not None:
+                code = slot.proc.poll()
+                if code is None:
+                    continue
+                ran = now - slot.started
+                slot.backoff = (
+                    0.0 if ran >= _STABLE_SEC else min(_MAX_BACKOFF_SEC, max(1.0, slot.backoff * 2))
+                )
+                slot.restart_at = now + slot.backoff
+                slot.proc = None
+                self.restarts += 1
+                logger.warning(
+                    "worker_exited node=%s slot=%d code=%s ran_sec=%.0f restart_in=%.0fs",
+                    self.node,
+                    slot.index,
+                    code,
+                    ran,
+                    slot.backoff,
+                )
+            if not self._stopping and now >= slot.restart_at:
+                try:
+                    self._start(slot)
+                except OSError:
+                    logger.exception("worker_start_failed node=%s slot=%d", self.node, slot.index)
+                    slot.restart_at = now + _MAX_BACKOFF_SEC
+
+    def pids(self) -> set[int]:
+        return {slot.proc.pid for slot in self.slots if slot.proc is not None}
+
+    def busy(self) -> int:
+        """Workers of this host currently running a job (from RQ's worker registry)."""
+        if self.redis is None:
+            return 0
+        from rq import Worker
+
+        pids = self.pids()
+        workers = Worker.all(connection=self.redis)
+        return sum(1 for w in workers if w.pid in pids and w.get_state() == "busy")
+
+    def beat(self) -> None:
+        if self.registry is None:
+            return
+        try:
+            self.registry.beat(
+                self.node,
+                len(self.slots),
+                self.busy(),
+                settings.worker_heartbeat_sec,
+                alive=len(self.pids()),
+                restarts=self.restarts,
+                lanes=settings.worker_lanes,
+            )
+        except Exception:
+            logger.exception("worker_heartbeat_error node=%s", self.node)
+
+    def run(self) -> None:
+        """Supervise until SIGTERM or SIGINT, then stop the workers gracefully."""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._on_signal)
+        logger.info("supervisor_started node=%s processes=%d", self.node, len(self.slots))
+        next_beat = 0.0
+        while not self._stopping:
+            self.check()
+            if time.monotonic() >= next_beat:
+                self.beat()
+                next_beat = time.monotonic() + settings.worker_heartbeat_sec
+            time.sleep(0.5)
+        self.stop()
+
+    def _on_signal(self, signum: int, _frame: Any) -> None:
+        logger.info("supervisor_stopping node=%s signal=%d", self.node, signum)
+        self._stopping = True
+
+    def stop(self) -> None:
+        self._stopping = True
+        procs = [slot.proc for slot in self.slots if slot.proc is not None]
+        for proc in procs:
+            proc.terminate()
+        # RQ finishes the running job on SIGTERM; kill what is still running after the drain time
+        deadline = time.monotonic() + settings.shutdown_drain_sec
+        for proc in procs:
+            try:
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        if self.registry is not None:
+            try:
+                self.registry.remove(self.node)
+            except Exception:
+                logger.exception("worker_heartbeat_error node=%s", self.node)
+
+
+def main() -> None:
+    from redis import Redis
+
+    node = settings.node_name or socket.gethostname()
+    processes = settings.worker_processes or default_processes()
+    Supervisor(processes, node, Redis.from_url(settings.redis_url)).run()
+
+
+if __name__ == "__main__":
+    main()
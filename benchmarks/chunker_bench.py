@@ -0,0 +1,56 @@
+"""Micro-benchmark: the index-based chunker against the old slicing one.
+
+python -m benchmarks.chunker_bench
+"""
+
+from __future__ import annotations
+
+import timeit
+from functools import partial
+
+from app.core.chunker import chunk_text
+
+_SIZES = (10_000, 100_000, 1_000_000, 4_000_000)
+
+
+def legacy_chunk_text(text: str, limit: int = 4076) -> list[str]:
+    """The previous implementation, which re-slices the remaining text per chunk."""
+    if not text or len(text) <= limit:
+        return [text]
+    chunks: list[str] = []
+    while text:
+        if len(text) <= limit:
+            chunks.append(text)
+            break
+        cut = text.rfind("\n", limit // 2, limit)
+        if cut == -1:
+            cut = text.rfind(" ", limit // 2, limit)
+        if cut == -1:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    return chunks
+
+
+def _sample(size: int) -> str:
+    paragraph = "Some prose with words and `inline code` here.\n" * 20
+    code = "```python\n" + "def f(x):\n    return x * 2\n" * 30 + "```\n"
+    block = paragraph + code
+    return (block * (size // len(block) + 1))[:size]
+
+
+def main() -> None:
+    print(f"{'chars':>10}  {'legacy ms':>10}  {'new ms':>10}  {'chunks':>7}")
+    for size in _SIZES:
+        text = _sample(size)
+        runs = max(1, 2_000_000 // size)
+        legacy = min(timeit.repeat(partial(legacy_chunk_text, text), number=runs, repeat=3))
+        new = min(timeit.repeat(partial(chunk_text, text), number=runs, repeat=3))
+        print(
+            f"{size:>10}  {legacy / runs * 1000:>10.3f}  {new / runs * 1000:>10.3f}"
+            f"  {len(chunk_text(text)):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
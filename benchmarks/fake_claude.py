@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Stand-in for the ``claude`` CLI used by the benchmarks.
+
+Understands the flags TeleClaudeCode passes (``-p``, ``--output-format``
+text/json/stream-json, ``--input-format stream-json``, ``--resume``) and
+answers every prompt with generated text. Behaviour is tuned through
+environment variables:
+
+``FAKE_CLAUDE_STARTUP_SEC``     delay before the process can answer (default 0.5)
+``FAKE_CLAUDE_CHARS_PER_SEC``   streaming rate of the answer (default 2000)
+``FAKE_CLAUDE_OUTPUT_CHARS``    answer length (default 1500)
+``FAKE_CLAUDE_FAILURE_RATE``    probability a prompt fails (default 0)
+
+The answer ends with ``BENCHDONE <id>`` (a failure's error text carries
+``BENCHFAIL <id>``), where ``<id>`` is the ``u<user>n<seq>`` token of the
+prompt, so the fake Telegram API can tell when an answer was delivered.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+_ID_RE = re.compile(r"u\d+n\d+")
+_CHUNK_CHARS = 40
+_FILLER = "The quick brown fox jumps over the lazy dog. "
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+STARTUP_SEC = _env_float("FAKE_CLAUDE_STARTUP_SEC", 0.5)
+CHARS_PER_SEC = max(1.0, _env_float("FAKE_CLAUDE_CHARS_PER_SEC", 2000))
+OUTPUT_CHARS = int(_env_float("FAKE_CLAUDE_OUTPUT_CHARS", 1500))
+FAILURE_RATE = _env_float("FAKE_CLAUDE_FAILURE_RATE", 0.0)
+
+
+def _emit(event: dict[str, object]) -> None:
+    sys.stdout.write(json.dumps(event) + "\n")
+    sys.stdout.flush()
+
+
+def _answer(prompt: str) -> tuple[str, bool]:
+    """Return the answer (or error text) for *prompt* and whether it failed."""
+    match = _ID_RE.search(prompt)
+    request_id = match.group(0) if match else "unknown"
+    if random.random() < FAILURE_RATE:  # noqa: S311
+        return f"BENCHFAIL {request_id}", True
+    marker = f"\n\nBENCHDONE {request_id}"
+    body_len = max(0, OUTPUT_CHARS - len(marker))
+    body = (_FILLER * (body_len // len(_FILLER) + 1))[:body_len]
+    return body + marker, False
+
+
+def _chunks(text: str) -> list[str]:
+    return [text[i : i + _CHUNK_CHARS] for i in range(0, len(text), _CHUNK_CHARS)]
+
+
+def _stream_turn(prompt: str, session_id: str) -> bool:
+    """Answer one prompt as stream-json events; return False if it failed."""
+    text, failed = _answer(prompt)
+    if failed:
+        sys.stderr.write(text + "\n")
+    else:
+        for chunk in _chunks(text):
+            time.sleep(len(chunk) / CHARS_PER_SEC)
+            _emit(
+                {
+                    "type": "stream_event",
+                    "session_id": session_id,
+                    "event": {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {"type": "text_delta", "text": chunk},
+                    },
+                }
+            )
+        _emit(
+            {
+                "type": "assistant",
+                "session_id": session_id,
+                "message": {"role": "assistant", "content": [{"type": "text", "text": text}]},
+            }
+        )
+    _emit(
+        {
+            "type": "result",
+            "subtype": "error_during_execution" if failed else "success",
+            "is_error": failed,
+            "result": text,
+            "session_id": session_id,
+        }
+    )
+    return not failed
+
+
+def _run_interactive(session_id: str) -> int:
+    # Warm-pool mode: one user message per stdin line until EOF
+    for line in sys.stdin:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        content = (message.get("message") or {}).get("content", "")
+        if isinstance(content, list):
+            content = " ".join(str(block.get("text", "")) for block in content)
+        _stream_turn(str(content), session_id)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-p", "--print", action="store_true")
+    parser.add_argument("--output-format", default="text")
+    parser.add_argument("--input-format", default="text")
+    parser.add_argument("--resume")
+    args, rest = parser.parse_known_args()
+    prompt = rest[-1] if rest else ""
+    session_id = args.resume or str(uuid.uuid4())
+
+    time.sleep(STARTUP_SEC)
+    if args.output_format == "stream-json":
+        _emit({"type": "system", "subtype": "init", "session_id": session_id})
+    if args.input_format == "stream-json":
+        return _run_interactive(session_id)
+    if args.output_format == "stream-json":
+        return 0 if _stream_turn(prompt, session_id) else 1
+
+    text, failed = _answer(prompt)
+    if failed:
+        sys.stderr.write(text + "\n")
+        return 1
+    time.sleep(len(text) / CHARS_PER_SEC)
+    if args.output_format == "json":
+        _emit({"type": "result", "is_error": False, "result": text, "session_id": session_id})
+    else:
+        sys.stdout.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
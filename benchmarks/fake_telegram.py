@@ -0,0 +1,97 @@
+"""Local stand-in for the Telegram Bot API used by the benchmarks.
+
+Serves ``/bot<token>/<method>`` for the methods TeleClaudeCode calls,
+queues updates for ``getUpdates`` and records every call. Text containing
+``BENCHDONE <id>`` or ``BENCHFAIL <id>`` completes the request ``<id>``.
+A configurable fraction of rate-limited calls is answered with 429.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+import re
+from collections import Counter
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+_DONE_RE = re.compile(r"BENCH(DONE|FAIL) (u\d+n\d+)")
+_LIMITED_METHODS = frozenset({"sendMessage", "editMessageText", "sendDocument"})
+_MAX_POLL_WAIT_SEC = 1.0  # answer getUpdates early so shutdown is quick
+
+
+class FakeTelegram:
+    """Records Bot API traffic and resolves waiters when answers arrive."""
+
+    def __init__(self, rate_429: float = 0.0, retry_after: int = 1) -> None:
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.throttled = 0
+        self._updates: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._waiters: dict[str, asyncio.Future[str]] = {}
+        self._next_message_id = 1
+        self.app = FastAPI()
+        self.app.add_api_route("/bot{token}/{method}", self._handle, methods=["POST", "GET"])
+
+    def expect(self, request_id: str) -> asyncio.Future[str]:
+        """Future resolved with "done" or "fail" when the answer for *request_id* is sent."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[request_id] = future
+        return future
+
+    def push_update(self, update: dict[str, Any]) -> None:
+        self._updates.put_nowait(update)
+
+    def api_calls(self) -> int:
+        return sum(n for method, n in self.calls.items() if method != "getUpdates")
+
+    async def _handle(self, token: str, method: str, request: Request) -> JSONResponse:
+        payload: dict[str, Any] = {}
+        if request.headers.get("content-type", "").startswith("multipart/"):
+            # Document upload: look for the marker anywhere in the raw body
+            payload["text"] = (await request.body()).decode("utf-8", errors="replace")
+        else:
+            with contextlib.suppress(ValueError):
+                payload = await request.json()
+        self.calls[method] += 1
+        if method in _LIMITED_METHODS and random.random() < self.rate_429:  # noqa: S311
+            self.throttled += 1
+            return JSONResponse(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry later",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+                status_code=429,
+            )
+        if method == "getUpdates":
+            return JSONResponse({"ok": True, "result": await self._poll(payload)})
+        self._observe(str(payload.get("text", "")))
+        result: Any = True
+        if method in ("sendMessage", "sendDocument"):
+            result = {"message_id": self._next_message_id, "chat": {"id": payload.get("chat_id")}}
+            self._next_message_id += 1
+        return JSONResponse({"ok": True, "result": result})
+
+    async def _poll(self, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        wait = min(float(payload.get("timeout", 0)), _MAX_POLL_WAIT_SEC)
+        updates: list[dict[str, Any]] = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=wait or 0.01))
+        except asyncio.TimeoutError:
+            return updates
+        limit = int(payload.get("limit", 100))
+        while len(updates) < limit and not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    def _observe(self, text: str) -> None:
+        for outcome, request_id in _DONE_RE.findall(text):
+            future = self._waiters.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_result("done" if outcome == "DONE" else "fail")
@@ -0,0 +1,82 @@
+"""Summary statistics and baseline comparison for benchmark runs."""
+
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+from typing import Any
+
+# Metrics where a larger value is a regression, and where a smaller one is
+_HIGHER_IS_WORSE = ("p50_sec", "p95_sec", "p99_sec", "tg_calls_per_answer")
+_LOWER_IS_WORSE = ("throughput_per_sec",)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linear-interpolated percentile (*q* in 0..100) of *values*."""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(
+    latencies: list[float],
+    failures: int,
+    timeouts: int,
+    wall_sec: float,
+    api_calls: int,
+    throttled: int,
+) -> dict[str, Any]:
+    answered = len(latencies) + failures
+    return {
+        "answers": len(latencies),
+        "failures": failures,
+        "timeouts": timeouts,
+        "p50_sec": round(percentile(latencies, 50), 4),
+        "p95_sec": round(percentile(latencies, 95), 4),
+        "p99_sec": round(percentile(latencies, 99), 4),
+        "max_sec": round(max(latencies, default=math.nan), 4),
+        "throughput_per_sec": round(answered / wall_sec, 4) if wall_sec > 0 else 0.0,
+        "tg_calls_per_answer": round(api_calls / answered, 3) if answered else math.nan,
+        "tg_429_injected": throttled,
+        "wall_sec": round(wall_sec, 3),
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Return a description of every metric that regressed beyond *tolerance*."""
+    regressions = []
+    for key in _HIGHER_IS_WORSE:
+        old, new = baseline.get(key), results.get(key)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            if new > old * (1 + tolerance):
+                regressions.append(f"{key}: {old} -> {new}")
+    for key in _LOWER_IS_WORSE:
+        old, new = baseline.get(key), results.get(key)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            if new < old * (1 - tolerance):
+                regressions.append(f"{key}: {old} -> {new}")
+    if results.get("timeouts", 0) > baseline.get("timeouts", 0):
+        regressions.append(f"timeouts: {baseline.get('timeouts', 0)} -> {results['timeouts']}")
+    return regressions
+
+
+def load_baseline(path: Path) -> dict[str, Any] | None:
+    if not path.exists():
+        return None
+    data: dict[str, Any] = json.loads(path.read_text())
+    return data
+
+
+def save_baseline(path: Path, config: dict[str, Any], results: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"config": config, "results": results}, indent=2) + "\n")
+
+
+def format_results(results: dict[str, Any]) -> str:
+    width = max(len(key) for key in results)
+    return "\n".join(f"  {key:<{width}}  {value}" for key, value in results.items())
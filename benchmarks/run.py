@@ -0,0 +1,304 @@
+"""Drive simulated users through TeleClaudeCode and report latency.
+
+Starts the fake Telegram API in this process, launches the bot under test
+(polling mode, or the webhook API with RQ workers or the in-process
+executor) with ``claude_bin`` pointing at :mod:`benchmarks.fake_claude`,
+and has N users each send their prompts one after another. End-to-end
+latency runs from delivering an update to the fake API seeing the answer.
+
+    python -m benchmarks.run --mode polling --users 8 --prompts 5
+    python -m benchmarks.run --mode webhook-inprocess \
+        --baseline benchmarks/baselines/webhook-inprocess.json
+
+Extra bot settings can be passed as ``--env NAME=VALUE`` (e.g.
+``--env CLAUDE_EXECUTOR=pool``) to compare tuning options.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+import uvicorn
+
+from benchmarks import report
+from benchmarks.fake_telegram import FakeTelegram
+
+_ROOT = Path(__file__).resolve().parent.parent
+_FAKE_CLAUDE = Path(__file__).resolve().parent / "fake_claude.py"
+_MODES = ("polling", "webhook-rq", "webhook-inprocess")
+_READY_TIMEOUT_SEC = 30
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def _bot_env(args: argparse.Namespace, tg_port: int, app_port: int) -> dict[str, str]:
+    env = {
+        **os.environ,
+        "TELEGRAM_BOT_TOKEN": "bench:token",
+        "TELEGRAM_API_BASE": f"http://127.0.0.1:{tg_port}",
+        "TELEGRAM_WEBHOOK_SECRET": "",
+        "TELEGRAM_ALLOWED_USER_IDS": "",
+        "DIRECT_CHAT": "true",
+        "RESPONSE_CACHE": "false",
+        "POLLING_OFFSET_BACKEND": "memory",
+        "LOG_LEVEL": "WARNING",
+        "APP_PORT": str(app_port),
+        "QUEUE_NAME": f"tcc-bench-{os.getpid()}",
+        "CLAUDE_BIN": str(_FAKE_CLAUDE),
+        "CLAUDE_GLOBAL_CONCURRENCY": str(args.concurrency),
+        "CLAUDE_STREAM_OUTPUT": "true" if args.stream else "false",
+        "CLAUDE_MAX_OUTPUT_CHARS": str(args.output_chars + 1000),
+        "CLAUDE_TIMEOUT_SEC": str(int(args.timeout)),
+        "FAKE_CLAUDE_STARTUP_SEC": str(args.startup),
+        "FAKE_CLAUDE_CHARS_PER_SEC": str(args.chars_per_sec),
+        "FAKE_CLAUDE_OUTPUT_CHARS": str(args.output_chars),
+        "FAKE_CLAUDE_FAILURE_RATE": str(args.failure_rate),
+        "WEBHOOK_EXECUTOR": "inprocess" if args.mode == "webhook-inprocess" else "rq",
+    }
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    return env
+
+
+def _start_bot(args: argparse.Namespace, env: dict[str, str], app_port: int) -> list[Any]:
+    log = None if args.verbose else subprocess.DEVNULL
+    python = sys.executable
+
+    def spawn(cmd: list[str]) -> subprocess.Popen[bytes]:
+        return subprocess.Popen(cmd, cwd=_ROOT, env=env, stdout=log, stderr=log)
+
+    if args.mode == "polling":
+        return [spawn([python, "-c", "from app.bot.polling import run_polling; run_polling()"])]
+    procs = [
+        spawn(
+            [
+                python,
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(app_port),
+                "--log-level",
+                "warning",
+            ]
+        )
+    ]
+    if args.mode == "webhook-rq":
+        procs += [spawn([python, "-m", "app.worker.runner"]) for _ in range(args.workers)]
+    return procs
+
+
+def _stop_bot(procs: list[Any]) -> None:
+    for proc in procs:
+        if proc.poll() is None:
+            # Polling mode shuts down on Ctrl+C
+            proc.send_signal(signal.SIGINT)
+    deadline = time.monotonic() + 10
+    for proc in procs:
+        try:
+            proc.wait(timeout=max(0.1, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def _check_redis(env: dict[str, str]) -> None:
+    from redis import Redis
+
+    url = env.get("REDIS_URL", "redis://localhost:6379/0")
+    try:
+        Redis.from_url(url, socket_connect_timeout=2).ping()
+    except Exception as exc:
+        raise SystemExit(f"webhook-rq needs Redis at {url}: {exc}") from None
+
+
+async def _wait_ready(args: argparse.Namespace, fake: FakeTelegram, app_url: str) -> None:
+    deadline = time.monotonic() + _READY_TIMEOUT_SEC
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if args.mode == "polling":
+                if fake.calls["getUpdates"]:
+                    return
+            else:
+                with contextlib.suppress(httpx.HTTPError):
+                    if (await client.get(f"{app_url}/healthz")).status_code == 200:
+                        return
+            await asyncio.sleep(0.1)
+    raise SystemExit("bot did not become ready; rerun with --verbose to see its output")
+
+
+class _Driver:
+    def __init__(self, args: argparse.Namespace, fake: FakeTelegram, app_url: str) -> None:
+        self.args = args
+        self.fake = fake
+        self.app_url = app_url
+        self.latencies: list[float] = []
+        self.failures = 0
+        self.timeouts = 0
+        self._update_id = 0
+        self._client = httpx.AsyncClient(timeout=30)
+
+    async def _deliver(self, user_id: int, text: str) -> None:
+        self._update_id += 1
+        update = {
+            "update_id": self._update_id,
+            "message": {
+                "message_id": self._update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"bench{user_id}"},
+                "text": text,
+            },
+        }
+        if self.args.mode == "polling":
+            self.fake.push_update(update)
+        else:
+            await self._client.post(f"{self.app_url}/telegram/webhook", json=update)
+
+    async def user(self, user_id: int) -> None:
+        for seq in range(self.args.prompts):
+            request_id = f"u{user_id}n{seq}"
+            answered = self.fake.expect(request_id)
+            start = time.perf_counter()
+            await self._deliver(user_id, f"benchmark prompt {request_id}")
+            try:
+                outcome = await asyncio.wait_for(answered, timeout=self.args.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                continue
+            if outcome == "done":
+                self.latencies.append(time.perf_counter() - start)
+            else:
+                self.failures += 1
+            if self.args.think:
+                await asyncio.sleep(self.args.think)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+async def _run(args: argparse.Namespace) -> dict[str, Any]:
+    fake = FakeTelegram(rate_429=args.rate_429)
+    tg_port, app_port = _free_port(), _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(fake.app, host="127.0.0.1", port=tg_port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    env = _bot_env(args, tg_port, app_port)
+    if args.mode == "webhook-rq":
+        _check_redis(env)
+    app_url = f"http://127.0.0.1:{app_port}"
+    procs = _start_bot(args, env, app_port)
+    driver = _Driver(args, fake, app_url)
+    try:
+        await _wait_ready(args, fake, app_url)
+        calls_before = fake.api_calls()
+        start = time.perf_counter()
+        await asyncio.gather(*(driver.user(u) for u in range(1, args.users + 1)))
+        wall = time.perf_counter() - start
+    finally:
+        await driver.close()
+        await asyncio.to_thread(_stop_bot, procs)
+        server.should_exit = True
+        await server_task
+
+    return report.summarize(
+        driver.latencies,
+        driver.failures,
+        driver.timeouts,
+        wall,
+        fake.api_calls() - calls_before,
+        fake.throttled,
+    )
+
+
+def _config(args: argparse.Namespace) -> dict[str, Any]:
+    keys = (
+        "mode",
+        "users",
+        "prompts",
+        "think",
+        "concurrency",
+        "workers",
+        "stream",
+        "startup",
+        "chars_per_sec",
+        "output_chars",
+        "failure_rate",
+        "rate_429",
+        "env",
+    )
+    return {key: getattr(args, key) for key in keys}
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=_MODES, default="polling")
+    parser.add_argument("--users", type=int, default=8, help="simulated users")
+    parser.add_argument("--prompts", type=int, default=5, help="prompts per user")
+    parser.add_argument("--think", type=float, default=0.0, help="pause between prompts (s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="CLAUDE_GLOBAL_CONCURRENCY")
+    parser.add_argument("--workers", type=int, default=4, help="RQ workers (webhook-rq)")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--startup", type=float, default=0.5, help="fake claude startup (s)")
+    parser.add_argument("--chars-per-sec", type=float, default=2000)
+    parser.add_argument("--output-chars", type=int, default=1500)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of sends → 429")
+    parser.add_argument("--timeout", type=float, default=120, help="per-answer timeout (s)")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE")
+    parser.add_argument("--baseline", type=Path, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's output")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    results = asyncio.run(_run(args))
+    print(f"{args.mode}: {args.users} users x {args.prompts} prompts")
+    print(report.format_results(results))
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline:
+        report.save_baseline(args.baseline, _config(args), results)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    baseline = report.load_baseline(args.baseline)
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to create it")
+        return 0
+    if baseline.get("config") != _config(args):
+        print("warning: baseline was recorded with a different configuration")
+    regressions = report.compare(results, baseline["results"], args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
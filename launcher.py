@@ -39,7 +39,21 @@ def _start_polling_mode() -> None:
 
 
 def _start_webhook_mode() -> None:
-    print("Starting webhook mode (API + Worker)...")
+    if settings.webhook_executor == "inprocess":
+        print("Starting webhook mode (API with in-process executor)...")
+        api_proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", settings.app_host, "--port", str(settings.app_port)],
+        )
+        try:
+            api_proc.wait()
+        except KeyboardInterrupt:
+            api_proc.terminate()
+            api_proc.wait()
+            print("\nStopped.")
+        return
+
+    print("Starting webhook mode (API + Workers)...")
     # Check Redis
     try:
         from redis import Redis
@@ -54,8 +68,9 @@ def _start_webhook_mode() -> None:
         [sys.executable, "-m", "uvicorn", "app.main:app",
          "--host", settings.app_host, "--port", str(settings.app_port)],
     )
+    # The supervisor runs WORKER_PROCESSES workers and restarts any that crash
     worker_proc = subprocess.Popen(
-        [sys.executable, "-m", "app.worker.runner"],
+        [sys.executable, "-m", "app.worker.supervisor"],
     )
 
     try:
@@ -0,0 +1,263 @@
+"""Shared fixtures: a fake clock and an in-memory stand-in for redis-py."""
+
+from __future__ import annotations
+
+import math
+
+import pytest
+
+from app.core.scheduler import _ACQUIRE_LUA
+
+
+class Clock:
+    """Callable clock for stores that take ``clock=``; tests move ``now`` by hand."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _encode(value) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class _Pipeline:
+    """Queues commands and runs them on ``execute()``, returning their results."""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._commands: list = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class FakeRedis:
+    """Just enough of redis-py, in memory.
+
+    Values come back as bytes like the real client. ``ttl`` records the
+    expiry each key was given and ``expire_all()`` drops every key that has
+    one, standing in for time passing. Set ``fail`` to make every command
+    raise ``ConnectionError``; ``calls`` counts commands sent.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict = {}
+        self.ttl: dict = {}
+        self.calls = 0
+        self.fail = False
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def expire_all(self) -> None:
+        self.data = {k: v for k, v in self.data.items() if self.ttl.get(k) is None}
+
+    def register_script(self, source):
+        """Lua scripts the fake knows, as Python; others are not supported."""
+        if source != _ACQUIRE_LUA:
+            raise NotImplementedError("FakeRedis cannot run this script")
+
+        def acquire(keys, args):
+            self._call()
+            holder, now, lease, limit = args
+            holders = self.data.setdefault(keys[0], {})
+            for member, taken in list(holders.items()):
+                if taken <= now - lease:
+                    del holders[member]
+            if len(holders) >= limit:
+                return 0
+            holders[_decode(holder)] = float(now)
+            self.ttl[keys[0]] = math.ceil(lease)
+            return 1
+
+        return acquire
+
+    # Strings
+
+    def set(self, key, value, ex=None, nx=False):
+        self._call()
+        if nx and key in self.data:
+            return None
+        self.data[key] = _encode(value)
+        self.ttl[key] = ex
+        return True
+
+    def get(self, key):
+        self._call()
+        return self.data.get(key)
+
+    def mget(self, keys, *more):
+        self._call()
+        names = [keys, *more] if isinstance(keys, str) else [*keys, *more]
+        return [self.data.get(key) for key in names]
+
+    def incr(self, key, amount=1):
+        return self.incrby(key, amount)
+
+    def incrby(self, key, amount=1):
+        self._call()
+        value = int(self.data.get(key, b"0")) + amount
+        self.data[key] = _encode(value)
+        return value
+
+    def decrby(self, key, amount=1):
+        return self.incrby(key, -amount)
+
+    # Keys
+
+    def delete(self, *keys):
+        self._call()
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        self._call()
+        return int(key in self.data)
+
+    def expire(self, key, seconds):
+        self._call()
+        self.ttl[key] = seconds
+
+    # Hashes
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self._call()
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        self.data.setdefault(key, {}).update({_decode(k): _encode(v) for k, v in items.items()})
+
+    def hget(self, key, field):
+        self._call()
+        return self.data.get(key, {}).get(_decode(field))
+
+    def hgetall(self, key):
+        self._call()
+        return {k.encode(): v for k, v in self.data.get(key, {}).items()}
+
+    def hvals(self, key):
+        self._call()
+        return list(self.data.get(key, {}).values())
+
+    def hdel(self, key, *fields):
+        self._call()
+        values = self.data.get(key, {})
+        return sum(values.pop(_decode(f), None) is not None for f in fields)
+
+    # Sets
+
+    def sadd(self, key, *members):
+        self._call()
+        self.data.setdefault(key, set()).update(_decode(m) for m in members)
+
+    def srem(self, key, *members):
+        self._call()
+        self.data.get(key, set()).difference_update(_decode(m) for m in members)
+
+    def smembers(self, key):
+        self._call()
+        return {m.encode() for m in self.data.get(key, set())}
+
+    # Sorted sets
+
+    def zadd(self, key, mapping):
+        self._call()
+        self.data.setdefault(key, {}).update({_decode(m): float(s) for m, s in mapping.items()})
+
+    def zrem(self, key, *members):
+        self._call()
+        scores = self.data.get(key, {})
+        return sum(scores.pop(_decode(m), None) is not None for m in members)
+
+    def zcard(self, key):
+        self._call()
+        return len(self.data.get(key, {}))
+
+    def zpopmin(self, key, count=1):
+        self._call()
+        popped = self._sorted(key)[:count]
+        for member, _ in popped:
+            del self.data[key][member]
+        return [(m.encode(), s) for m, s in popped]
+
+    def _sorted(self, key) -> list[tuple[str, float]]:
+        return sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def zrange(self, key, start, end):
+        self._call()
+        members = [m.encode() for m, _ in self._sorted(key)]
+        return members[start:] if end == -1 else members[start : end + 1]
+
+    def zrangebyscore(self, key, low, high):
+        self._call()
+        return [m.encode() for m, s in self._sorted(key) if float(low) <= s <= float(high)]
+
+    # Lists
+
+    def lpush(self, key, *values):
+        self._call()
+        items = self.data.setdefault(key, [])
+        for value in values:
+            items.insert(0, _encode(value))
+        return len(items)
+
+    def ltrim(self, key, start, end):
+        self._call()
+        items = self.data.get(key, [])
+        self.data[key] = items[start:] if end == -1 else items[start : end + 1]
+
+    def lrange(self, key, start, end):
+        self._call()
+        items = self.data.get(key, [])
+        return items[start:] if end == -1 else items[start : end + 1]
+
+
+class AsyncFakeRedis:
+    """The same fake behind ``await``, like ``redis.asyncio``."""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self.sync = redis
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture
+def async_redis(fake_redis) -> AsyncFakeRedis:
+    return AsyncFakeRedis(fake_redis)
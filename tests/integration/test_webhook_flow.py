@@ -55,3 +55,53 @@ def test_webhook_ask_empty(mock_send, client):
     mock_send.assert_called_once()
     call_text = mock_send.call_args[0][1]
     assert "provide" in call_text.lower() or "question" in call_text.lower()
+
+
+class _FakeQueue:
+    def __init__(self):
+        self.jobs = []
+
+    connection = None
+
+    def enqueue(self, func, *args, meta=None, job_timeout=None, retry=None):
+        self.jobs.append((func, args))
+        self.meta = meta
+
+    @property
+    def count(self):
+        return len(self.jobs)
+
+
+@patch("app.api.webhook.send_message", new_callable=AsyncMock)
+def test_webhook_ask_enqueues_via_shared_queue(mock_send, client):
+    from app.api.deps import get_queue
+
+    queue = _FakeQueue()
+    app.dependency_overrides[get_queue] = lambda: queue
+    try:
+        for update_id in (5, 6):
+            resp = client.post("/telegram/webhook", json={
+                "update_id": update_id,
+                "message": {"chat": {"id": 100}, "from": {"id": 1}, "text": "/ask hello"},
+            })
+            assert resp.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+    assert queue.jobs == [("app.worker.jobs.execute_claude_task", (100, 1, "hello", True))] * 2
+    assert queue.meta["traceparent"].startswith("00-")
+    assert queue.meta["lane"] == "fast"
+    assert "position 2" in mock_send.call_args[0][1]
+
+
+def test_readyz_reuses_client(client):
+    client.get("/readyz")
+    first = app.state.async_redis
+    client.get("/readyz")
+    assert app.state.async_redis is first
+
+
+def test_metrics_endpoint(client):
+    client.post("/telegram/webhook", json={"update_id": 900})
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert "tcc_webhook_handle_seconds_count" in resp.text
@@ -0,0 +1,92 @@
+"""Tests for app.core.admission."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from app.bot import polling
+from app.config import settings
+from app.core import admission, lanes
+from app.worker import async_exec
+from app.worker.async_exec import InProcessExecutor
+
+
+def test_admit_rejects_over_budget(monkeypatch):
+    monkeypatch.setattr(settings, "admission_max_wait_sec", 60)
+    admission.admit(lanes.FAST, queued=3, slots=2, service_sec=20.0)  # 2 * 20s ahead
+    with pytest.raises(admission.OverloadError) as exc:
+        admission.admit(lanes.FAST, queued=6, slots=2, service_sec=20.0)
+    assert exc.value.wait_sec == 70.0
+    monkeypatch.setattr(settings, "admission_max_wait_sec", 0)
+    admission.admit(lanes.FAST, queued=600, slots=1, service_sec=20.0)
+
+
+def test_deadline_and_expiry(monkeypatch):
+    monkeypatch.setattr(settings, "admission_bulk_max_wait_sec", 100)
+    deadline = admission.deadline(lanes.BULK)
+    assert deadline is not None and not admission.expired(deadline, lanes.BULK)
+    assert admission.expired(time.time() - 1, lanes.BULK)
+    assert not admission.expired(None, lanes.BULK)
+
+
+def test_service_times_default_then_mean(monkeypatch):
+    monkeypatch.setattr(settings, "admission_default_service_sec", 30.0)
+    times = admission.MemoryServiceTimes(samples=2)
+    assert times.mean(lanes.FAST) == 30.0
+    for seconds in (100.0, 4.0, 6.0):
+        times.record(lanes.FAST, seconds)
+    assert times.mean(lanes.FAST) == 5.0  # only the last two count
+    assert times.mean(lanes.BULK) == 30.0
+
+
+def test_eta_text():
+    assert admission.eta_text(20) == "under a minute"
+    assert admission.eta_text(150) == "about 2 min"
+
+
+def test_polling_turns_prompt_away_when_queue_is_too_long(monkeypatch):
+    sent: list[str] = []
+    monkeypatch.setattr(polling, "_send_sync", lambda chat_id, text, *a: sent.append(text))
+    monkeypatch.setattr(settings, "admission_max_wait_sec", 60)
+    monkeypatch.setattr(polling._schedulers[lanes.FAST], "queue_depth", lambda: 50)
+    submitted: list[tuple] = []
+    monkeypatch.setattr(
+        polling._schedulers[lanes.FAST], "submit", lambda *args: submitted.append(args)
+    )
+    polling._submit(40, 1, "hello", lane=lanes.FAST)
+    assert not submitted
+    assert "try again later" in sent[0]
+
+
+def test_polling_drops_expired_job(monkeypatch):
+    sent: list[str] = []
+    ran: list[str] = []
+    monkeypatch.setattr(polling, "_send_sync", lambda chat_id, text, *a: sent.append(text))
+    monkeypatch.setattr(polling, "_do_ask", lambda *args: ran.append(args[2]))
+    ticket = polling._cancels.next_ticket(41)
+    polling._ask_job(41, 1, "stale", True, ticket, lanes.FAST, time.time() - 1)
+    assert ran == []
+    assert sent == [admission.EXPIRED_TEXT]
+
+
+async def test_executor_drops_expired_job(monkeypatch):
+    sent: list[str] = []
+    ran: list[str] = []
+
+    async def fake_send(chat_id: int, text: str) -> None:
+        sent.append(text)
+
+    async def fake_execute(self, chat_id, user_id, prompt, use_cache) -> None:
+        ran.append(prompt)
+
+    monkeypatch.setattr(async_exec, "send_message", fake_send)
+    monkeypatch.setattr(InProcessExecutor, "_execute", fake_execute)
+    monkeypatch.setattr(admission, "deadline", lambda lane: time.time() - 1)
+    executor = InProcessExecutor(concurrency=1, max_queue=4)
+    executor.start()
+    assert executor.submit(1, 1, "stale") == 1
+    await executor.drain(timeout=5)
+    assert ran == []
+    assert sent == [admission.EXPIRED_TEXT]
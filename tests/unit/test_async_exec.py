@@ -0,0 +1,112 @@
+"""Tests for app.worker.async_exec."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import textwrap
+
+import pytest
+
+from app.config import settings
+from app.core import lanes
+from app.worker import async_exec
+from app.worker.async_exec import InProcessExecutor, run_claude_async
+
+
+@pytest.fixture
+def fake_bin(tmp_path, monkeypatch):
+    def _make(body: str) -> None:
+        script = tmp_path / "fake_claude.py"
+        script.write_text(textwrap.dedent(body))
+        monkeypatch.setattr(
+            async_exec, "_build_cmd", lambda prompt, *extra: [sys.executable, str(script), prompt]
+        )
+
+    return _make
+
+
+async def test_run_claude_async_streams_text(fake_bin):
+    delta = {
+        "type": "stream_event",
+        "event": {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "hi"}},
+    }
+    lines = [json.dumps(delta), json.dumps({"type": "result", "result": "hi there"})]
+    fake_bin(f"print({chr(10).join(lines)!r})")
+    seen: list[str] = []
+
+    async def on_text(text: str) -> None:
+        seen.append(text)
+
+    assert await run_claude_async("q", on_text=on_text) == "hi there"
+    assert seen == ["hi"]
+
+
+async def test_run_claude_async_timeout(fake_bin, monkeypatch):
+    monkeypatch.setattr(settings, "claude_timeout_sec", 1)
+    fake_bin("import time; time.sleep(10)")
+    with pytest.raises(RuntimeError, match="timed out"):
+        await run_claude_async("q")
+
+
+async def test_run_claude_async_nonzero_exit(fake_bin):
+    fake_bin("import sys; sys.stderr.write('bad'); sys.exit(4)")
+    with pytest.raises(RuntimeError, match="code 4: bad"):
+        await run_claude_async("q")
+
+
+async def test_executor_rejects_when_full_and_drains(monkeypatch):
+    done: list[str] = []
+    gate = asyncio.Event()
+
+    async def fake_execute(self, chat_id: int, user_id: int, prompt: str, use_cache: bool) -> None:
+        await gate.wait()
+        done.append(prompt)
+
+    monkeypatch.setattr(InProcessExecutor, "_execute", fake_execute)
+    executor = InProcessExecutor(concurrency=1, max_queue=2)
+    executor.start()
+    assert executor.submit(1, 1, "a") == 1
+    await asyncio.sleep(0)  # worker picks up "a"
+    assert executor.submit(1, 2, "b") == 1
+    assert executor.submit(1, 3, "c") == 2
+    assert executor.submit(1, 4, "d") is None
+
+    gate.set()
+    await executor.drain(timeout=5)
+    assert done == ["a", "b", "c"]
+    assert executor.submit(1, 5, "e") is None
+
+
+async def test_run_claude_async_stops_runaway_output(fake_bin, monkeypatch):
+    monkeypatch.setattr(settings, "claude_max_output_bytes", 100_000)
+    fake_bin("import sys\nwhile True:\n    print('z' * 1000)\n")
+    with pytest.raises(RuntimeError, match="exceeded 100000 bytes"):
+        await run_claude_async("hi")
+
+
+async def test_bulk_job_does_not_hold_up_fast_lane(monkeypatch):
+    done: list[str] = []
+    gate = asyncio.Event()
+
+    async def fake_execute(self, chat_id: int, user_id: int, prompt: str, use_cache: bool) -> None:
+        if prompt == "refactor":
+            await gate.wait()
+        done.append(prompt)
+
+    monkeypatch.setattr(InProcessExecutor, "_execute", fake_execute)
+    executor = InProcessExecutor(concurrency=1, max_queue=4, bulk_concurrency=1)
+    executor.start()
+    executor.submit(1, 1, "refactor", lane=lanes.BULK)
+    await asyncio.sleep(0)  # bulk worker picks it up and blocks
+    executor.submit(1, 1, "quick")
+    for _ in range(50):
+        if done:
+            break
+        await asyncio.sleep(0.01)
+    assert done == ["quick"]
+
+    gate.set()
+    await executor.drain(timeout=5)
+    assert done == ["quick", "refactor"]
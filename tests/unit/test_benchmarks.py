@@ -0,0 +1,55 @@
+"""Tests for the benchmark harness helpers."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+from app.worker.claude_exec import read_stream_events
+from benchmarks import fake_claude, report
+
+
+def test_percentile_interpolates():
+    values = [1.0, 2.0, 3.0, 4.0]
+    assert report.percentile(values, 50) == 2.5
+    assert report.percentile(values, 100) == 4.0
+    assert report.percentile([7.0], 99) == 7.0
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {"p95_sec": 2.0, "throughput_per_sec": 10.0, "timeouts": 0}
+    assert report.compare({"p95_sec": 2.3, "throughput_per_sec": 9.0}, baseline, 0.2) == []
+    regressions = report.compare(
+        {"p95_sec": 2.5, "throughput_per_sec": 7.0, "timeouts": 1}, baseline, 0.2
+    )
+    assert len(regressions) == 3
+
+
+def test_fake_claude_stream_json_is_readable():
+    env = {
+        **os.environ,
+        "FAKE_CLAUDE_STARTUP_SEC": "0",
+        "FAKE_CLAUDE_OUTPUT_CHARS": "200",
+        "FAKE_CLAUDE_CHARS_PER_SEC": "1000000",
+    }
+    proc = subprocess.run(
+        [
+            sys.executable,
+            fake_claude.__file__,
+            "-p",
+            "--output-format",
+            "stream-json",
+            "--verbose",
+            "--include-partial-messages",
+            "prompt u3n1",
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=30,
+        check=True,
+    )
+    result = read_stream_events(proc.stdout.splitlines())
+    assert result.finished and result.session_id
+    assert result.output().endswith("BENCHDONE u3n1")
@@ -0,0 +1,80 @@
+"""Tests for app.core.cache."""
+
+from __future__ import annotations
+
+from prometheus_client import REGISTRY
+
+from app.config import settings
+from app.core import cache, workspaces
+from app.core.cache import MemoryResponseCache, RedisResponseCache, cache_key
+
+
+def _value(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+def test_key_normalizes_whitespace_and_case():
+    assert cache_key("Explain  Python\nGIL ", 1) == cache_key("explain python gil", 1)
+
+
+def test_key_depends_on_model(monkeypatch):
+    before = cache_key("q", 1)
+    monkeypatch.setattr(settings, "claude_model", "opus")
+    assert cache_key("q", 1) != before
+
+
+def test_key_scoped_per_user_only_with_acl(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_allowed_user_ids", "")
+    assert cache_key("q", 1) == cache_key("q", 2)
+    monkeypatch.setattr(settings, "telegram_allowed_user_ids", "1,2")
+    assert cache_key("q", 1) != cache_key("q", 2)
+
+
+def test_key_depends_on_chat_workspace(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "workspace_base", str(tmp_path))
+    monkeypatch.setattr(settings, "workspace_root", str(tmp_path / "ws"))
+    monkeypatch.setattr(workspaces, "_manager", None)
+    with workspaces.use(1):
+        first = cache_key("q", 1)
+    with workspaces.use(2):
+        assert cache_key("q", 1) != first
+
+
+def test_memory_cache_ttl_and_hit_counters(clock):
+    hits, misses = _value("tcc_cache_hits_total"), _value("tcc_cache_misses_total")
+    c = MemoryResponseCache(ttl=10, max_bytes=1000, clock=clock)
+    c.set("k", "answer")
+    assert c.get("k") == "answer"
+    clock.now = 11
+    assert c.get("k") is None
+    assert _value("tcc_cache_hits_total") == hits + 1
+    assert _value("tcc_cache_misses_total") == misses + 1
+
+
+def test_memory_cache_byte_cap_evicts_lru():
+    c = MemoryResponseCache(ttl=10, max_bytes=10)
+    c.set("a", "12345")
+    c.set("b", "12345")
+    c.get("a")  # a is now most recent
+    c.set("c", "12345")
+    assert c.get("b") is None
+    assert c.get("a") == "12345"
+    c.set("huge", "x" * 11)
+    assert c.get("huge") is None
+
+
+def test_redis_cache_keeps_running_byte_total(fake_redis):
+    c = RedisResponseCache(fake_redis, ttl=60, max_bytes=10)
+    c.set("a", "12345")
+    c.set("a", "123")  # overwriting replaces the old size
+    c.set("b", "12345")
+    assert fake_redis.get("tcc:cache:bytes") == b"8"
+    c.set("c", "12345")
+    assert c.get("a") is None
+    assert c.get("b") == "12345"
+    assert fake_redis.get("tcc:cache:bytes") == b"10"
+
+
+def test_lookup_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "response_cache", False)
+    assert cache.lookup("q", 1) == (None, None)
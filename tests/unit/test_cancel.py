@@ -0,0 +1,91 @@
+"""Tests for app.core.cancel."""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app.config import settings
+from app.core import cancel
+from app.core.cancel import MemoryCancelStore, RedisCancelStore
+from app.worker import claude_exec
+
+
+def test_cancel_drops_queued_tickets_but_not_later_ones():
+    store = MemoryCancelStore()
+    first, second = store.next_ticket(7), store.next_ticket(7)
+    cancel.cancel_chat(7, store)
+    third = store.next_ticket(7)
+    assert cancel.should_skip(7, first, store)
+    assert cancel.should_skip(7, second, store)
+    assert not cancel.should_skip(7, third, store)
+    assert not cancel.should_skip(8, store.next_ticket(8), store)
+
+
+def test_newer_prompt_supersedes_queued_one(monkeypatch):
+    store = MemoryCancelStore()
+    first, second = store.next_ticket(7), store.next_ticket(7)
+    assert not cancel.should_skip(7, first, store)
+    monkeypatch.setattr(settings, "claude_supersede_queued", True)
+    assert cancel.should_skip(7, first, store)
+    assert not cancel.should_skip(7, second, store)
+
+
+def test_redis_store_issues_tickets_and_records_cancel(fake_redis):
+    store = RedisCancelStore(fake_redis)
+    assert [store.next_ticket(7), store.next_ticket(7), store.next_ticket(8)] == [1, 2, 1]
+    assert fake_redis.ttl["tcc:cancel:7:latest"] > 0
+    cancel.cancel_chat(7, store)
+    assert store.state(7) == (2, 2)
+    assert cancel.should_skip(7, 2, store)
+    assert not cancel.should_skip(7, store.next_ticket(7), store)
+
+
+def _sleeper() -> subprocess.Popen[bytes]:
+    return subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(30)"], start_new_session=True
+    )
+
+
+def test_cancel_kills_running_process_group():
+    store = MemoryCancelStore()
+    proc = _sleeper()
+    with cancel.job(7, store.next_ticket(7), store), cancel.track(proc) as handle:
+        assert cancel.cancel_chat(7, store) == 1
+        assert proc.wait(timeout=5) != 0
+    assert handle.cancelled.is_set()
+    assert cancel.cancel_chat(7, store) == 0  # unregistered once the block exits
+
+
+class _SharedStore(MemoryCancelStore):
+    remote = True  # like Redis: the canceller is another process
+
+
+def test_remote_cancel_is_noticed_by_watcher(monkeypatch):
+    monkeypatch.setattr(settings, "cancel_poll_interval_sec", 0.05)
+    store = _SharedStore()
+    proc = _sleeper()
+    with cancel.job(7, store.next_ticket(7), store), cancel.track(proc) as handle:
+        store.cancel(7)  # only the mark, no local kill
+        assert proc.wait(timeout=5) != 0
+    assert handle.cancelled.is_set()
+
+
+def test_stream_claude_reports_cancel(tmp_path, monkeypatch):
+    script = tmp_path / "fake_claude.py"
+    script.write_text("import time; time.sleep(30)")
+    monkeypatch.setattr(
+        claude_exec, "_build_cmd", lambda prompt, *extra: [sys.executable, str(script)]
+    )
+    store = MemoryCancelStore()
+    ticket = store.next_ticket(7)
+    timer = threading.Timer(0.5, cancel.cancel_chat, args=(7, store))
+    timer.start()
+    start = time.monotonic()
+    with cancel.job(7, ticket, store), pytest.raises(RuntimeError, match="cancelled"):
+        claude_exec.stream_claude("hi", lambda _: None)
+    assert time.monotonic() - start < 10
@@ -1,6 +1,6 @@
 """Tests for app.core.chunker."""
 
-from app.core.chunker import chunk_text
+from app.core.chunker import chunk_text, utf16_len
 
 
 def test_short_text_no_split():
@@ -48,3 +48,29 @@ def test_hard_cut_no_separators():
     chunks = chunk_text(text)
     assert len(chunks) >= 2
     assert all(len(c) <= 4076 for c in chunks)
+
+
+def test_limit_counts_utf16_code_units():
+    text = "😀" * 3000  # 6000 UTF-16 code units
+    chunks = chunk_text(text)
+    assert len(chunks) == 2
+    assert all(utf16_len(c) <= 4076 for c in chunks)
+    assert "".join(chunks) == text
+
+
+def test_code_fence_is_closed_and_reopened():
+    code = "\n".join(f"print({i})" for i in range(1000))
+    text = "Here:\n```python\n" + code + "\n```\nDone."
+    chunks = chunk_text(text)
+    assert len(chunks) > 1
+    assert all(c.count("```") % 2 == 0 for c in chunks)
+    assert all(c.startswith("```python\n") for c in chunks[1:])
+    assert all(utf16_len(c) <= 4076 for c in chunks)
+    body = "\n".join(c.removeprefix("```python\n").removesuffix("\n```") for c in chunks)
+    assert "print(999)" in body and body.count("print(") == 1000
+
+
+def test_space_split_avoids_inline_code():
+    text = "a " * 2030 + "`some inline code span` " + "b " * 2000
+    first = chunk_text(text)[0]
+    assert first.count("`") % 2 == 0
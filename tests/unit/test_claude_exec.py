@@ -0,0 +1,131 @@
+"""Tests for app.worker.claude_exec."""
+
+from __future__ import annotations
+
+import json
+import sys
+import textwrap
+
+import pytest
+
+from app.config import settings
+from app.worker import claude_exec
+
+
+def _fake_claude(tmp_path, body: str) -> str:
+    script = tmp_path / "fake_claude.py"
+    script.write_text(textwrap.dedent(body))
+    return str(script)
+
+
+@pytest.fixture
+def fake_bin(tmp_path, monkeypatch):
+    def _make(body: str) -> None:
+        script = _fake_claude(tmp_path, body)
+        monkeypatch.setattr(settings, "claude_bin", sys.executable)
+        monkeypatch.setattr(
+            claude_exec,
+            "_build_cmd",
+            lambda prompt, *extra: [sys.executable, script, *extra, prompt],
+        )
+
+    return _make
+
+
+def _printer(lines: list[str]) -> str:
+    return f"print({chr(10).join(lines)!r})"
+
+
+def _delta(text: str) -> str:
+    return json.dumps(
+        {
+            "type": "stream_event",
+            "event": {"type": "content_block_delta", "delta": {"type": "text_delta", "text": text}},
+        }
+    )
+
+
+def test_stream_claude_reports_partial_text(fake_bin):
+    lines = [
+        json.dumps({"type": "system", "subtype": "init"}),
+        _delta("Hello"),
+        _delta(", world"),
+        json.dumps({"type": "result", "result": "Hello, world", "is_error": False}),
+    ]
+    fake_bin(_printer(lines))
+    seen: list[str] = []
+    output = claude_exec.stream_claude("hi", seen.append)
+    assert output == "Hello, world"
+    assert seen == ["Hello", "Hello, world"]
+
+
+def test_stream_claude_falls_back_to_assistant_messages(fake_bin):
+    lines = [
+        json.dumps(
+            {"type": "assistant", "message": {"content": [{"type": "text", "text": "abc"}]}}
+        ),
+    ]
+    fake_bin(_printer(lines))
+    seen: list[str] = []
+    assert claude_exec.stream_claude("hi", seen.append) == "abc"
+    assert seen == ["abc"]
+
+
+def test_stream_claude_nonzero_exit(fake_bin):
+    fake_bin("import sys; sys.stderr.write('boom'); sys.exit(3)")
+    with pytest.raises(RuntimeError, match="code 3: boom"):
+        claude_exec.stream_claude("hi", lambda _: None)
+
+
+def test_stream_claude_timeout(fake_bin, monkeypatch):
+    monkeypatch.setattr(settings, "claude_timeout_sec", 1)
+    fake_bin("import time; time.sleep(10)")
+    with pytest.raises(RuntimeError, match="timed out"):
+        claude_exec.stream_claude("hi", lambda _: None)
+
+
+def test_stream_claude_reports_session_id(fake_bin):
+    lines = [
+        json.dumps({"type": "system", "subtype": "init", "session_id": "s-1"}),
+        json.dumps({"type": "result", "result": "ok", "session_id": "s-1"}),
+    ]
+    fake_bin(_printer(lines))
+    sessions: list[str] = []
+    assert claude_exec.stream_claude("hi", lambda _: None, on_session=sessions.append) == "ok"
+    assert sessions == ["s-1"]
+
+
+def test_run_claude_resumes_and_falls_back_when_session_missing(fake_bin):
+    fake_bin(
+        """
+        import json, sys
+        if "--resume" in sys.argv:
+            sys.stderr.write("No conversation found with session ID: old")
+            sys.exit(1)
+        print(json.dumps({"result": "fresh", "session_id": "new"}))
+        """
+    )
+    sessions: list[str] = []
+    assert claude_exec.run_claude("hi", resume="old", on_session=sessions.append) == "fresh"
+    assert sessions == ["new"]
+
+
+def test_run_claude_stops_runaway_output(fake_bin, monkeypatch):
+    monkeypatch.setattr(settings, "claude_max_output_bytes", 100_000)
+    monkeypatch.setattr(settings, "claude_capture_spool_bytes", 10_000)
+    fake_bin("import sys\nwhile True:\n    sys.stdout.write('x' * 65536)\n")
+    with pytest.raises(RuntimeError, match="exceeded 100000 bytes"):
+        claude_exec.run_claude("hi")
+
+
+def test_run_claude_spools_large_output(fake_bin, monkeypatch):
+    monkeypatch.setattr(settings, "claude_capture_spool_bytes", 1000)
+    fake_bin("print('y' * 500_000)")
+    assert claude_exec.run_claude("hi") == "y" * 500_000
+
+
+def test_error_keeps_stderr_tail(fake_bin, monkeypatch):
+    monkeypatch.setattr(settings, "claude_stderr_tail_bytes", 64)
+    fake_bin("import sys; sys.stderr.write('noise ' * 100_000 + 'the real error'); sys.exit(2)")
+    with pytest.raises(RuntimeError, match="code 2: .*the real error$"):
+        claude_exec.run_claude("hi")
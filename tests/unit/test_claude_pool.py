@@ -0,0 +1,93 @@
+"""Tests for app.worker.claude_pool."""
+
+from __future__ import annotations
+
+import sys
+import textwrap
+
+import pytest
+
+from app.worker import claude_pool
+from app.worker.claude_pool import ClaudePool, PoolUnavailableError
+
+_FAKE_CLAUDE = """
+import json, os, sys
+pid = str(os.getpid())
+print(json.dumps({"type": "system", "subtype": "init", "session_id": pid}), flush=True)
+for line in sys.stdin:
+    prompt = json.loads(line)["message"]["content"]
+    if prompt == "crash":
+        sys.exit(2)
+    if prompt == "flood":
+        while True:
+            print("x" * 1000, flush=True)
+    print(json.dumps({"type": "result", "result": prompt.upper() + " " + pid}), flush=True)
+"""
+
+
+@pytest.fixture
+def fake_pool_bin(tmp_path, monkeypatch):
+    script = tmp_path / "fake_claude.py"
+    script.write_text(textwrap.dedent(_FAKE_CLAUDE))
+    monkeypatch.setattr(claude_pool, "base_cmd", lambda *extra: [sys.executable, str(script)])
+
+
+def test_pool_answers_and_recycles_after_max_jobs(fake_pool_bin):
+    pool = ClaudePool(size=1, max_jobs=1, max_rss_mb=10_000)
+    pool.start()
+    try:
+        first = pool.run("hello")
+        second = pool.run("again")
+        assert first.startswith("HELLO ")
+        assert second.startswith("AGAIN ")
+        # Each prompt ran on a different, freshly warmed process
+        assert first.split()[1] != second.split()[1]
+    finally:
+        pool.close()
+
+
+def test_pool_reuses_process_up_to_max_jobs(fake_pool_bin):
+    pool = ClaudePool(size=1, max_jobs=2, max_rss_mb=10_000)
+    pool.start()
+    try:
+        sessions: list[str] = []
+        first = pool.run("a", on_session=sessions.append)
+        second = pool.run("b")
+        assert first.split()[1] == second.split()[1] == sessions[0]
+    finally:
+        pool.close()
+
+
+def test_pool_reports_crash_and_replaces_process(fake_pool_bin):
+    pool = ClaudePool(size=1, max_jobs=5, max_rss_mb=10_000)
+    pool.start()
+    try:
+        with pytest.raises(RuntimeError, match="code 2"):
+            pool.run("crash")
+        assert pool.run("ok").startswith("OK ")
+    finally:
+        pool.close()
+
+
+def test_pool_unavailable_when_all_busy(fake_pool_bin):
+    pool = ClaudePool(size=1, max_jobs=5, max_rss_mb=10_000)
+    pool.start()
+    warm = pool._acquire()
+    try:
+        with pytest.raises(PoolUnavailableError):
+            pool.run("x")
+    finally:
+        warm.stop()
+        pool.close()
+
+
+def test_pool_stops_runaway_output(fake_pool_bin, monkeypatch):
+    monkeypatch.setattr(claude_pool.settings, "claude_max_output_bytes", 50_000)
+    pool = ClaudePool(size=1, max_jobs=5, max_rss_mb=10_000)
+    pool.start()
+    try:
+        with pytest.raises(RuntimeError, match="exceeded 50000 bytes"):
+            pool.run("flood")
+        assert pool.run("next").startswith("NEXT ")  # replaced by a fresh process
+    finally:
+        pool.close()
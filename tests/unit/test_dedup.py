@@ -0,0 +1,75 @@
+"""Tests for app.core.dedup."""
+
+from __future__ import annotations
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.api import webhook
+from app.core.dedup import MemoryDedupStore, RedisDedupStore
+
+
+def _lookups(result: str) -> float:
+    return REGISTRY.get_sample_value("tcc_dedup_lookups_total", {"result": result}) or 0.0
+
+
+async def test_memory_store_lru():
+    misses = _lookups("miss")
+    store = MemoryDedupStore(max_size=2)
+    assert not await store.is_duplicate(1)
+    assert await store.is_duplicate(1)
+    assert not await store.is_duplicate(2)
+    assert not await store.is_duplicate(3)
+    assert not await store.is_duplicate(1)  # evicted
+    assert _lookups("miss") == misses + 4
+
+
+async def test_redis_store_is_shared_across_processes(async_redis):
+    hits = _lookups("redis_hit")
+    a = RedisDedupStore(async_redis, ttl=60)
+    b = RedisDedupStore(async_redis, ttl=60)
+    assert not await a.is_duplicate(7)
+    assert await b.is_duplicate(7)
+    assert _lookups("redis_hit") == hits + 1
+
+
+async def test_redis_store_local_front_cache_skips_round_trip(fake_redis, async_redis):
+    local_hits = _lookups("local_hit")
+    store = RedisDedupStore(async_redis, ttl=60)
+    await store.is_duplicate(7)
+    assert await store.is_duplicate(7)
+    assert fake_redis.calls == 1
+    assert _lookups("local_hit") == local_hits + 1
+
+
+async def test_redis_store_fails_open(fake_redis, async_redis):
+    errors = _lookups("redis_error")
+    fake_redis.fail = True
+    store = RedisDedupStore(async_redis, ttl=60, local_size=0)
+    assert not await store.is_duplicate(7)
+    assert _lookups("redis_error") == errors + 1
+
+
+async def test_failed_update_is_released_for_redelivery(fake_redis, async_redis, monkeypatch):
+    queued: list[str] = []
+
+    async def enqueue(executor, queue, redis, chat_id, user_id, prompt, use_cache, lane):
+        if not queued:
+            queued.append("failed")
+            raise ConnectionError("redis down")
+        queued.append(prompt)
+        return None
+
+    async def send(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(webhook, "_enqueue", enqueue)
+    monkeypatch.setattr(webhook, "send_message", send)
+    monkeypatch.setattr(webhook, "is_allowed", lambda user_id: True)
+    store = RedisDedupStore(async_redis, ttl=60)
+    update = {"update_id": 9, "message": {"chat": {"id": 1}, "from": {"id": 1}, "text": "/ask hi"}}
+    with pytest.raises(ConnectionError):
+        await webhook._handle_update(update, None, None, None, store)
+    assert fake_redis.get("tcc:update:9") is None
+    await webhook._handle_update(update, None, None, None, store)  # Telegram redelivers
+    assert queued == ["failed", "hi"]
@@ -0,0 +1,84 @@
+"""Tests for app.bot.delivery."""
+
+from __future__ import annotations
+
+import httpx
+
+from app.bot import delivery, telegram_client, tg_api
+from app.config import settings
+
+
+def test_short_answer_stays_inline(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 2)
+    assert not delivery.as_document("a" * 5000)
+    assert delivery.as_document("word " * 3000)
+
+
+def test_zero_chunks_means_inline_and_truncated(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 0)
+    monkeypatch.setattr(settings, "claude_max_output_chars", 100)
+    assert not delivery.as_document("word " * 10_000)
+    assert delivery.truncate("a" * 500).endswith("... (output truncated)")
+
+
+def test_documents_are_never_truncated(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 3)
+    monkeypatch.setattr(settings, "claude_max_output_chars", 100)
+    assert delivery.truncate("a" * 500) == "a" * 500
+
+
+def test_summary_cuts_at_word_and_points_to_file(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_document_summary_chars", 50)
+    text = "word " * 1000
+    head, _, tail = delivery.summary(text).partition("\n\n")
+    assert len(head) <= 50
+    assert head.endswith("word")
+    assert "5,000 chars" in tail and delivery.DOCUMENT_NAME in tail
+
+
+def test_send_document_uploads_full_text(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_document_spool_bytes", 1024)
+    seen: list[bytes] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path.endswith("/sendDocument")
+        assert request.headers["content-type"].startswith("multipart/form-data")
+        seen.append(request.read())
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": 1}})
+
+    monkeypatch.setattr(tg_api, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    text = "é" * 100_000  # spills the spool to disk
+    try:
+        assert delivery.send_document_sync(42, text)
+    finally:
+        tg_api.close()
+    assert text.encode() in seen[0]
+    assert b'filename="answer.md"' in seen[0]
+
+
+def test_deliver_sync_sends_summary_then_document(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 1)
+    sent: list[str] = []
+    documents: list[str] = []
+    monkeypatch.setattr(
+        telegram_client, "send_message_sync", lambda _chat, text: sent.append(text) or True
+    )
+    monkeypatch.setattr(
+        delivery, "send_document_sync", lambda chat_id, text: documents.append(text) or True
+    )
+    text = "line\n" * 2000
+    telegram_client.deliver_sync(1, text)
+    assert len(sent) == 1 and "attached" in sent[0]
+    assert documents == [text]
+
+
+def test_deliver_sync_falls_back_to_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 1)
+    sent: list[str] = []
+    monkeypatch.setattr(
+        telegram_client, "send_message_sync", lambda _chat, text: sent.append(text) or True
+    )
+    monkeypatch.setattr(delivery, "send_document_sync", lambda chat_id, text: False)
+    text = "line\n" * 2000
+    telegram_client.deliver_sync(1, text)
+    assert sent[-1] == text
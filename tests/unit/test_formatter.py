@@ -0,0 +1,47 @@
+"""Tests for app.core.formatter."""
+
+from __future__ import annotations
+
+from app.config import settings
+from app.core.formatter import prepare, render_html, render_markdown_v2
+
+
+def test_plain_text_fast_path():
+    assert prepare("Just words, numbers 1.5 and (parens).") == (
+        "Just words, numbers 1.5 and (parens).",
+        None,
+    )
+
+
+def test_html_renders_common_markdown():
+    text = "# Title\n**bold**, *it*, `a<b>` & [docs](https://x.dev/a_(b))\n- item"
+    assert render_html(text) == (
+        "<b>Title</b>\n<b>bold</b>, <i>it</i>, <code>a&lt;b&gt;</code> &amp; "
+        '<a href="https://x.dev/a_(b)">docs</a>\n• item'
+    )
+
+
+def test_html_code_block_is_escaped_verbatim():
+    text = "Run:\n```python\nif a < b and c_d:\n    x = '**'\n```\nDone"
+    assert render_html(text) == (
+        'Run:\n<pre><code class="language-python">if a &lt; b and c_d:\n'
+        "    x = '**'</code></pre>\nDone"
+    )
+
+
+def test_unmatched_markers_and_snake_case_stay_literal():
+    text = "snake_case_name, 2*3 and an open **bold"
+    assert render_html(text) == text
+    assert render_markdown_v2(text) == "snake\\_case\\_name, 2\\*3 and an open \\*\\*bold"
+
+
+def test_markdown_v2_escapes_reserved_characters():
+    assert render_markdown_v2("**Note:** v1.2 (beta)!") == "*Note:* v1\\.2 \\(beta\\)\\!"
+
+
+def test_prepare_follows_setting(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_parse_mode", "markdownv2")
+    assert prepare("**x**") == ("*x*", "MarkdownV2")
+    monkeypatch.setattr(settings, "telegram_parse_mode", "markdown")
+    assert prepare("**x**") == ("**x**", "Markdown")
+    assert prepare("**x**", None) == ("**x**", None)
@@ -0,0 +1,159 @@
+"""Tests for the RQ job in app.worker.jobs, run against a fake Redis."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from app.bot import telegram_client
+from app.config import settings
+from app.core import admission, lanes
+from app.core.cancel import RedisCancelStore
+from app.core.results import RedisResultStore
+from app.core.scheduler import RedisSemaphore
+from app.worker import jobs
+
+
+class _Job:
+    """The parts of ``rq.job.Job`` the worker reads."""
+
+    def __init__(self, redis, job_id: str = "job-1", **meta) -> None:
+        self.id = job_id
+        self.connection = redis
+        self.meta = meta
+        self.enqueued_at = None
+        self.origin = "default"
+        self.timeout = 600
+
+
+class _Queue:
+    """Records ``enqueue_in`` calls instead of scheduling them."""
+
+    calls: list[tuple[tuple, dict]] = []
+
+    def __init__(self, name, connection) -> None:
+        self.name = name
+
+    def enqueue_in(self, delay, func, *args, **kwargs) -> None:
+        self.calls.append((args, kwargs))
+
+
+@pytest.fixture
+def requeued(monkeypatch) -> list[tuple[tuple, dict]]:
+    monkeypatch.setattr(_Queue, "calls", [])
+    monkeypatch.setattr(jobs, "Queue", _Queue)
+    return _Queue.calls
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Claude that answers "answer", and Telegram that fails while ``down`` is set."""
+    monkeypatch.setattr(settings, "concurrency_adaptive", False)
+    monkeypatch.setattr(settings, "claude_sessions", False)
+    monkeypatch.setattr(settings, "claude_stream_output", False)
+    state = {"runs": 0, "down": False, "sent": []}
+
+    def fake_claude(prompt, resume=None, on_session=None):
+        state["runs"] += 1
+        return "answer"
+
+    def fake_deliver(chat_id, text, start=0, on_ack=None):
+        if state["down"]:
+            return False
+        state["sent"].append(text)
+        return True
+
+    monkeypatch.setattr(jobs, "run_claude", fake_claude)
+    monkeypatch.setattr(telegram_client, "deliver_sync", fake_deliver)
+    return state
+
+
+def test_failed_delivery_raises_and_retry_resends_saved_answer(fake_redis, worker):
+    job = _Job(fake_redis)
+    worker["down"] = True
+    with pytest.raises(jobs.DeliveryError):
+        jobs._run_job(job, 5, 1, "q", False)
+    saved = RedisResultStore(fake_redis).get(job.id)
+    assert saved is not None and not saved.done
+
+    worker["down"] = False
+    jobs._run_job(job, 5, 1, "q", False)  # the RQ retry
+    assert worker["runs"] == 1
+    assert worker["sent"] == ["answer"]
+    saved = RedisResultStore(fake_redis).get(job.id)
+    assert saved is not None and saved.done
+
+
+def test_delivered_result_is_not_sent_again(fake_redis, worker):
+    job = _Job(fake_redis)
+    jobs._run_job(job, 5, 1, "q", False)
+    jobs._run_job(job, 5, 1, "q", False)  # worker died after delivering
+    assert worker["runs"] == 1
+    assert worker["sent"] == ["answer"]
+
+
+def test_superseded_job_is_skipped(fake_redis, worker, monkeypatch):
+    monkeypatch.setattr(settings, "claude_supersede_queued", True)
+    cancels = RedisCancelStore(fake_redis)
+    first = _Job(fake_redis, "job-1", ticket=cancels.next_ticket(5))
+    second = _Job(fake_redis, "job-2", ticket=cancels.next_ticket(5))
+    jobs._run_job(first, 5, 1, "typo", False)
+    assert worker["runs"] == 0
+    jobs._run_job(second, 5, 1, "fixed", False)
+    assert worker["runs"] == 1
+
+
+def test_busy_user_slot_requeues_job_with_its_meta(fake_redis, worker, requeued, monkeypatch):
+    monkeypatch.setattr(settings, "claude_concurrency_per_user", 1)
+    RedisSemaphore(fake_redis).acquire(1, "other-job", 1, lease=600)
+    job = _Job(fake_redis, ticket=3, lane=lanes.FAST, deadline=None)
+    jobs._run_job(job, 5, 1, "q", True)
+    assert worker["runs"] == 0
+    args, kwargs = requeued[0]
+    assert args == (5, 1, "q", True)
+    assert kwargs["meta"] == {"ticket": 3, "lane": lanes.FAST, "deadline": None}
+
+
+def test_busy_lane_requeues_and_gives_back_user_slot(fake_redis, worker, requeued, monkeypatch):
+    monkeypatch.setattr(settings, "lane_bulk_concurrency", 1)
+    RedisSemaphore(fake_redis).acquire(f"lane:{lanes.BULK}", "other-job", 1, lease=600)
+    jobs._run_job(_Job(fake_redis, lane=lanes.BULK), 5, 1, "q", False)
+    assert worker["runs"] == 0 and len(requeued) == 1
+    assert fake_redis.zcard("tcc:sem:1") == 0
+
+
+def test_slots_released_when_delivery_fails(fake_redis, worker, requeued, monkeypatch):
+    held: list[int] = []
+
+    def claude(prompt, resume=None, on_session=None):
+        held.append(fake_redis.zcard("tcc:sem:1") + fake_redis.zcard(f"tcc:sem:lane:{lanes.BULK}"))
+        return "answer"
+
+    monkeypatch.setattr(jobs, "run_claude", claude)
+    worker["down"] = True
+    with pytest.raises(jobs.DeliveryError):
+        jobs._run_job(_Job(fake_redis, lane=lanes.BULK), 5, 1, "q", False)
+    assert held == [2] and requeued == []
+    assert fake_redis.zcard("tcc:sem:1") == 0
+    assert fake_redis.zcard(f"tcc:sem:lane:{lanes.BULK}") == 0
+
+
+def test_job_past_its_deadline_is_dropped_and_user_told(fake_redis, worker, monkeypatch):
+    told: list[str] = []
+    monkeypatch.setattr(jobs, "send_message_sync", lambda chat_id, text: told.append(text))
+    job = _Job(fake_redis, lane=lanes.FAST, deadline=time.time() - 1)
+    jobs._run_job(job, 5, 1, "q", False)
+    assert worker["runs"] == 0
+    assert told == [admission.EXPIRED_TEXT]
+    assert fake_redis.zcard("tcc:sem:1") == 0
+
+
+def test_retry_policy_backs_off(monkeypatch):
+    monkeypatch.setattr(settings, "delivery_job_retries", 3)
+    policy = jobs.retry_policy()
+    assert policy is not None
+    assert policy.max == 3
+    assert policy.intervals == [60, 120, 240]
+    monkeypatch.setattr(settings, "delivery_job_retries", 0)
+    assert jobs.retry_policy() is None
@@ -0,0 +1,34 @@
+"""Tests for app.core.lanes."""
+
+from __future__ import annotations
+
+from app.config import settings
+from app.core import lanes
+
+
+def test_short_questions_take_the_fast_lane():
+    assert lanes.classify("How do I read a CSV in Python?") == lanes.FAST
+
+
+def test_long_or_agentic_prompts_take_the_bulk_lane(monkeypatch):
+    monkeypatch.setattr(settings, "lane_fast_max_chars", 50)
+    assert lanes.classify("x" * 51) == lanes.BULK
+    assert lanes.classify("Refactor the parser") == lanes.BULK
+    monkeypatch.setattr(settings, "lane_bulk_keywords", "")
+    assert lanes.classify("Refactor the parser") == lanes.FAST
+
+
+def test_fast_lane_keeps_the_configured_queue(monkeypatch):
+    monkeypatch.setattr(settings, "queue_name", "tcc")
+    assert lanes.queue_name(lanes.FAST) == "tcc"
+    assert lanes.queue_name(lanes.BULK) == "tcc-bulk"
+
+
+def test_timeout_follows_the_running_lane(monkeypatch):
+    monkeypatch.setattr(settings, "claude_timeout_sec", 60)
+    monkeypatch.setattr(settings, "lane_bulk_timeout_sec", 900)
+    assert lanes.timeout_sec() == 60
+    with lanes.use(lanes.BULK):
+        assert lanes.timeout_sec() == 900
+        assert lanes.timeout_sec(lanes.FAST) == 60
+    assert lanes.current() == lanes.FAST
@@ -0,0 +1,120 @@
+"""Tests for app.core.limiter."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from app.core import limiter as limiter_mod
+from app.core import metrics
+from app.core.limiter import AdaptiveLimiter
+from app.core.scheduler import FairScheduler
+
+
+@pytest.fixture
+def make_limiter(clock):
+    def make(initial: int = 4, pressure: str | None = None, **kw) -> AdaptiveLimiter:
+        return AdaptiveLimiter(
+            initial,
+            kw.get("min_limit", 1),
+            kw.get("max_limit", 8),
+            pressure=lambda: pressure,
+            clock=clock,
+        )
+
+    return make
+
+
+def _gauge() -> float:
+    return metrics.CONCURRENCY_LIMIT._value.get()
+
+
+def test_permits_follow_limit(make_limiter):
+    lim = make_limiter(initial=2)
+    assert lim.try_acquire() and lim.try_acquire()
+    assert not lim.try_acquire()
+    lim.release()
+    assert lim.try_acquire()
+
+
+def test_timeout_decreases_once_per_cooldown(make_limiter, clock):
+    lim = make_limiter(initial=8)
+    lim.observe(30.0, "timeout")
+    assert lim.limit == 6
+    lim.observe(30.0, "timeout")  # same burst
+    assert lim.limit == 6
+    clock.now += 11
+    lim.observe(30.0, "timeout")
+    assert lim.limit == 4
+    assert _gauge() == 4
+
+
+def test_success_grows_only_when_limit_is_used(make_limiter):
+    lim = make_limiter(initial=2, max_limit=3)
+    for _ in range(5):
+        lim.observe(1.0, "ok")
+    assert lim.limit == 2  # nothing in flight: the limit is not what holds runs back
+    lim.try_acquire()
+    for _ in range(10):
+        lim.observe(1.0, "ok")
+    assert lim.limit == 3  # and never past max_limit
+
+
+def test_slow_runs_decrease_limit(make_limiter):
+    lim = make_limiter(initial=4)
+    for _ in range(20):
+        lim.observe(1.0, "ok")
+    before = lim.limit
+    for _ in range(5):
+        lim.observe(10.0, "ok")
+    assert lim.limit < before
+
+
+def test_host_pressure_decreases_to_floor(make_limiter, clock):
+    lim = make_limiter(initial=4, pressure="memory", min_limit=2)
+    for _ in range(5):
+        clock.now += 11
+        lim.try_acquire()
+        lim.release()
+    assert lim.limit == 2
+    lim.try_acquire()
+    lim.observe(1.0, "ok")
+    assert lim.limit == 2  # no growth under pressure
+
+
+def test_host_pressure_reads_settings(monkeypatch):
+    monkeypatch.setattr(limiter_mod, "_available_memory", lambda: 0.05)
+    assert limiter_mod.host_pressure() == "memory"
+    monkeypatch.setattr(limiter_mod, "_available_memory", lambda: 0.5)
+    monkeypatch.setattr(limiter_mod.os, "getloadavg", lambda: (1000.0, 0.0, 0.0))
+    assert limiter_mod.host_pressure() == "load"
+    monkeypatch.setattr(limiter_mod.os, "getloadavg", lambda: (0.0, 0.0, 0.0))
+    assert limiter_mod.host_pressure() is None
+
+
+def test_scheduler_waits_for_permit(make_limiter):
+    lim = make_limiter(initial=1)
+    sched = FairScheduler(max_workers=4, per_user=4, limiter=lim)
+    gate = threading.Event()
+    started: list[str] = []
+    done = threading.Event()
+
+    def run(name: str) -> None:
+        started.append(name)
+        if name == "a0":
+            gate.wait(5)
+        else:
+            done.set()
+
+    try:
+        assert sched.submit(1, run, "a0") == 0
+        # A free pool thread, but the only permit is taken
+        assert sched.submit(2, run, "b0") == 1
+        assert started == ["a0"]
+        gate.set()
+        assert done.wait(5)
+        assert started == ["a0", "b0"]
+    finally:
+        sched.shutdown(wait=True)
+    assert lim.inflight() == 0
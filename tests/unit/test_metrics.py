@@ -0,0 +1,60 @@
+"""Tests for app.core.metrics."""
+
+from __future__ import annotations
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core import metrics
+from app.worker.claude_exec import StreamResult
+
+
+def _value(name: str, labels: dict[str, str] | None = None) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_track_claude_observes_duration():
+    before = _value("tcc_claude_seconds_count", {"executor": "test"})
+    with metrics.track_claude("test"):
+        pass
+    assert _value("tcc_claude_seconds_count", {"executor": "test"}) == before + 1
+    assert _value("tcc_jobs_inflight") == 0
+
+
+def test_track_claude_counts_timeouts_and_failures():
+    timeouts = _value("tcc_claude_timeouts_total")
+    failures = _value("tcc_claude_failures_total")
+    with pytest.raises(RuntimeError), metrics.track_claude("test"):
+        raise RuntimeError("claude timed out after 120s")
+    with pytest.raises(RuntimeError), metrics.track_claude("test"):
+        raise RuntimeError("claude exited with code 1: boom")
+    assert _value("tcc_claude_timeouts_total") == timeouts + 1
+    assert _value("tcc_claude_failures_total") == failures + 1
+
+
+def test_track_claude_counts_cancel_apart_from_failures():
+    failures = _value("tcc_claude_failures_total")
+    cancelled = _value("tcc_claude_runs_total", {"outcome": "cancelled"})
+    with pytest.raises(RuntimeError), metrics.track_claude("test"):
+        raise RuntimeError("claude run cancelled")
+    assert _value("tcc_claude_failures_total") == failures
+    assert _value("tcc_claude_runs_total", {"outcome": "cancelled"}) == cancelled + 1
+
+
+def test_first_text_observed_once_per_run():
+    before = _value("tcc_claude_first_text_seconds_count")
+    result = StreamResult(None)
+    delta = (
+        '{"type":"stream_event","event":{"type":"content_block_delta",'
+        '"delta":{"type":"text_delta","text":"%s"}}}'
+    )
+    result.feed(delta % "Hel")
+    result.feed(delta % "lo")
+    assert _value("tcc_claude_first_text_seconds_count") == before + 1
+
+
+def test_render_exposes_stage_metrics():
+    content, content_type = metrics.render()
+    assert content_type.startswith("text/plain")
+    for name in (b"tcc_webhook_handle_seconds", b"tcc_queue_wait_seconds", b"tcc_queue_depth"):
+        assert name in content
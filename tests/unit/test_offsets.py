@@ -0,0 +1,24 @@
+"""Tests for app.core.offsets."""
+
+from __future__ import annotations
+
+from app.core.offsets import FileOffsetStore, MemoryOffsetStore
+
+
+def test_file_store_survives_restart(tmp_path):
+    path = str(tmp_path / "offset")
+    assert FileOffsetStore(path).load() == 0
+    FileOffsetStore(path).save(1234)
+    assert FileOffsetStore(path).load() == 1234
+
+
+def test_file_store_ignores_corrupt_file(tmp_path):
+    path = tmp_path / "offset"
+    path.write_text("not a number")
+    assert FileOffsetStore(str(path)).load() == 0
+
+
+def test_memory_store():
+    store = MemoryOffsetStore()
+    store.save(7)
+    assert store.load() == 7
@@ -0,0 +1,67 @@
+"""Tests for the polling ingestion loop in app.bot.polling."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+from app.bot import polling
+from app.core import lanes
+
+
+def _update(update_id: int, chat_id: int, text: str = "hi") -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": text}}
+
+
+def test_batch_keeps_per_chat_order_and_runs_chats_concurrently(monkeypatch):
+    seen: list[tuple[int, str]] = []
+    both_started = threading.Barrier(2, timeout=5)
+
+    def fake_handle(message):
+        if message["text"] == "first":
+            both_started.wait()  # deadlocks unless the two chats run in parallel
+        seen.append((message["chat"]["id"], message["text"]))
+
+    monkeypatch.setattr(polling, "_handle_message", fake_handle)
+    updates = [
+        _update(1, 10, "first"),
+        _update(2, 20, "first"),
+        _update(3, 10, "second"),
+        {"update_id": 4, "edited_message": {}},
+    ]
+    asyncio.run(polling._dispatch_batch(updates))
+    chat_10 = [text for chat, text in seen if chat == 10]
+    assert chat_10 == ["first", "second"]
+    assert len(seen) == 4 - 1
+
+
+def test_cancel_drops_queued_prompt(monkeypatch):
+    asked: list[str] = []
+    monkeypatch.setattr(polling, "_do_ask", lambda _c, _u, prompt, _cache: asked.append(prompt))
+    monkeypatch.setattr(polling, "_send_sync", lambda *args, **kwargs: None)
+    ticket = polling._cancels.next_ticket(30)
+    polling._handle_message({"chat": {"id": 30}, "from": {"id": 1}, "text": "/cancel"})
+    polling._ask_job(30, 1, "typo", True, ticket, lanes.FAST)
+    polling._ask_job(30, 1, "fixed", True, polling._cancels.next_ticket(30), lanes.FAST)
+    assert asked == ["fixed"]
+
+
+def test_cancel_needs_an_allowed_user(monkeypatch):
+    sent: list[str] = []
+    monkeypatch.setattr(polling, "is_allowed", lambda user_id: user_id == 1)
+    monkeypatch.setattr(polling, "_send_sync", lambda chat_id, text, *a: sent.append(text))
+    ticket = polling._cancels.next_ticket(31)
+    polling._handle_message({"chat": {"id": 31}, "from": {"id": 2}, "text": "/cancel"})
+    assert "denied" in sent[0]
+    assert not polling.cancel.should_skip(31, ticket, polling._cancels)
+
+
+def test_new_needs_an_allowed_user(monkeypatch):
+    sent: list[str] = []
+    monkeypatch.setattr(polling, "is_allowed", lambda user_id: user_id == 1)
+    monkeypatch.setattr(polling, "_send_sync", lambda chat_id, text, *a: sent.append(text))
+    polling._sessions.set(32, "session")
+    polling._handle_message({"chat": {"id": 32}, "from": {"id": 2}, "text": "/new"})
+    assert "denied" in sent[0]
+    assert polling._sessions.get(32) == "session"
+    polling._sessions.reset(32)
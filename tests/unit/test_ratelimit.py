@@ -0,0 +1,61 @@
+"""Tests for app.core.ratelimit."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.config import settings
+from app.core.ratelimit import BACKGROUND, MemoryRateLimiter
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock):
+    monkeypatch.setattr(settings, "telegram_rate_global_per_sec", 30.0)
+    monkeypatch.setattr(settings, "telegram_rate_chat_per_sec", 1.0)
+    monkeypatch.setattr(settings, "telegram_rate_group_per_min", 20.0)
+    clock.now = 1000.0
+    return MemoryRateLimiter(clock=clock), clock
+
+
+def test_per_chat_reservations_queue_in_order(limiter):
+    rl, _ = limiter
+    assert rl.reserve(1) == 0
+    assert rl.reserve(1) == pytest.approx(1.0)
+    assert rl.reserve(1) == pytest.approx(2.0)
+    # Another chat is not affected
+    assert rl.reserve(2) == 0
+
+
+def test_group_chats_use_per_minute_rate(limiter):
+    rl, _ = limiter
+    assert rl.reserve(-100) == 0
+    assert rl.reserve(-100) == pytest.approx(3.0)
+
+
+def test_tokens_refill_over_time(limiter):
+    rl, clock = limiter
+    rl.reserve(1)
+    clock.now += 1.0
+    assert rl.reserve(1) == 0
+
+
+def test_background_dropped_when_chat_busy(limiter):
+    rl, _ = limiter
+    assert rl.reserve(1, BACKGROUND) == 0
+    # Background call did not consume the chat slot
+    assert rl.reserve(1) == 0
+    assert rl.reserve(1, BACKGROUND) is None
+
+
+def test_penalize_blocks_chat(limiter):
+    rl, _ = limiter
+    rl.penalize(1, 5)
+    assert rl.reserve(1) == pytest.approx(5.0)
+    assert rl.reserve(2) == 0
+
+
+def test_global_limit_applies_across_chats(limiter):
+    rl, _ = limiter
+    waits = [rl.reserve(chat_id) for chat_id in range(31)]
+    assert waits[:30] == [0] * 30
+    assert waits[30] > 0
@@ -0,0 +1,131 @@
+"""Tests for app.core.results and resumable delivery of saved answers."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.api import webhook
+from app.bot import telegram_client, tg_api
+from app.config import settings
+from app.core import ratelimit
+from app.core.results import MemoryResultStore, RedisResultStore
+
+
+def test_memory_store_keeps_latest_answer_per_chat_until_ttl(clock):
+    store = MemoryResultStore(ttl=60, max_results=10, clock=clock)
+    store.save(1, "a", "first")
+    store.save(1, "b", "second")
+    store.ack("b", 2, done=True)
+    last = store.last(1)
+    assert last is not None and (last.text, last.acked, last.done) == ("second", 2, True)
+    assert store.get("a") is not None  # an older job is still found by id
+    clock.now = 61
+    assert store.last(1) is None
+
+
+def test_redis_store_round_trips_progress(fake_redis):
+    store = RedisResultStore(fake_redis)
+    store.save(5, "job-1", "héllo")
+    store.ack("job-1", 3)
+    saved = store.get("job-1")
+    assert saved is not None and (saved.text, saved.acked, saved.done) == ("héllo", 3, False)
+    assert store.last(5) is not None
+    store.ack("gone", 1)  # expired results are not recreated
+    assert store.get("gone") is None
+
+
+@pytest.fixture
+def flaky_telegram(monkeypatch):
+    """Telegram that fails every send once with a 502 while ``down`` is set."""
+    monkeypatch.setattr(settings, "delivery_backoff_sec", 0)
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 0)
+    monkeypatch.setattr(ratelimit, "acquire", lambda *args, **kwargs: None)
+    state = {"down": False, "texts": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if state["down"]:
+            return httpx.Response(502)
+        state["texts"].append(request.read())
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": 1}})
+
+    monkeypatch.setattr(tg_api, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    yield state
+    tg_api.close()
+
+
+def test_delivery_resumes_after_the_last_acknowledged_part(flaky_telegram, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_max_attempts", 2)
+    store = MemoryResultStore()
+    text = "word " * 2000  # three chunks
+    result = store.save(1, "job", text)
+
+    calls = {"n": 0}
+    real = telegram_client._send_payload
+
+    def _send_then_fail(payload, body):
+        calls["n"] += 1
+        flaky_telegram["down"] = calls["n"] > 1  # Telegram goes down after the first part
+        return real(payload, body)
+
+    monkeypatch.setattr(telegram_client, "_send_payload", _send_then_fail)
+    assert not telegram_client.deliver_saved(1, result, store)
+    saved = store.get("job")
+    assert saved is not None and saved.acked == 1 and not saved.done
+
+    flaky_telegram["down"] = False
+    monkeypatch.setattr(telegram_client, "_send_payload", real)
+    assert telegram_client.deliver_saved(1, saved, store)
+    assert len(flaky_telegram["texts"]) == 3  # part 1 was not sent twice
+    final = store.get("job")
+    assert final is not None and final.done
+
+
+def test_failed_final_stream_edit_is_not_acked(flaky_telegram, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_max_attempts", 1)
+    store = MemoryResultStore()
+    stream = telegram_client.StreamingMessage(1, interval=0)
+    stream.update("partial ans")
+    flaky_telegram["down"] = True  # the final edit gets a 502
+    result = store.save(1, "job", "the whole answer")
+    assert not telegram_client.deliver_saved(1, result, store, stream)
+    saved = store.get("job")
+    assert saved is not None and saved.acked == 0 and not saved.done
+
+
+def test_streamed_parts_are_not_resent(flaky_telegram, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_max_attempts", 1)
+    store = MemoryResultStore()
+    text = "a" * 3000 + "\n" + "b" * 3000  # two parts
+    stream = telegram_client.StreamingMessage(1, interval=0)
+    stream.update("a" * 3000)
+    flaky_telegram["down"] = True  # the second message never makes it
+    result = store.save(1, "job", text)
+    assert not telegram_client.deliver_saved(1, result, store, stream)
+    saved = store.get("job")
+    assert saved is not None and saved.acked == 1
+
+
+def test_only_permanent_rejections_settle():
+    request = httpx.Request("POST", "https://api.telegram.org/botx/sendMessage")
+    assert telegram_client._settled(httpx.Response(200, request=request))
+    assert telegram_client._settled(httpx.Response(403, request=request))
+    assert not telegram_client._settled(httpx.Response(429, request=request))
+    assert not telegram_client._settled(httpx.Response(502, request=request))
+
+
+async def test_last_is_delivered_after_the_webhook_returns(monkeypatch):
+    sent: list[str] = []
+    monkeypatch.setattr(webhook, "is_allowed", lambda user_id: True)
+    monkeypatch.setattr(webhook, "deliver_sync", lambda chat_id, text: sent.append(text) or True)
+    results = MemoryResultStore(ttl=60, max_results=10)
+    results.save(1, "job-1", "saved answer")
+    executor = SimpleNamespace(results=results)
+    update = {"update_id": 1, "message": {"chat": {"id": 1}, "from": {"id": 1}, "text": "/last"}}
+    resp = await webhook._handle_message(update, executor, None, None)
+    assert resp.status_code == 200 and sent == []
+    assert resp.background is not None
+    await resp.background()
+    assert sent == ["saved answer"]
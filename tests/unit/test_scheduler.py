@@ -0,0 +1,54 @@
+"""Tests for app.core.scheduler."""
+
+from __future__ import annotations
+
+import threading
+
+from app.core.scheduler import FairScheduler
+
+
+def _blocker(started: list[str], gate: threading.Event, name: str) -> None:
+    started.append(name)
+    gate.wait(5)
+
+
+def test_per_user_cap_and_round_robin():
+    sched = FairScheduler(max_workers=1, per_user=1)
+    gate = threading.Event()
+    order: list[str] = []
+    done = threading.Event()
+
+    def record(name: str) -> None:
+        order.append(name)
+        if len(order) == 5:
+            done.set()
+
+    try:
+        assert sched.submit(1, _blocker, order, gate, "a0") == 0
+        # User 1 floods the queue, user 2 arrives later
+        assert sched.submit(1, record, "a1") == 1
+        assert sched.submit(1, record, "a2") == 2
+        assert sched.submit(1, record, "a3") == 3
+        assert sched.submit(2, record, "b1") == 2
+        gate.set()
+        assert done.wait(5)
+        assert order == ["a0", "a1", "b1", "a2", "a3"]
+    finally:
+        sched.shutdown(wait=True)
+
+
+def test_user_cap_leaves_slots_for_others():
+    sched = FairScheduler(max_workers=2, per_user=1)
+    gate = threading.Event()
+    started: list[str] = []
+    try:
+        assert sched.submit(1, _blocker, started, gate, "a0") == 0
+        assert sched.submit(1, _blocker, started, gate, "a1") == 1
+        # Second slot is free but user 1 is at their cap; user 2 gets it
+        assert sched.submit(2, _blocker, started, gate, "b0") == 0
+        assert sched.queue_depth() == 1
+        assert sched.position(1) == 1
+        assert sched.position(2) == 0
+    finally:
+        gate.set()
+        sched.shutdown(wait=True)
@@ -0,0 +1,71 @@
+"""Tests for app.core.sessions."""
+
+from __future__ import annotations
+
+import itertools
+from types import SimpleNamespace
+
+from app.config import settings
+from app.core import sessions
+from app.core.sessions import MemorySessionStore, RedisSessionStore
+
+
+def test_set_get_reset():
+    store = MemorySessionStore(ttl=60, max_sessions=10)
+    assert store.get(1) is None
+    store.set(1, "abc")
+    assert store.get(1) == "abc"
+    store.reset(1)
+    assert store.get(1) is None
+
+
+def test_ttl_expiry(clock):
+    store = MemorySessionStore(ttl=60, max_sessions=10, clock=clock)
+    store.set(1, "abc")
+    clock.now = 61
+    assert store.get(1) is None
+
+
+def test_lru_eviction():
+    store = MemorySessionStore(ttl=60, max_sessions=2)
+    store.set(1, "a")
+    store.set(2, "b")
+    store.set(1, "a2")  # refresh chat 1
+    store.set(3, "c")
+    assert store.get(2) is None
+    assert store.get(1) == "a2"
+    assert store.get(3) == "c"
+
+
+def test_get_keeps_active_chat_from_eviction():
+    store = MemorySessionStore(ttl=60, max_sessions=2)
+    store.set(1, "a")
+    store.set(2, "b")
+    assert store.get(1) == "a"
+    store.set(3, "c")
+    assert store.get(1) == "a"
+    assert store.get(2) is None
+
+
+def test_redis_store_set_get_reset(fake_redis):
+    store = RedisSessionStore(fake_redis)
+    assert store.get(1) is None
+    store.set(1, "abc")
+    assert store.get(1) == "abc"
+    assert fake_redis.ttl["tcc:session:1"] == settings.claude_session_ttl_sec
+    store.reset(1)
+    assert store.get(1) is None
+    assert fake_redis.zcard("tcc:session:lru") == 0
+
+
+def test_redis_store_evicts_least_recently_used(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "claude_session_max", 2)
+    ticks = itertools.count(1)
+    monkeypatch.setattr(sessions, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+    store = RedisSessionStore(fake_redis)
+    store.set(1, "a")
+    store.set(2, "b")
+    store.set(1, "a2")  # refresh chat 1
+    store.set(3, "c")
+    assert store.get(2) is None
+    assert (store.get(1), store.get(3)) == ("a2", "c")
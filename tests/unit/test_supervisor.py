@@ -0,0 +1,54 @@
+"""Tests for app.worker.supervisor and app.core.nodes."""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from app.core.nodes import NodeRegistry
+from app.worker.supervisor import Supervisor
+
+
+def test_nodes_report_capacity_and_drop_when_heartbeat_stops(fake_redis):
+    redis = fake_redis
+    registry = NodeRegistry(redis)
+    registry.beat("box-a", slots=4, busy=1, interval=5)
+    registry.beat("box-b", slots=8, busy=8, interval=5)
+    assert [(n["node"], n["slots"], n["busy"]) for n in registry.nodes()] == [
+        ("box-a", 4, 1),
+        ("box-b", 8, 8),
+    ]
+    assert redis.ttl["tcc:node:box-a"] == 15
+
+    redis.expire_all()  # both heartbeats missed
+    assert registry.nodes() == []
+    assert redis.data["tcc:nodes"] == set()
+
+
+def test_crashed_worker_is_restarted_with_backoff():
+    supervisor = Supervisor(1, "box", command=[sys.executable, "-c", "raise SystemExit(3)"])
+    supervisor.check()
+    slot = supervisor.slots[0]
+    first = slot.proc
+    assert first is not None
+    first.wait(timeout=10)
+
+    supervisor.check()  # notices the crash; quick crashes wait before restarting
+    assert supervisor.restarts == 1
+    assert slot.proc is None and slot.backoff == 1.0
+
+    slot.restart_at = time.monotonic()
+    supervisor.check()
+    assert slot.proc is not None and slot.proc is not first
+    supervisor.stop()
+
+
+def test_stop_terminates_workers():
+    supervisor = Supervisor(2, "box", command=[sys.executable, "-c", "import time; time.sleep(60)"])
+    supervisor.check()
+    assert len(supervisor.pids()) == 2
+    procs = [slot.proc for slot in supervisor.slots]
+    supervisor.stop()
+    assert all(proc is not None and proc.returncode is not None for proc in procs)
+    supervisor.check()  # stopping: exited workers are not restarted
+    assert supervisor.pids() == set()
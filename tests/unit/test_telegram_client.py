@@ -0,0 +1,90 @@
+"""Tests for app.bot.telegram_client."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from app.bot import delivery
+from app.bot.telegram_client import StreamingMessage
+from app.config import settings
+
+
+class _RecordingStream(StreamingMessage):
+    def __init__(self) -> None:
+        super().__init__(chat_id=100, interval=0)
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+
+    def _call(self, method: str, payload: dict[str, Any]) -> dict[str, Any] | None:
+        self.calls.append((method, payload))
+        return {"message_id": len(self.calls)}
+
+
+def test_stream_sends_then_edits():
+    stream = _RecordingStream()
+    stream.update("Hel")
+    stream.update("Hello")
+    stream.update("Hello")
+    stream.finish("Hello", parse_mode=None)
+    assert [m for m, _ in stream.calls] == ["sendMessage", "editMessageText"]
+    assert stream.calls[1][1]["text"] == "Hello"
+
+
+def test_stream_rolls_over_to_new_message():
+    stream = _RecordingStream()
+    stream.update("a" * 3000)
+    stream.finish("a" * 3000 + "\n" + "b" * 3000, parse_mode=None)
+    methods = [m for m, _ in stream.calls]
+    assert methods == ["sendMessage", "sendMessage"]
+    assert stream.calls[1][1]["text"] == "b" * 3000
+
+
+def test_stream_finish_deletes_preview_messages_past_the_answer():
+    stream = _RecordingStream()
+    stream.update("a" * 3000 + "\n" + "b" * 2000)
+    assert [m for m, _ in stream.calls] == ["sendMessage", "sendMessage"]
+    assert stream.finish("Short **final** answer.")
+    methods = [m for m, _ in stream.calls[2:]]
+    assert methods == ["editMessageText", "deleteMessage", "editMessageText"]
+    assert stream.calls[3][1]["message_id"] == 2
+    assert stream.calls[4][1]["message_id"] == 1  # only the kept message is formatted
+
+
+def test_stream_finish_applies_formatting():
+    stream = _RecordingStream()
+    stream.finish("**bold**")
+    assert stream.calls[-1][0] == "editMessageText"
+    assert stream.calls[-1][1]["parse_mode"] == "HTML"
+    assert stream.calls[-1][1]["text"] == "<b>bold</b>"
+
+
+def test_stream_finish_skips_plain_text():
+    stream = _RecordingStream()
+    stream.finish("Nothing to format here.")
+    assert [m for m, _ in stream.calls] == ["sendMessage"]
+
+
+def test_stream_throttles_edits():
+    stream = _RecordingStream()
+    stream._interval = 60
+    stream.update("a")
+    stream.update("ab")
+    stream.update("abc")
+    assert len(stream.calls) == 1
+
+
+def test_stream_replaces_long_answer_with_document(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_inline_max_chunks", 2)
+    documents: list[str] = []
+    monkeypatch.setattr(
+        delivery, "send_document_sync", lambda chat_id, text: documents.append(text) or True
+    )
+    stream = _RecordingStream()
+    text = "line\n" * 3000
+    stream.update(text)
+    assert [m for m, _ in stream.calls] == ["sendMessage", "sendMessage"]  # capped while live
+    stream.finish(text, parse_mode=None)
+    methods = [m for m, _ in stream.calls]
+    assert methods[2:] == ["editMessageText", "deleteMessage"]
+    assert "attached" in stream.calls[2][1]["text"]
+    assert stream.calls[3][1]["message_id"] == 2
+    assert documents == [text]
@@ -0,0 +1,90 @@
+"""Tests for app.bot.tg_api."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+
+import httpx
+from prometheus_client import REGISTRY
+
+from app.bot import tg_api
+from app.config import settings
+
+
+def test_sync_client_is_shared():
+    try:
+        assert tg_api.get_client() is tg_api.get_client()
+    finally:
+        tg_api.close()
+
+
+def test_closed_client_is_recreated():
+    first = tg_api.get_client()
+    tg_api.close()
+    second = tg_api.get_client()
+    try:
+        assert first is not second
+        assert first.is_closed
+    finally:
+        tg_api.close()
+
+
+def test_async_client_is_shared_within_loop():
+    async def _get_twice():
+        a, b = tg_api.get_async_client(), tg_api.get_async_client()
+        await tg_api.aclose()
+        return a, b
+
+    a, b = asyncio.run(_get_twice())
+    assert a is b
+
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_http2", True)
+    monkeypatch.setitem(sys.modules, "h2", None)
+    assert tg_api._http2_enabled() is False
+
+
+def test_api_url(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    assert tg_api.api_url("getMe") == "https://api.telegram.org/bot123:abc/getMe"
+
+
+def test_final_429_is_counted(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_max_retries", 0)
+    monkeypatch.setattr(tg_api.ratelimit, "acquire", lambda *args: None)
+
+    async def _no_wait(*args):
+        return None
+
+    monkeypatch.setattr(tg_api.ratelimit, "aacquire", _no_wait)
+    throttled = httpx.Response(429, json={"parameters": {"retry_after": 3}})
+    monkeypatch.setattr(tg_api, "_post", lambda *args: throttled)
+
+    async def _apost(*args):
+        return throttled
+
+    monkeypatch.setattr(tg_api, "_apost", _apost)
+    before = REGISTRY.get_sample_value("tcc_telegram_429_total") or 0.0
+    assert tg_api.call("sendMessage", {"chat_id": 1}).status_code == 429
+    assert asyncio.run(tg_api.acall("sendMessage", {"chat_id": 1})).status_code == 429
+    assert REGISTRY.get_sample_value("tcc_telegram_429_total") == before + 2
+
+
+def test_async_client_replaced_for_new_loop_is_closed():
+    async def _get():
+        return tg_api.get_async_client()
+
+    async def _replace():
+        client = tg_api.get_async_client()
+        await asyncio.sleep(0)  # let the stale client's close run
+        return client
+
+    first = asyncio.run(_get())
+    second = asyncio.run(_replace())
+    try:
+        assert first is not second
+        assert first.is_closed
+    finally:
+        asyncio.run(tg_api.aclose())
@@ -0,0 +1,66 @@
+"""Tests for app.core.tracing."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.config import settings
+from app.core import tracing
+
+
+@pytest.fixture
+def span_file(tmp_path, monkeypatch):
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(settings, "tracing", "log")
+    monkeypatch.setattr(settings, "tracing_file", str(path))
+    monkeypatch.setattr(tracing, "_exporter", None)
+    return path
+
+
+def _spans(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_spans_share_trace_and_nest(span_file):
+    with tracing.attach(), tracing.span("webhook"), tracing.span("enqueue", user_id=1):
+        pass
+    inner, outer = _spans(span_file)
+    assert inner["name"] == "enqueue" and inner["user_id"] == 1
+    assert inner["trace_id"] == outer["trace_id"]
+    assert inner["parent_id"] == outer["span_id"]
+    assert outer["parent_id"] is None
+
+
+def test_traceparent_continues_trace_in_next_hop(span_file):
+    with tracing.attach(), tracing.span("webhook"):
+        carried = tracing.traceparent()
+    with tracing.attach(carried), tracing.span("job"):
+        pass
+    webhook, job = _spans(span_file)
+    assert job["trace_id"] == webhook["trace_id"]
+    assert job["parent_id"] == webhook["span_id"]
+
+
+def test_span_records_error_status(span_file):
+    with pytest.raises(ValueError), tracing.attach(), tracing.span("claude"):
+        raise ValueError("boom")
+    assert _spans(span_file)[0]["status"] == "error: ValueError"
+
+
+def test_child_env_carries_traceparent():
+    assert tracing.child_env() is None
+    with tracing.attach("00-" + "a" * 32 + "-" + "b" * 16 + "-01"):
+        env = tracing.child_env()
+    assert env is not None
+    assert env["TCC_TRACE_ID"] == "a" * 32
+    assert env["TRACEPARENT"].startswith("00-" + "a" * 32 + "-")
+
+
+def test_off_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "tracing", "off")
+    monkeypatch.setattr(settings, "tracing_file", str(tmp_path / "spans.jsonl"))
+    with tracing.attach(), tracing.span("webhook"):
+        pass
+    assert not (tmp_path / "spans.jsonl").exists()
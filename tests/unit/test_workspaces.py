@@ -0,0 +1,80 @@
+"""Tests for app.core.workspaces."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from app.config import settings
+from app.core import workspaces
+from app.core.workspaces import WorkspaceManager
+from app.worker import claude_exec
+
+
+@pytest.fixture
+def base(tmp_path):
+    repo = tmp_path / "project"
+    repo.mkdir()
+    (repo / "main.py").write_text("print('hi')\n")
+    git = ["git", "-C", str(repo), "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run([*git, "init", "-q"], check=True)
+    subprocess.run([*git, "add", "."], check=True)
+    subprocess.run([*git, "commit", "-qm", "init"], check=True)
+    return repo
+
+
+def _manager(base, tmp_path, mode="auto", max_bytes=0):
+    return WorkspaceManager(str(base), str(tmp_path / "ws"), mode, max_bytes, idle_ttl_sec=0)
+
+
+@pytest.mark.parametrize("mode", ["worktree", "copy"])
+def test_chat_workspace_is_isolated_and_reused(base, tmp_path, mode):
+    manager = _manager(base, tmp_path, mode)
+    lease = manager.acquire("chat-1")
+    (lease.path / "main.py").write_text("edited\n")
+    manager.release(lease)
+    assert (base / "main.py").read_text() == "print('hi')\n"
+
+    again = manager.acquire("chat-1")
+    assert (again.path / "main.py").read_text() == "edited\n"  # warm across turns
+    other = manager.acquire("chat-2")
+    assert (other.path / "main.py").read_text() == "print('hi')\n"
+    manager.release(again)
+    manager.release(other)
+
+
+def test_auto_mode_prefers_worktree_for_git(base, tmp_path):
+    assert _manager(base, tmp_path).mode == "worktree"
+    (base / ".git").rename(base / "not-git")
+    assert _manager(base, tmp_path).mode == "copy"
+
+
+def test_gc_removes_least_recently_used_idle_workspaces(base, tmp_path):
+    shutil.rmtree(base / ".git")
+    (base / "data.bin").write_bytes(os.urandom(200_000))
+    manager = _manager(base, tmp_path, "copy", max_bytes=500_000)
+    for i, key in enumerate(("old", "busy", "new")):
+        lease = manager.acquire(key)
+        if key != "busy":
+            manager.release(lease)
+        os.utime(manager.root / f"{key}.lock", (1000 + i, 1000 + i))
+    assert manager.gc() == 1
+    assert sorted(p.name for p in manager.root.iterdir() if p.is_dir()) == ["busy", "new"]
+
+
+def test_claude_runs_in_the_chat_workspace(base, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_base", str(base))
+    monkeypatch.setattr(settings, "workspace_root", str(tmp_path / "ws"))
+    monkeypatch.setattr(workspaces, "_manager", None)
+    monkeypatch.setattr(
+        claude_exec,
+        "_build_cmd",
+        lambda prompt, *extra: [sys.executable, "-c", "import os; print(os.getcwd())"],
+    )
+    assert claude_exec.run_claude("hi") == os.getcwd()
+    with workspaces.use(7):
+        assert claude_exec.run_claude("hi") == str(tmp_path / "ws" / "chat-7")